@@ -0,0 +1,95 @@
+"""
+Benchmark du stockage des mesures : une ligne par mesure ('rows') contre les paquets
+compressés ('chunks', voir chunk_storage.py). Taille occupée par les mesures (table et index),
+durée du chargement CSV et des lectures par plage de temps.
+
+Utilisation (depuis le dossier src) :
+    python benchmarks/bench_chunk_storage.py [--rows 200000] [--repeat 5]
+"""
+
+import argparse
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import database_manager
+from chunk_storage import CHUNK_STORAGE, CHUNK_TABLE, ROW_STORAGE
+from database_manager import DatabaseManager, SENSOR_COLUMNS
+from db_connection import close_all_pools
+from synthetic_data import SAMPLE_PERIOD_MS, write_session_csv
+
+# Objets de la base qui contiennent les mesures, selon le stockage
+STORAGE_OBJECTS = {
+    ROW_STORAGE: ("sensor_data", "idx_sensor_data_timer", "idx_sensor_data_session_timer"),
+    CHUNK_STORAGE: (CHUNK_TABLE, "idx_sensor_chunks_start", f"sqlite_autoindex_{CHUNK_TABLE}_1"),
+}
+
+
+def storage_size(db_name, storage):
+    """
+    Octets occupés par les mesures (pages des tables et index, après VACUUM).
+    """
+    with sqlite3.connect(db_name) as connection:
+        connection.execute("VACUUM")
+        names = STORAGE_OBJECTS[storage]
+        placeholders = ", ".join(["?"] * len(names))
+        return connection.execute(
+            f"SELECT total(pgsize) FROM dbstat WHERE name IN ({placeholders})", names
+        ).fetchone()[0]
+
+
+def best_time(function, repeat):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def run(storage, csv_file_path, row_count, repeat, tmp_dir):
+    database_manager.DEFAULT_SENSOR_STORAGE = storage
+    db_manager = DatabaseManager(os.path.join(tmp_dir, f"{storage}.db"))
+    db_manager.initialize_database()
+
+    start = time.perf_counter()
+    db_manager.load_csv_to_db(csv_file_path, session_id=1)
+    ingest = time.perf_counter() - start
+
+    duration = row_count * SAMPLE_PERIOD_MS
+    ranges = {
+        "session": (None, None),
+        "60 s": (duration // 2, duration // 2 + 60000),
+        "1 s": (duration // 2, duration // 2 + 1000),
+    }
+    reads = {
+        name: best_time(lambda: db_manager.read_sensor_columns(SENSOR_COLUMNS, start, end, 1), repeat)
+        for name, (start, end) in ranges.items()
+    }
+    close_all_pools()
+    return ingest, storage_size(db_manager.db_name, storage), reads
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark du stockage des mesures (lignes / paquets).")
+    parser.add_argument('--rows', type=int, default=200000)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        csv_file_path = os.path.join(tmp_dir, 'session.csv')
+        write_session_csv(csv_file_path, args.rows)
+        for storage in (ROW_STORAGE, CHUNK_STORAGE):
+            ingest, size, reads = run(storage, csv_file_path, args.rows, args.repeat, tmp_dir)
+            timings = "  ".join(f"{name} {seconds * 1000:8.2f} ms" for name, seconds in reads.items())
+            print(f"{storage:>6}  chargement {ingest:6.2f} s  taille {size / 1e6:7.2f} Mo "
+                  f"({size / args.rows:5.1f} o/mesure)  lecture : {timings}")
+
+
+if __name__ == "__main__":
+    main()
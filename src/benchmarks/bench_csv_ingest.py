@@ -0,0 +1,61 @@
+"""
+Benchmark du chargement CSV -> SQLite : chargement par paquets (`load_csv_to_db`)
+contre l'ancien chargement ligne par ligne (`load_csv_to_db_row_by_row`).
+
+Utilisation (depuis le dossier src) :
+    python benchmarks/bench_csv_ingest.py [fichier.csv] [--repeat N]
+"""
+
+import argparse
+import sqlite3
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from database_manager import DatabaseManager
+
+DEFAULT_CSV = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'esp32_data.csv')
+
+
+def time_loader(csv_file_path, loader_name):
+    """
+    Charge le fichier dans une base temporaire neuve et retourne (lignes, secondes).
+    """
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        db_manager = DatabaseManager(os.path.join(tmp_dir, 'bench.db'))
+        db_manager.initialize_database()
+        loader = getattr(db_manager, loader_name)
+
+        start = time.perf_counter()
+        loader(csv_file_path)
+        elapsed = time.perf_counter() - start
+
+        with sqlite3.connect(db_manager.db_name) as connection:
+            rows = connection.execute("SELECT COUNT(*) FROM sensor_data").fetchone()[0]
+    return rows, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark du chargement CSV dans SQLite.")
+    parser.add_argument('csv_file', nargs='?', default=DEFAULT_CSV)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    results = {}
+    for loader_name in ('load_csv_to_db_row_by_row', 'load_csv_to_db'):
+        best = None
+        for _ in range(args.repeat):
+            rows, elapsed = time_loader(args.csv_file, loader_name)
+            best = elapsed if best is None else min(best, elapsed)
+        results[loader_name] = rows / best if best else float('inf')
+        print(f"{loader_name:<28} {rows:>9} lignes  {best:8.3f} s  {results[loader_name]:>12,.0f} lignes/s")
+
+    speedup = results['load_csv_to_db'] / results['load_csv_to_db_row_by_row']
+    print(f"Accélération : x{speedup:.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+"""
+Benchmark du calcul de vitesse / allure d'une trace GPX : ancien calcul point par point
+(`geopy.distance.geodesic`) contre le calcul vectorisé (`compute_speed_and_pace`).
+Vérifie aussi que les vitesses obtenues correspondent à celles de gps_data.csv.
+
+Utilisation (depuis le dossier src) :
+    python benchmarks/bench_gpx_speed.py [gps_data.csv] [--repeat N]
+"""
+
+import argparse
+import csv
+import os
+import sys
+import time
+
+import numpy as np
+from geopy.distance import geodesic
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from gps_processing import compute_speed_and_pace
+
+DEFAULT_CSV = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'gps_data.csv')
+
+# Écart maximal toléré avec les vitesses de référence (km/h)
+SPEED_TOLERANCE = 1e-4
+
+
+def read_points(csv_file_path):
+    """
+    Relit une trace au format de gps_data.csv (Timer;Latitude;Longitude;...).
+    """
+    with open(csv_file_path, newline='') as csv_file:
+        rows = list(csv.DictReader(csv_file, delimiter=';'))
+    latitude = np.array([float(row['Latitude']) for row in rows])
+    longitude = np.array([float(row['Longitude']) for row in rows])
+    times = np.array([float(row['Timer']) if row['Timer'] else np.nan for row in rows])
+    speeds = np.array([float(row['Vitesse']) for row in rows])
+    return latitude, longitude, times, speeds
+
+
+def per_point_speeds(latitude, longitude, times):
+    """
+    Reproduit l'ancien calcul de /api/upload-gpx, un appel à geodesic par paire de points.
+    """
+    speeds = [0.0]
+    for index in range(1, len(latitude)):
+        distance_km = geodesic((latitude[index - 1], longitude[index - 1]), (latitude[index], longitude[index])).km
+        time_diff_h = (times[index] - times[index - 1]) / 3600
+        speeds.append(distance_km / time_diff_h if time_diff_h > 0 else 0)
+    return np.array(speeds)
+
+
+def best_time(function, repeat):
+    best = None
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark du calcul de vitesse GPX.")
+    parser.add_argument('csv_file', nargs='?', default=DEFAULT_CSV)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    latitude, longitude, times, reference = read_points(args.csv_file)
+    print(f"{len(latitude)} points")
+
+    elapsed, speeds = best_time(lambda: per_point_speeds(latitude, longitude, times), args.repeat)
+    print(f"{'geodesic point par point':<26} {elapsed * 1000:9.2f} ms  écart max {np.max(np.abs(speeds - reference)):.2e} km/h")
+    baseline = elapsed
+
+    for method in ('vincenty', 'haversine'):
+        elapsed, (_, speeds, _) = best_time(
+            lambda: compute_speed_and_pace(latitude, longitude, times, method=method), args.repeat
+        )
+        error = np.max(np.abs(speeds - reference))
+        status = "OK" if method != 'vincenty' or error <= SPEED_TOLERANCE else "ÉCART"
+        print(f"{method + ' vectorisé':<26} {elapsed * 1000:9.2f} ms  écart max {error:.2e} km/h  "
+              f"x{baseline / elapsed:.0f}  {status}")
+
+
+if __name__ == "__main__":
+    main()
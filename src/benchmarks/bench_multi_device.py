@@ -0,0 +1,62 @@
+"""
+Benchmark de la réception asynchrone multi-appareils : débit total (lignes/s)
+en fonction du nombre de faux ESP32 (pty) connectés en même temps.
+
+Utilisation (depuis le dossier src) :
+    python benchmarks/bench_multi_device.py [--devices 1 2 4 8] [--rows 20000]
+"""
+
+import argparse
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from database_manager import DatabaseManager
+from fake_esp32 import FakeESP32, synthetic_lines
+from multi_device_receiver import MultiDeviceReceiver
+
+
+def run(device_count, rows_per_device):
+    """
+    Lance `device_count` faux ESP32 et retourne (lignes en base, secondes, statistiques).
+    """
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        db_name = os.path.join(tmp_dir, 'bench.db')
+        DatabaseManager(db_name).initialize_database()
+
+        fakes = [FakeESP32(list(synthetic_lines(rows_per_device))).start() for _ in range(device_count)]
+        devices = {f"kit{index}": fake.port for index, fake in enumerate(fakes)}
+        receiver = MultiDeviceReceiver(devices, db_name=db_name, csv_file=None, flush_size=2000)
+
+        start = time.perf_counter()
+        results = receiver.listen()
+        elapsed = time.perf_counter() - start
+
+        for fake in fakes:
+            fake.join(1)
+            fake.close()
+
+        with sqlite3.connect(db_name) as connection:
+            rows = connection.execute("SELECT COUNT(*) FROM sensor_data").fetchone()[0]
+    return rows, elapsed, results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de la réception multi-appareils.")
+    parser.add_argument('--devices', type=int, nargs='+', default=[1, 2, 4, 8])
+    parser.add_argument('--rows', type=int, default=20000, help="Lignes envoyées par appareil")
+    args = parser.parse_args()
+
+    for device_count in args.devices:
+        rows, elapsed, results = run(device_count, args.rows)
+        errors = [device["error"] for device in results["devices"] if device["error"]]
+        print(f"{device_count:>3} appareil(s)  {rows:>9} lignes  {elapsed:8.3f} s  "
+              f"{rows / elapsed:>12,.0f} lignes/s  erreurs : {len(errors)}")
+
+
+if __name__ == "__main__":
+    main()
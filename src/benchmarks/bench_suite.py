@@ -0,0 +1,317 @@
+"""
+Suite de benchmarks reproductible sur des données synthétiques (voir synthetic_data.py) :
+chargement CSV (`load_csv_to_db`), routes de lecture via le client de test Flask,
+traitement GPX (`write_gps_csv`) et réception série (`BluetoothReceiver.listen`) sur un
+faux ESP32. Les résultats sont enregistrés en JSON ; `--compare` les compare à une
+exécution précédente et signale les régressions (code de sortie 1).
+
+Utilisation (depuis le dossier src) :
+    python benchmarks/bench_suite.py [--rows 200000] [--repeat 3] [--output resultats.json]
+    python benchmarks/bench_suite.py --compare benchmarks/results/reference.json
+"""
+
+import argparse
+import json
+import os
+import platform
+import shutil
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from bluetooth_receiver import BluetoothReceiver
+from database_manager import DatabaseManager
+from db_connection import close_all_pools
+from fake_esp32 import FakeESP32
+from gps_processing import write_gps_csv
+from synthetic_data import generate_gpx, generate_lines, write_session_csv
+
+RESULTS_DIRECTORY = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'results')
+
+# Ralentissement (relatif) au-delà duquel un cas est signalé comme régression
+DEFAULT_THRESHOLD = 0.10
+
+# Écart absolu (s) en dessous duquel une différence est attribuée au bruit de mesure
+NOISE_FLOOR_S = 0.002
+
+# Routes de lecture mesurées : (nom, URL, en-têtes, lignes lues par la route)
+ENDPOINT_CASES = [
+    ("sensor-data", "/api/sensor-data", {}, "sensor"),
+    ("sensor-data ndjson", "/api/sensor-data?format=ndjson", {}, "sensor"),
+    ("sensor-data gzip", "/api/sensor-data", {"Accept-Encoding": "gzip"}, "sensor"),
+    ("sensor-data max_points", "/api/sensor-data?max_points=2000", {}, "sensor"),
+    ("sensor-data binary", "/api/sensor-data/binary", {}, "sensor"),
+    ("gait-analytics", "/api/gait-analytics", {}, "sensor"),
+    ("gpx-data", "/api/gpx-data", {}, "gpx"),
+    ("gps-trace", "/api/gps-trace", {}, "positions"),
+]
+
+ROW_COUNT_QUERIES = {
+    "sensor": "SELECT COUNT(*) FROM sensor_data",
+    "gpx": "SELECT COUNT(*) FROM gpx_data",
+    "positions": "SELECT COUNT(*) FROM gpx_data WHERE Latitude IS NOT NULL AND Longitude IS NOT NULL",
+}
+
+
+def measure(function, repeat, setup=None):
+    """
+    Exécute `function` `repeat` fois (après `setup` à chaque fois, non chronométré).
+
+    :return: (durées en secondes, dernier résultat)
+    """
+    timings = []
+    result = None
+    for _ in range(repeat):
+        if setup is not None:
+            setup()
+        start = time.perf_counter()
+        result = function()
+        timings.append(time.perf_counter() - start)
+    return timings, result
+
+
+def summarize(timings, items=None, unit="lignes"):
+    summary = {
+        "best_s": min(timings),
+        "median_s": statistics.median(timings),
+        "timings_s": timings,
+    }
+    if items:
+        summary["items"] = items
+        summary["unit"] = unit
+        summary["items_per_s"] = items / min(timings)
+    return summary
+
+
+def count_rows(db_name, query="SELECT COUNT(*) FROM sensor_data"):
+    with sqlite3.connect(db_name) as connection:
+        return connection.execute(query).fetchone()[0]
+
+
+def reset_database(db_name):
+    """
+    Base neuve, schéma créé (les connexions du pool vers l'ancienne base sont fermées).
+    """
+    close_all_pools()
+    for suffix in ("", "-wal", "-shm"):
+        if os.path.exists(db_name + suffix):
+            os.remove(db_name + suffix)
+    DatabaseManager(db_name).initialize_database()
+
+
+def bench_csv_ingest(csv_file_path, work_dir, repeat):
+    """
+    Chargement du CSV synthétique dans une base neuve à chaque répétition.
+    Retourne aussi la base chargée, réutilisée par les autres cas.
+    """
+    db_name = os.path.join(work_dir, 'ingest.db')
+    timings, rows = measure(
+        lambda: DatabaseManager(db_name).load_csv_to_db(csv_file_path), repeat, lambda: reset_database(db_name)
+    )
+    close_all_pools()
+    return {"load_csv_to_db": summarize(timings, rows)}, db_name
+
+
+def bench_endpoints(db_name, work_dir, repeat):
+    """
+    Routes de lecture via le client de test Flask (réponse entièrement lue, sans cache HTTP).
+    """
+    from server import Server
+
+    row_counts = {name: count_rows(db_name, query) for name, query in ROW_COUNT_QUERIES.items()}
+    previous_directory = os.getcwd()
+    os.chdir(work_dir)  # Fichiers créés par le serveur (rapports, port...) dans le dossier temporaire
+    server = Server(db_name=db_name, user_db_name=os.path.join(work_dir, 'users.db'), remote_elevation=False)
+    try:
+        client = server.app.test_client()
+        results = {}
+        for name, url, headers, counted in ENDPOINT_CASES:
+            def get():
+                response = client.get(url, headers=headers)
+                data = response.get_data()
+                if response.status_code != 200:
+                    raise RuntimeError(f"{url} : statut {response.status_code}")
+                return len(data)
+
+            # L'analyse de la foulée est mesurée sans son cache de résultats
+            setup = server.gait_cache.clear if name == "gait-analytics" else None
+            timings, size = measure(get, repeat, setup)
+            results[f"GET {name}"] = dict(summarize(timings, row_counts[counted]), response_bytes=size)
+
+        # Requête conditionnelle : 304 sans relire les mesures
+        etag = client.get("/api/sensor-data?max_points=3").headers["ETag"]
+        timings, _ = measure(lambda: client.get("/api/sensor-data", headers={"If-None-Match": etag}), repeat)
+        results["GET sensor-data 304"] = summarize(timings)
+        return results
+    finally:
+        server.close()
+        os.chdir(previous_directory)
+
+
+def bench_gpx(gpx_points, work_dir, repeat, seed):
+    """
+    Analyse d'une trace GPX et écriture du CSV de la trace (tâche de /api/upload-gpx).
+    """
+    gpx_data = generate_gpx(gpx_points, seed=seed)
+    csv_file_path = os.path.join(work_dir, 'gps_data.csv')
+    results = {}
+    for method in ("vincenty", "haversine"):
+        timings, result = measure(lambda: write_gps_csv(gpx_data, csv_file_path, method=method), repeat)
+        results[f"write_gps_csv {method}"] = summarize(timings, result["points"], unit="points")
+    return results
+
+
+def bench_serial(serial_rows, work_dir, repeat, seed):
+    """
+    Réception d'une session complète depuis un faux ESP32 (pty), en ASCII puis en trames binaires.
+    """
+    lines = list(generate_lines(serial_rows, seed=seed))
+    results = {}
+    for protocol in ("ascii", "binary"):
+        db_name = os.path.join(work_dir, f'serial-{protocol}.db')
+
+        def receive():
+            reset_database(db_name)
+            fake = FakeESP32(lines, supports_binary=True).start()
+            receiver = BluetoothReceiver(
+                port=fake.port, baudrate=921600, db_name=db_name,
+                csv_file=os.path.join(work_dir, f'serial-{protocol}.csv'), protocol=protocol
+            )
+            receiver.connect()
+            start = time.perf_counter()
+            receiver.listen()
+            elapsed = time.perf_counter() - start
+            fake.join(1)
+            fake.close()
+            return elapsed, count_rows(db_name)
+
+        timings = []
+        rows = 0
+        for _ in range(repeat):
+            elapsed, rows = receive()
+            timings.append(elapsed)
+        if rows != serial_rows:
+            raise RuntimeError(f"Réception {protocol} : {rows} lignes en base sur {serial_rows}")
+        results[f"BluetoothReceiver.listen {protocol}"] = summarize(timings, rows)
+    close_all_pools()
+    return results
+
+
+def git_revision():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True,
+            cwd=os.path.dirname(os.path.abspath(__file__))
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results, reference, threshold):
+    """
+    Affiche l'écart de chaque cas avec l'exécution de référence.
+
+    :return: Noms des cas plus lents que la référence de plus de `threshold`
+    """
+    regressions = []
+    print(f"\nComparaison avec {reference.get('revision')} du {reference.get('date')} :")
+    for name, result in results.items():
+        previous = reference.get("results", {}).get(name)
+        if previous is None:
+            print(f"  {name:<38} nouveau cas")
+            continue
+        ratio = result["best_s"] / previous["best_s"] if previous["best_s"] else float("inf")
+        significant = abs(result["best_s"] - previous["best_s"]) > NOISE_FLOOR_S
+        status = ""
+        if significant and ratio > 1 + threshold:
+            status = "RÉGRESSION"
+        elif significant and ratio < 1 - threshold:
+            status = "mieux"
+        if status == "RÉGRESSION":
+            regressions.append(name)
+        print(f"  {name:<38} {previous['best_s'] * 1000:10.2f} ms -> {result['best_s'] * 1000:10.2f} ms  "
+              f"x{ratio:5.2f}  {status}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Suite de benchmarks sur des données synthétiques.")
+    parser.add_argument('--rows', type=int, default=200000, help="Lignes de la session CSV synthétique")
+    parser.add_argument('--gpx-points', type=int, default=20000)
+    parser.add_argument('--serial-rows', type=int, default=50000, help="Lignes envoyées par le faux ESP32")
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--only', nargs='+', choices=['ingest', 'endpoints', 'gpx', 'serial'],
+                        help="Groupes de cas à exécuter (tous par défaut ; 'endpoints' charge aussi le CSV)")
+    parser.add_argument('--output', help="Fichier JSON des résultats (par défaut benchmarks/results/<date>.json)")
+    parser.add_argument('--compare', help="Fichier JSON d'une exécution précédente")
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD,
+                        help="Ralentissement relatif signalé comme régression (0.10 = 10 %%)")
+    args = parser.parse_args()
+    groups = set(args.only or ['ingest', 'endpoints', 'gpx', 'serial'])
+
+    results = {}
+    work_dir = tempfile.mkdtemp(prefix='proadapt-bench-')
+    try:
+        if groups & {'ingest', 'endpoints'}:
+            csv_file_path = os.path.join(work_dir, 'session.csv')
+            start = time.perf_counter()
+            write_session_csv(csv_file_path, args.rows, seed=args.seed)
+            print(f"Session synthétique : {args.rows} lignes en {time.perf_counter() - start:.1f} s")
+            ingest_results, db_name = bench_csv_ingest(csv_file_path, work_dir, args.repeat)
+            if 'ingest' in groups:
+                results.update(ingest_results)
+            if 'endpoints' in groups:
+                results.update(bench_endpoints(db_name, work_dir, args.repeat))
+        if 'gpx' in groups:
+            results.update(bench_gpx(args.gpx_points, work_dir, args.repeat, args.seed))
+        if 'serial' in groups:
+            results.update(bench_serial(args.serial_rows, work_dir, args.repeat, args.seed))
+    finally:
+        close_all_pools()
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    print()
+    for name, result in results.items():
+        rate = f"{result['items_per_s']:>14,.0f} {result['unit']}/s" if "items_per_s" in result else ""
+        print(f"{name:<40} {result['best_s'] * 1000:10.2f} ms  (médiane {result['median_s'] * 1000:10.2f} ms)  {rate}")
+
+    report = {
+        "date": datetime.now().isoformat(timespec='seconds'),
+        "revision": git_revision(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "parameters": {
+            "rows": args.rows, "gpx_points": args.gpx_points, "serial_rows": args.serial_rows,
+            "repeat": args.repeat, "seed": args.seed,
+        },
+        "results": results,
+    }
+    output = args.output
+    if output is None:
+        os.makedirs(RESULTS_DIRECTORY, exist_ok=True)
+        output = os.path.join(RESULTS_DIRECTORY, datetime.now().strftime('%Y%m%d-%H%M%S') + '.json')
+    with open(output, 'w') as result_file:
+        json.dump(report, result_file, indent=2)
+    print(f"\nRésultats enregistrés dans {output}")
+
+    if args.compare:
+        with open(args.compare) as reference_file:
+            reference = json.load(reference_file)
+        if reference.get("parameters") != report["parameters"]:
+            print("Attention : paramètres différents de ceux de la référence.")
+        regressions = compare(results, reference, args.threshold)
+        if regressions:
+            print(f"{len(regressions)} régression(s) au-delà de {args.threshold:.0%}.")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
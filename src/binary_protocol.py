@@ -0,0 +1,213 @@
+# Protocole binaire à trames fixes entre l'ESP32 et le récepteur (alternative aux lignes ASCII)
+#
+# Négociation : le récepteur envoie "18B" au lieu de "18". Un ESP32 qui gère le binaire
+# répond "184B" puis envoie des trames ; un ancien firmware répond "184" et on reste en ASCII.
+#
+# Trame (petit-boutiste) :
+#   0   sync       uint16  0xA55A
+#   2   flags      uint8   bit 0 : bloc GPS présent, bit 7 : fin de transmission
+#   3   Timer      uint32  ms
+#   7   IMU        12 x int16 (Accel1XYZ, Gyro1XYZ, Accel2XYZ, Gyro2XYZ)
+#   31  Flexion    uint16
+#   33  [GPS]      Latitude int32 (1e-7 °), Longitude int32 (1e-7 °), Altitude float32,
+#                  Vitesse float32, Orientation float32, Satellites uint8, HDOP uint8 (x10)
+#   fin crc        uint16  CRC-16/CCITT-FALSE des octets entre sync et crc
+#
+# Une trame de fin ne contient que sync, flags et crc.
+
+import binascii
+import struct
+
+import numpy as np
+
+SYNC_WORD = 0xA55A
+SYNC_BYTES = struct.pack("<H", SYNC_WORD)
+
+FLAG_GPS = 0x01
+FLAG_END = 0x80
+
+BINARY_REQUEST = b"18B"
+BINARY_START = "184B"
+
+_IMU_FORMAT = "<BI12hH"
+_GPS_FORMAT = "<iifffBB"
+_IMU_SIZE = struct.calcsize(_IMU_FORMAT)
+_GPS_SIZE = struct.calcsize(_GPS_FORMAT)
+
+IMU_FRAME_SIZE = 2 + _IMU_SIZE + 2
+GPS_FRAME_SIZE = IMU_FRAME_SIZE + _GPS_SIZE
+END_FRAME_SIZE = 2 + 1 + 2
+
+_BASE_FIELDS = [
+    ("sync", "<u2"), ("flags", "u1"), ("Timer", "<u4"),
+    ("Accel1X", "<i2"), ("Accel1Y", "<i2"), ("Accel1Z", "<i2"),
+    ("Gyro1X", "<i2"), ("Gyro1Y", "<i2"), ("Gyro1Z", "<i2"),
+    ("Accel2X", "<i2"), ("Accel2Y", "<i2"), ("Accel2Z", "<i2"),
+    ("Gyro2X", "<i2"), ("Gyro2Y", "<i2"), ("Gyro2Z", "<i2"),
+    ("Flexion", "<u2"),
+]
+_GPS_FIELDS = [
+    ("Latitude", "<i4"), ("Longitude", "<i4"), ("Altitude", "<f4"),
+    ("Vitesse", "<f4"), ("Orientation", "<f4"), ("Satellites", "u1"), ("HDOP", "u1"),
+]
+IMU_FRAME_DTYPE = np.dtype(_BASE_FIELDS + [("crc", "<u2")])
+GPS_FRAME_DTYPE = np.dtype(_BASE_FIELDS + _GPS_FIELDS + [("crc", "<u2")])
+
+_IMU_COLUMNS = [name for name, _ in _BASE_FIELDS[2:]]
+
+
+def crc16(data):
+    """
+    CRC-16/CCITT-FALSE (polynôme 0x1021, valeur initiale 0xFFFF).
+    """
+    return binascii.crc_hqx(data, 0xFFFF)
+
+
+def _frame_size(flags):
+    if flags & FLAG_END:
+        return END_FRAME_SIZE
+    return GPS_FRAME_SIZE if flags & FLAG_GPS else IMU_FRAME_SIZE
+
+
+def _finish_frame(body):
+    return SYNC_BYTES + body + struct.pack("<H", crc16(body))
+
+
+def encode_frame(row):
+    """
+    Encode une mesure (21 valeurs dans l'ordre de HEADERS, GPS à None si absent) en trame.
+    Utilisé par le faux ESP32 et les tests.
+    """
+    timer = int(row[0])
+    imu = [int(value or 0) for value in row[1:13]]
+    flexion = int(row[13] or 0)
+    gps = row[14:21]
+    has_gps = gps[0] not in (None, "") and gps[1] not in (None, "")
+
+    body = struct.pack(_IMU_FORMAT, FLAG_GPS if has_gps else 0, timer, *imu, flexion)
+    if has_gps:
+        latitude, longitude, altitude, speed, orientation, satellites, hdop = gps
+        body += struct.pack(
+            _GPS_FORMAT,
+            round(float(latitude) * 1e7), round(float(longitude) * 1e7),
+            float(altitude or 0), float(speed or 0), float(orientation or 0),
+            int(satellites or 0), min(255, round(float(hdop or 0) * 10)),
+        )
+    return _finish_frame(body)
+
+
+def encode_end_frame():
+    return _finish_frame(bytes([FLAG_END]))
+
+
+class FrameDecoder:
+    def __init__(self):
+        self.buffer = bytearray()
+        self.finished = False
+        self.frames = 0
+        self.crc_errors = 0
+        self.skipped_bytes = 0
+
+    def stats(self):
+        return {
+            "frames": self.frames,
+            "crc_errors": self.crc_errors,
+            "skipped_bytes": self.skipped_bytes,
+        }
+
+    def feed(self, data):
+        """
+        Ajoute des octets reçus et retourne les mesures complètes décodées
+        (listes de 21 valeurs dans l'ordre de HEADERS).
+        Les octets d'une trame incomplète sont gardés pour l'appel suivant.
+        """
+        if self.finished:
+            return []
+        self.buffer += data
+        imu_offsets, gps_offsets, consumed = self._scan()
+
+        rows = self._decode(imu_offsets, gps_offsets)
+        del self.buffer[:consumed]
+        return rows
+
+    def _scan(self):
+        """
+        Repère les trames valides (sync, taille, CRC) et retourne leurs positions.
+        """
+        buffer = self.buffer
+        length = len(buffer)
+        raw = np.frombuffer(buffer, dtype=np.uint8)
+        candidates = np.flatnonzero((raw[:-1] == SYNC_BYTES[0]) & (raw[1:] == SYNC_BYTES[1])) if length > 1 else []
+
+        imu_offsets = []
+        gps_offsets = []
+        position = 0
+        for start in candidates.tolist() if len(candidates) else []:
+            if start < position:
+                continue
+            if start + 3 > length:
+                break
+            size = _frame_size(buffer[start + 2])
+            if start + size > length:
+                break
+
+            end = start + size
+            expected = buffer[end - 2] | (buffer[end - 1] << 8)
+            if crc16(buffer[start + 2:end - 2]) != expected:
+                self.crc_errors += 1
+                continue
+
+            self.skipped_bytes += start - position
+            position = end
+            flags = buffer[start + 2]
+            if flags & FLAG_END:
+                self.finished = True
+                break
+            self.frames += 1
+            (gps_offsets if flags & FLAG_GPS else imu_offsets).append(start)
+        else:
+            # Aucune trame en cours : on ne garde qu'un éventuel début de mot de synchronisation
+            keep_from = length - 1 if length and buffer[-1] == SYNC_BYTES[0] else length
+            if keep_from > position:
+                self.skipped_bytes += keep_from - position
+                position = keep_from
+
+        return imu_offsets, gps_offsets, position
+
+    def _decode(self, imu_offsets, gps_offsets):
+        """
+        Décode toutes les trames repérées d'un coup avec NumPy.
+        """
+        if not imu_offsets and not gps_offsets:
+            return []
+        raw = np.frombuffer(self.buffer, dtype=np.uint8)
+        decoded = []
+
+        if imu_offsets:
+            frames = _gather(raw, imu_offsets, IMU_FRAME_DTYPE)
+            imu = [frames[name].tolist() for name in _IMU_COLUMNS]
+            empty_gps = [None] * 7
+            decoded.extend(zip(imu_offsets, (list(values) + empty_gps for values in zip(*imu))))
+
+        if gps_offsets:
+            frames = _gather(raw, gps_offsets, GPS_FRAME_DTYPE)
+            columns = [frames[name].tolist() for name in _IMU_COLUMNS]
+            columns += [
+                (frames["Latitude"] / 1e7).tolist(),
+                (frames["Longitude"] / 1e7).tolist(),
+                frames["Altitude"].astype(np.float64).tolist(),
+                frames["Vitesse"].astype(np.float64).tolist(),
+                frames["Orientation"].astype(np.float64).tolist(),
+                frames["Satellites"].tolist(),
+                (frames["HDOP"] / 10).tolist(),
+            ]
+            decoded.extend(zip(gps_offsets, (list(values) for values in zip(*columns))))
+
+        if imu_offsets and gps_offsets:
+            decoded.sort(key=lambda item: item[0])
+        return [row for _, row in decoded]
+
+
+def _gather(raw, offsets, dtype):
+    indexes = np.asarray(offsets)[:, None] + np.arange(dtype.itemsize)
+    return raw[indexes].view(dtype).reshape(-1)
@@ -1,9 +1,24 @@
 import serial
-import sqlite3
 import os
 import csv
 import sys
 
+from db_connection import get_pool
+from database_manager import DatabaseManager, SENSOR_COLUMNS, to_integer
+from ingest_pipeline import IngestWriter, DEFAULT_QUEUE_SIZE, DEFAULT_FLUSH_SIZE, DEFAULT_FLUSH_INTERVAL
+from binary_protocol import FrameDecoder, BINARY_REQUEST, BINARY_START
+from metrics import REGISTRY
+
+MALFORMED_LINES = REGISTRY.counter(
+    "proadapt_receiver_malformed_lines_total", "Lignes reçues ignorées (nombre de champs incorrect)", ("receiver",)
+)
+DROPPED_FRAMES = REGISTRY.counter(
+    "proadapt_receiver_crc_errors_total", "Trames binaires ignorées (CRC invalide)"
+)
+SKIPPED_BYTES = REGISTRY.counter(
+    "proadapt_receiver_skipped_bytes_total", "Octets ignorés entre deux trames binaires valides"
+)
+
 HEADERS = [
     "Timer", "Accel1X", "Accel1Y", "Accel1Z", 
     "Gyro1X", "Gyro1Y", "Gyro1Z", "Accel2X", 
@@ -29,13 +44,28 @@ def delete_file_if_exists(file_path):
 
 
 class BluetoothReceiver:
-    def __init__(self, port="/dev/tty.ESP32R", baudrate=9600, db_name="sensor_data.db", csv_file="./data/sensor_data.csv"):
+    def __init__(self, port="/dev/tty.ESP32R", baudrate=9600, db_name="sensor_data.db", csv_file="./data/sensor_data.csv",
+                 queue_size=DEFAULT_QUEUE_SIZE, flush_size=DEFAULT_FLUSH_SIZE, flush_interval=DEFAULT_FLUSH_INTERVAL,
+                 verbose=False, protocol="ascii"):
+        """
+        :param protocol: 'ascii' (lignes séparées par ';') ou 'binary' (trames, voir binary_protocol.py).
+                         En 'binary', un ESP32 qui ne gère que l'ASCII est détecté à la poignée de main.
+        """
         self.port = port
         self.baudrate = baudrate
         self.db_name = db_name
         self.csv_file = csv_file
         delete_file_if_exists(file_path=self.csv_file) # Supprime le fichier s'il existe déjà
         self.serial_connection = None
+        # Réglages de l'écriture par paquets (voir ingest_pipeline.py)
+        self.queue_size = queue_size
+        self.flush_size = flush_size
+        self.flush_interval = flush_interval
+        self.verbose = verbose
+        self.writer = None
+        self.malformed_lines = 0
+        self.protocol = protocol
+        self.decoder = None
 
     def connect(self):
         """
@@ -49,30 +79,28 @@ class BluetoothReceiver:
     
     def insert_data_to_db(self, data):
         """
-        Insère les données dans les tables 'sensor_data' et 'gpx_data'.
+        Insère une seule ligne dans les tables 'sensor_data' et 'gpx_data'.
+        L'écoute (`listen`) passe par l'écriture par paquets d'IngestWriter.
         """
         try:
-            with sqlite3.connect(self.db_name) as conn:
+            with get_pool(self.db_name).transaction() as conn:
                 cursor = conn.cursor()
                 
-                # Insérer dans la table sensor_data (les 13 premières colonnes)
-                cursor.execute('''
-                    INSERT INTO sensor_data (
-                        Timer, Accel1X, Accel1Y, Accel1Z, 
-                        Gyro1X, Gyro1Y, Gyro1Z, 
-                        Accel2X, Accel2Y, Accel2Z, 
-                        Gyro2X, Gyro2Y, Gyro2Z
-                    ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-                ''', data[:13])
-                
+                db_manager = DatabaseManager(self.db_name)
+                # Mesures (les 13 premières colonnes), selon le stockage de la base, et agrégats
+                db_manager.insert_sensor_columns(cursor, {
+                    column: [to_integer(value)] for column, value in zip(SENSOR_COLUMNS[:13], data[:13])
+                })
+
                 # Insérer dans la table gpx_data (les données GPS)
                 cursor.execute('''
                     INSERT INTO gpx_data (
                         Timer, Latitude, Longitude, Altitude, Vitesse, Orientation, Satellites, HDOP
                     ) VALUES (?, ?, ?, ?, ?, ?, ?, ?)
                 ''', [data[0], data[14], data[15], data[16], data[17], data[18], data[19], data[20]])
+                db_manager.bump_data_versions(cursor, 'sensor_data')
+                db_manager.bump_data_versions(cursor, 'gpx_data')
                 
-                conn.commit()
                 print("Données insérées dans la base de données :", data)
         except Exception as e:
             print(f"Erreur lors de l'insertion dans la base de données : {e}")
@@ -92,15 +120,25 @@ class BluetoothReceiver:
         """
         Écoute les données transmises par l'ESP32, gère l'envoi de la commande '18' 
         et traite les données reçues jusqu'à recevoir 186.
+        En mode binaire, la commande '18B' est envoyée : l'ESP32 répond '184B' s'il
+        accepte les trames binaires, sinon '184' et la réception reste en ASCII.
         """
         if not self.serial_connection:
             print("Not connected to any device.")
             return
 
+        # Les lignes valides sont confiées au thread d'écriture (CSV + SQLite par paquets)
+        self.writer = IngestWriter(
+            self.db_name, self.csv_file, HEADERS,
+            queue_size=self.queue_size, flush_size=self.flush_size, flush_interval=self.flush_interval
+        )
+        self.writer.start()
+
         try:
-            # Envoie de la commande '18' pour demander les données
-            self.serial_connection.write(b'18\n')
-            print("Sent '18' to request data.")
+            # Envoie de la commande '18' pour demander les données ('18B' pour proposer le binaire)
+            request = BINARY_REQUEST if self.protocol == "binary" else b'18'
+            self.serial_connection.write(request + b'\n')
+            print(f"Sent '{request.decode()}' to request data.")
 
             data_started = False
 
@@ -111,13 +149,20 @@ class BluetoothReceiver:
                 if not raw_data:
                     continue  # Ignore les lignes vides
 
-                print(f"Received: {raw_data}")
+                if self.verbose:
+                    print(f"Received: {raw_data}")
 
                 if raw_data == "184":  # Début de la transmission
                     print("Start of data transmission.")
                     data_started = True
                     continue
 
+                if raw_data == BINARY_START:  # Début de la transmission en trames binaires
+                    print("Start of binary data transmission.")
+                    self.listen_binary()
+                    print("End of data transmission.")
+                    break
+
                 if raw_data == "186":  # Fin de la transmission
                     print("End of data transmission.")
                     break
@@ -128,12 +173,11 @@ class BluetoothReceiver:
 
                 # Les données doivent correspondre aux en-têtes
                 data = raw_data.split(";")
-                print("ICI : ", len(data) == len(HEADERS))
-                print("LEN DATA et LEN HEADERS : ", len(data), len(HEADERS))
                 if len(data) == len(HEADERS):
-                    self.write_data_to_csv(data)  # Écriture dans le fichier CSV
-                    self.insert_data_to_db(data)  # Ajout dans la base de données
+                    self.writer.put(data)  # Écriture CSV + base de données par paquets
                 else:
+                    self.malformed_lines += 1
+                    MALFORMED_LINES.inc(receiver="bluetooth")
                     print(f"Unexpected data format: {raw_data}")
 
         except KeyboardInterrupt:
@@ -142,10 +186,34 @@ class BluetoothReceiver:
         except Exception as e:
             print(f"Error: {e}")
         finally:
+            # Écrit les dernières lignes en attente avant de fermer
+            self.writer.stop()
+            stats = self.writer.stats()
+            stats["malformed_lines"] = self.malformed_lines
+            if self.decoder:
+                stats.update(self.decoder.stats())
+            print(f"Ingest stats: {stats}")
             if self.serial_connection:
                 self.serial_connection.close()
                 print("Connection closed.")
 
+    def listen_binary(self):
+        """
+        Lit les trames binaires par blocs et les décode en lot jusqu'à la trame de fin.
+        """
+        self.decoder = FrameDecoder()
+        crc_errors = skipped_bytes = 0
+        while not self.decoder.finished:
+            chunk = self.serial_connection.read(max(1, self.serial_connection.in_waiting))
+            if not chunk:
+                continue
+            for data in self.decoder.feed(chunk):
+                self.writer.put(data)
+            if self.decoder.crc_errors != crc_errors or self.decoder.skipped_bytes != skipped_bytes:
+                DROPPED_FRAMES.inc(self.decoder.crc_errors - crc_errors)
+                SKIPPED_BYTES.inc(self.decoder.skipped_bytes - skipped_bytes)
+                crc_errors, skipped_bytes = self.decoder.crc_errors, self.decoder.skipped_bytes
+
 if __name__ == "__main__":
     receiver = BluetoothReceiver()
     receiver.connect()
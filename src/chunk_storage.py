@@ -0,0 +1,288 @@
+# Stockage compact des mesures IMU : paquets de lignes compressés en BLOB
+#
+# Au lieu d'une ligne SQLite par mesure (14 colonnes INTEGER dans 'sensor_data'), la table
+# 'sensor_chunks' contient une ligne par session, appareil et fenêtre de CHUNK_SPAN_MS ms
+# [start_timer, start_timer + CHUNK_SPAN_MS[. Le BLOB `payload` est le format colonne par
+# colonne de columnar.py, précédé d'un octet de version du format et compressé avec zlib :
+#   - Timer est enregistré en décalage par rapport à start_timer,
+#   - les colonnes entières sont codées en différences successives, dans le plus petit type
+#     entier qui les contient (int16 pour les IMU et pour Timer),
+#   - une colonne '_nulls' (masque de bits, bit i = i-ème colonne de SENSOR_COLUMNS) seulement
+#     si des valeurs sont absentes ; une voie entièrement vide n'est pas enregistrée,
+#   - avant zlib, les octets sont regroupés par rang (octets de poids faible, puis de poids fort) :
+#     les octets de poids fort, qui varient peu, se compressent bien mieux.
+# Une lecture par plage de temps lit quelques BLOB de la session au lieu de milliers de lignes.
+# Les lignes sans Timer ne sont pas conservées.
+#
+# Le mode de stockage est propre à chaque base (table 'database_settings', clé 'sensor_storage') :
+# 'rows' (par défaut) ou 'chunks'. Une base neuve prend la valeur de la variable d'environnement
+# PROADAPT_SENSOR_STORAGE ; une base existante se convertit avec ce module :
+#     python chunk_storage.py sensor_data.db [--vacuum]
+# DatabaseManager choisit le stockage à l'écriture et à la lecture, les routes ne changent pas.
+
+import argparse
+import os
+import time
+import zlib
+
+import numpy as np
+
+from columnar import decode_columnar, encode_columnar, integer_type_code
+from rollups import NO_SESSION_KEY
+
+CHUNK_TABLE = "sensor_chunks"
+
+ROW_STORAGE = "rows"
+CHUNK_STORAGE = "chunks"
+SENSOR_STORAGES = (ROW_STORAGE, CHUNK_STORAGE)
+
+# Durée couverte par un paquet (ms) : 400 mesures à 40 Hz, 10 000 à 1 kHz
+CHUNK_SPAN_MS = 10000
+
+# Niveau de compression zlib (1 : rapide, 9 : compact)
+COMPRESSION_LEVEL = 6
+
+# Clé des mesures sans appareil (celles sans session sont rangées sous NO_SESSION_KEY, comme dans rollups.py)
+NO_DEVICE_KEY = ""
+
+NULLS_COLUMN = "_nulls"
+
+CHUNK_FORMAT_VERSION = 1
+
+
+def chunk_fields():
+    """
+    Colonnes de la table des paquets (définitions SQL).
+    """
+    return [
+        "session_key INTEGER NOT NULL", "device_key TEXT NOT NULL", "start_timer INTEGER NOT NULL",
+        "sample_count INTEGER NOT NULL", "payload BLOB NOT NULL",
+        "PRIMARY KEY (session_key, start_timer, device_key)",
+    ]
+
+
+def _shuffle(data):
+    """
+    Regroupe les octets de rang pair puis ceux de rang impair (longueur paire, alignée par encode_columnar).
+    """
+    return np.frombuffer(data, dtype=np.uint8).reshape(-1, 2).T.tobytes()
+
+
+def _unshuffle(data):
+    return np.frombuffer(data, dtype=np.uint8).reshape(2, -1).T.tobytes()
+
+
+def encode_chunk(columns, start_timer, column_names):
+    """
+    Compresse un paquet de mesures triées par Timer.
+
+    :param columns: Dictionnaire nom -> tableau float64 (NaN pour une valeur absente), Timer compris
+    :param column_names: Ordre de référence des colonnes (bits du masque '_nulls')
+    :return: bytes
+    """
+    encoded = []
+    nulls = np.zeros(len(columns["Timer"]), dtype=np.int64)
+    for bit, name in enumerate(column_names):
+        values = columns.get(name)
+        if values is None:
+            continue
+        if name == "Timer":
+            values = values - start_timer
+        missing = np.isnan(values)
+        if missing.all():
+            continue
+        if missing.any():
+            nulls |= missing.astype(np.int64) << bit
+            values = np.where(missing, 0, values)
+        if np.array_equal(values, np.floor(values)):
+            deltas = np.diff(values.astype(np.int64), prepend=0)
+            encoded.append((name, deltas, integer_type_code(deltas)))
+        else:
+            encoded.append((name, values, "d"))
+    if nulls.any():
+        encoded.append((NULLS_COLUMN, nulls, integer_type_code(nulls)))
+    payload = zlib.compress(_shuffle(encode_columnar(encoded)), COMPRESSION_LEVEL)
+    return bytes([CHUNK_FORMAT_VERSION]) + payload
+
+
+def decode_chunk(payload, start_timer, column_names):
+    """
+    Décompresse un paquet : dictionnaire nom -> tableau float64 (NaN pour une valeur absente),
+    avec toutes les colonnes de `column_names`.
+    """
+    if payload[0] != CHUNK_FORMAT_VERSION:
+        raise ValueError(f"Version du format des paquets non supportée : {payload[0]}")
+    stored = decode_columnar(_unshuffle(zlib.decompress(payload[1:])))
+    count = len(next(iter(stored.values()))) if stored else 0
+    nulls = stored.get(NULLS_COLUMN)
+    columns = {}
+    for bit, name in enumerate(column_names):
+        values = stored.get(name)
+        if values is None:
+            columns[name] = np.full(count, np.nan)
+            continue
+        if values.dtype.kind == "i":
+            values = np.cumsum(values, dtype=np.int64)
+        values = values.astype(np.float64)
+        if nulls is not None:
+            values[(nulls.astype(np.int64) >> bit) & 1 == 1] = np.nan
+        columns[name] = values
+    columns["Timer"] = columns["Timer"] + start_timer
+    return columns
+
+
+def _merge(first, second):
+    """
+    Réunit deux paquets de la même fenêtre, triés par Timer (l'ordre d'arrivée est gardé à Timer égal).
+    """
+    merged = {name: np.concatenate((first[name], second[name])) for name in first}
+    order = np.argsort(merged["Timer"], kind="stable")
+    return {name: values[order] for name, values in merged.items()}
+
+
+def append_chunks(cursor, columns, column_names, span_ms=CHUNK_SPAN_MS):
+    """
+    Ajoute un paquet de lignes aux paquets compressés, dans la transaction de l'appelant.
+    Les fenêtres déjà présentes sont relues, complétées puis réécrites.
+
+    :param columns: Dictionnaire nom -> valeurs converties (listes, None pour une valeur absente),
+                    avec Timer et éventuellement session_id et device_id
+    :return: Nombre de lignes conservées (celles qui ont un Timer)
+    """
+    if "Timer" not in columns:
+        return 0
+    timers = np.array(columns["Timer"], dtype=np.float64)
+    keep = ~np.isnan(timers)
+    if not keep.any():
+        return 0
+    count = len(timers)
+    sessions = columns.get("session_id")
+    session_keys = (np.full(count, NO_SESSION_KEY, dtype=np.int64) if sessions is None
+                    else np.nan_to_num(np.array(sessions, dtype=np.float64), nan=NO_SESSION_KEY).astype(np.int64))
+    devices = columns.get("device_id")
+    device_keys = np.array([NO_DEVICE_KEY if device is None else str(device) for device in devices]
+                           if devices is not None else [NO_DEVICE_KEY] * count)
+    values = {
+        name: (np.array(columns[name], dtype=np.float64) if name in columns else np.full(count, np.nan))
+        for name in column_names
+    }
+
+    windows = np.floor_divide(timers[keep], span_ms).astype(np.int64) * span_ms
+    session_keys, device_keys = session_keys[keep], device_keys[keep]
+    device_codes = np.unique(device_keys, return_inverse=True)[1]
+    values = {name: array[keep] for name, array in values.items()}
+    # Tri par (session, appareil, fenêtre) puis par Timer, en gardant l'ordre d'arrivée à Timer égal
+    order = np.lexsort((values["Timer"], windows, device_codes, session_keys))
+    windows, session_keys, device_keys = windows[order], session_keys[order], device_keys[order]
+    device_codes = device_codes[order]
+    values = {name: array[order] for name, array in values.items()}
+
+    boundaries = np.flatnonzero(
+        (np.diff(windows) != 0) | (np.diff(session_keys) != 0) | (np.diff(device_codes) != 0)
+    ) + 1
+    starts = np.concatenate(([0], boundaries))
+    ends = np.concatenate((boundaries, [len(windows)]))
+    for first, last in zip(starts.tolist(), ends.tolist()):
+        key = (int(session_keys[first]), str(device_keys[first]), int(windows[first]))
+        chunk = {name: array[first:last] for name, array in values.items()}
+        row = cursor.execute(
+            f"SELECT payload FROM {CHUNK_TABLE} WHERE session_key = ? AND device_key = ? AND start_timer = ?", key
+        ).fetchone()
+        if row is not None:
+            chunk = _merge(decode_chunk(row[0], key[2], column_names), chunk)
+        cursor.execute(
+            f"INSERT OR REPLACE INTO {CHUNK_TABLE} (session_key, device_key, start_timer, sample_count, payload) "
+            f"VALUES (?, ?, ?, ?, ?)",
+            key + (len(chunk["Timer"]), encode_chunk(chunk, key[2], column_names))
+        )
+    return int(keep.sum())
+
+
+def chunk_range(start=None, end=None, session_id=None, span_ms=CHUNK_SPAN_MS):
+    """
+    Clause WHERE sur la table des paquets pour une plage de Timer (paquets qui la chevauchent).
+    Utilise la clé primaire (session_key, start_timer) quand la session est fournie.
+    """
+    conditions = []
+    params = []
+    if session_id is not None:
+        conditions.append("session_key = ?")
+        params.append(session_id)
+    if start is not None:
+        conditions.append("start_timer > ?")
+        params.append(start - span_ms)
+    if end is not None:
+        conditions.append("start_timer <= ?")
+        params.append(end)
+    where_clause = "WHERE " + " AND ".join(conditions) if conditions else ""
+    return where_clause, params
+
+
+def iterate_chunks(connection, column_names, start=None, end=None, session_id=None, span_ms=CHUNK_SPAN_MS):
+    """
+    Parcourt les mesures d'une plage, fenêtre par fenêtre, triées par Timer : les paquets d'une
+    même fenêtre (plusieurs sessions ou appareils) sont réunis, les fenêtres se suivent dans l'ordre.
+
+    :return: Itérateur de dictionnaires nom -> tableau float64 (NaN pour une valeur absente)
+    """
+    where_clause, params = chunk_range(start, end, session_id, span_ms)
+    cursor = connection.execute(
+        f"SELECT start_timer, payload FROM {CHUNK_TABLE} {where_clause} ORDER BY start_timer", params
+    )
+    pending, pending_start = None, None
+    for start_timer, payload in cursor:
+        chunk = decode_chunk(payload, start_timer, column_names)
+        if pending is not None and start_timer == pending_start:
+            pending = _merge(pending, chunk)
+            continue
+        if pending is not None:
+            yield _clip(pending, start, end)
+        pending, pending_start = chunk, start_timer
+    if pending is not None:
+        yield _clip(pending, start, end)
+
+
+def _clip(chunk, start, end):
+    timers = chunk["Timer"]
+    if (start is None or timers[0] >= start) and (end is None or timers[-1] <= end):
+        return chunk
+    mask = np.ones(len(timers), dtype=bool)
+    if start is not None:
+        mask &= timers >= start
+    if end is not None:
+        mask &= timers <= end
+    return {name: values[mask] for name, values in chunk.items()}
+
+
+def python_values(values):
+    """
+    Valeurs Python d'une colonne décodée (pour le JSON) : entiers si possible, None pour une valeur absente.
+    """
+    if not np.isnan(values).any() and np.array_equal(values, np.floor(values)):
+        return values.astype(np.int64).tolist()
+    return [None if value != value else (int(value) if value.is_integer() else value) for value in values.tolist()]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Convertit une base au stockage des mesures par paquets compressés.")
+    parser.add_argument("db_name")
+    parser.add_argument("--vacuum", action="store_true", help="Réduit le fichier de la base après la conversion")
+    args = parser.parse_args()
+
+    # Import local : database_manager importe ce module
+    from database_manager import DatabaseManager
+
+    if not os.path.exists(args.db_name):
+        raise SystemExit(f"Base introuvable : {args.db_name}")
+    db_manager = DatabaseManager(args.db_name)
+    db_manager.initialize_database()
+    size_before = os.path.getsize(args.db_name)
+    start = time.perf_counter()
+    converted = db_manager.migrate_to_chunks(vacuum=args.vacuum)
+    elapsed = time.perf_counter() - start
+    print(f"{converted} lignes converties en {elapsed:.1f} s "
+          f"(taille de la base : {size_before / 1e6:.1f} Mo -> {os.path.getsize(args.db_name) / 1e6:.1f} Mo)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+# Format binaire colonne par colonne pour les données capteurs
+#
+# Disposition (petit-boutiste) :
+#   en-tête   : magic b"PADC", version (uint16), nombre de colonnes (uint16), nombre de lignes (uint32)
+#   colonnes  : pour chaque colonne, longueur du nom (uint8), nom (ASCII), type (1 caractère struct : 'd', 'i' ou 'h')
+#   remplissage jusqu'à un multiple de 8 octets
+#   données   : un tableau par colonne, chacun commençant sur un multiple de 8 octets
+#
+# Chaque tableau peut être lu côté navigateur sans copie :
+#   new Float64Array(buffer, offset, rowCount) / new Int16Array(buffer, offset, rowCount)
+
+import struct
+
+import numpy as np
+
+
+COLUMNAR_MAGIC = b"PADC"
+COLUMNAR_VERSION = 1
+COLUMNAR_MIMETYPE = "application/octet-stream"
+
+SENSOR_BINARY_COLUMNS = [
+    "Timer",
+    "Accel1X", "Accel1Y", "Accel1Z",
+    "Gyro1X", "Gyro1Y", "Gyro1Z",
+    "Accel2X", "Accel2Y", "Accel2Z",
+    "Gyro2X", "Gyro2Y", "Gyro2Z", "Flexion"
+]
+
+DTYPES = {
+    "d": np.dtype("<f8"),
+    "i": np.dtype("<i4"),
+    "h": np.dtype("<i2"),
+}
+
+_HEADER = struct.Struct("<4sHHI")
+ALIGNMENT = 8
+
+
+def _padding(size):
+    return (-size) % ALIGNMENT
+
+
+def integer_type_code(values):
+    """
+    Choisit le plus petit type entier qui contient toutes les valeurs (int16 pour les IMU).
+    """
+    if len(values) == 0:
+        return "h"
+    low, high = values.min(), values.max()
+    if low >= -32768 and high <= 32767:
+        return "h"
+    return "i"
+
+
+def encode_columnar(columns):
+    """
+    Encode des colonnes NumPy dans le format binaire.
+
+    :param columns: Liste de tuples (nom, tableau NumPy, code de type)
+    :return: bytes
+    """
+    row_count = len(columns[0][1]) if columns else 0
+    header = bytearray(_HEADER.pack(COLUMNAR_MAGIC, COLUMNAR_VERSION, len(columns), row_count))
+    for name, values, type_code in columns:
+        if len(values) != row_count:
+            raise ValueError(f"La colonne {name} n'a pas {row_count} lignes.")
+        encoded_name = name.encode("ascii")
+        header += struct.pack("<B", len(encoded_name)) + encoded_name + type_code.encode("ascii")
+    header += b"\0" * _padding(len(header))
+
+    parts = [bytes(header)]
+    for name, values, type_code in columns:
+        data = np.ascontiguousarray(values, dtype=DTYPES[type_code]).tobytes()
+        parts.append(data)
+        parts.append(b"\0" * _padding(len(data)))
+    return b"".join(parts)
+
+
+def decode_columnar(payload):
+    """
+    Décode un message binaire en dictionnaire {nom: tableau NumPy} (lecture sans copie).
+    """
+    magic, version, column_count, row_count = _HEADER.unpack_from(payload, 0)
+    if magic != COLUMNAR_MAGIC:
+        raise ValueError("Format binaire inconnu.")
+    if version != COLUMNAR_VERSION:
+        raise ValueError(f"Version du format binaire non supportée : {version}")
+
+    offset = _HEADER.size
+    layout = []
+    for _ in range(column_count):
+        name_length = payload[offset]
+        offset += 1
+        name = bytes(payload[offset:offset + name_length]).decode("ascii")
+        offset += name_length
+        type_code = chr(payload[offset])
+        offset += 1
+        layout.append((name, type_code))
+    offset += _padding(offset)
+
+    columns = {}
+    for name, type_code in layout:
+        dtype = DTYPES[type_code]
+        columns[name] = np.frombuffer(payload, dtype=dtype, count=row_count, offset=offset)
+        size = row_count * dtype.itemsize
+        offset += size + _padding(size)
+    return columns
+
+
+def load_sensor_columns(db_manager, start=None, end=None, session_id=None):
+    """
+    Lit les colonnes des mesures (DatabaseManager.read_sensor_columns, quel que soit le stockage)
+    directement dans des tableaux NumPy. Les valeurs NULL sont remplacées par 0.
+
+    :return: Liste de tuples (nom, tableau, code de type) prête pour `encode_columnar`
+    """
+    table = db_manager.read_sensor_columns(SENSOR_BINARY_COLUMNS, start, end, session_id)
+
+    columns = [("Timer", np.nan_to_num(table["Timer"]), "d")]
+    for name in SENSOR_BINARY_COLUMNS[1:]:
+        values = np.nan_to_num(table[name]).astype(np.int64)
+        columns.append((name, values, integer_type_code(values)))
+    return columns
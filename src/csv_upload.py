@@ -0,0 +1,285 @@
+# Réception en flux d'un fichier CSV envoyé en multipart/form-data (/api/upload-csv)
+#
+# Le corps de la requête est lu par blocs de UPLOAD_READ_SIZE octets et découpé au fil de l'eau
+# (werkzeug.sansio.multipart) : les lignes CSV complètes sont insérées par paquets, sans passer
+# par un fichier temporaire. La mémoire utilisée est bornée par un bloc lu et un paquet de lignes,
+# quelle que soit la taille du fichier envoyé. Chaque paquet est validé dans sa propre transaction :
+# le verrou d'écriture de la base des mesures n'est gardé que le temps d'un paquet, les autres
+# écrivains (réception Bluetooth, caches d'analyse, chargement incrémental) passent entre deux.
+# Avec une base, la progression est aussi publiée dans la table 'upload_progress' pour être lue
+# depuis un autre processus du serveur de production (base à part, voir db_connection.state_database).
+
+import csv
+import hashlib
+import json
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+from werkzeug.sansio.multipart import Data, Epilogue, Field, File, MultipartDecoder, NeedData
+
+from database_manager import BULK_IMPORT_PRAGMAS, DEFAULT_CHUNK_SIZE, DatabaseManager
+from db_connection import get_pool
+
+# Taille des blocs lus dans le corps de la requête
+UPLOAD_READ_SIZE = 64 * 1024
+
+# Taille maximale d'un champ texte du formulaire (name, course_id...)
+MAX_FIELD_SIZE = 64 * 1024
+
+# Nombre d'envois terminés dont la progression reste consultable
+PROGRESS_HISTORY = 100
+
+# Intervalle minimal (s) entre deux publications de la progression dans la base
+PROGRESS_PUBLISH_INTERVAL = 0.5
+
+
+class UploadProgress:
+    def __init__(self, upload_id, total_bytes=None, db_name=None):
+        self.upload_id = upload_id
+        self.total_bytes = total_bytes
+        self.db_name = db_name
+        self.bytes_consumed = 0
+        self.rows = 0
+        self.finished = False
+        self.error = None
+        self.started_at = time.time()
+        self.finished_at = None
+        self._published_at = 0.0
+
+    def finish(self, error=None):
+        self.error = error
+        self.finished = True
+        self.finished_at = time.time()
+        self.publish(force=True)
+
+    def publish(self, force=False):
+        """
+        Enregistre la progression dans la base (au plus toutes les PROGRESS_PUBLISH_INTERVAL secondes).
+        """
+        if self.db_name is None:
+            return
+        now = time.time()
+        if not force and now - self._published_at < PROGRESS_PUBLISH_INTERVAL:
+            return
+        self._published_at = now
+        with get_pool(self.db_name).transaction() as connection:
+            connection.execute(
+                "INSERT OR REPLACE INTO upload_progress (upload_id, state, updated_at) VALUES (?, ?, ?)",
+                (self.upload_id, json.dumps(self.as_dict()), now)
+            )
+
+    def as_dict(self):
+        return {
+            "upload_id": self.upload_id,
+            "bytes_consumed": self.bytes_consumed,
+            "total_bytes": self.total_bytes,
+            "rows": self.rows,
+            "finished": self.finished,
+            "error": self.error,
+            "seconds": (self.finished_at or time.time()) - self.started_at,
+        }
+
+
+_progress = OrderedDict()
+_progress_lock = threading.Lock()
+
+
+def initialize_progress_table(db_name):
+    with get_pool(db_name).transaction() as connection:
+        connection.execute('''
+            CREATE TABLE IF NOT EXISTS upload_progress (
+                upload_id TEXT PRIMARY KEY,
+                state TEXT NOT NULL,
+                updated_at REAL
+            )
+        ''')
+
+
+def start_progress(upload_id=None, total_bytes=None, db_name=None):
+    """
+    Enregistre un nouvel envoi ; sa progression est consultable avec `get_progress`.
+    """
+    progress = UploadProgress(upload_id or uuid.uuid4().hex, total_bytes, db_name)
+    with _progress_lock:
+        _progress[progress.upload_id] = progress
+        # On oublie les envois terminés les plus anciens
+        finished = [key for key, value in _progress.items() if value.finished]
+        for key in finished[:max(0, len(finished) - PROGRESS_HISTORY)]:
+            del _progress[key]
+    if db_name is not None:
+        with get_pool(db_name).transaction() as connection:
+            connection.execute(
+                "DELETE FROM upload_progress WHERE upload_id NOT IN ("
+                "SELECT upload_id FROM upload_progress ORDER BY updated_at DESC LIMIT ?)",
+                (PROGRESS_HISTORY,)
+            )
+        progress.publish(force=True)
+    return progress
+
+
+def get_progress(upload_id, db_name=None):
+    with _progress_lock:
+        progress = _progress.get(upload_id)
+    if progress is not None:
+        return progress.as_dict()
+    if db_name is None:
+        return None
+    # Envoi reçu par un autre processus du serveur
+    with get_pool(db_name).connection() as connection:
+        row = connection.execute("SELECT state FROM upload_progress WHERE upload_id = ?", (upload_id,)).fetchone()
+    return json.loads(row[0]) if row else None
+
+
+def multipart_events(stream, boundary, progress, read_size=UPLOAD_READ_SIZE):
+    """
+    Découpe le corps multipart en événements (Field, File, Data...) en lisant `read_size` octets à la fois.
+    """
+    decoder = MultipartDecoder(boundary)
+    while True:
+        event = decoder.next_event()
+        if isinstance(event, NeedData):
+            if decoder.complete:
+                raise ValueError("Corps multipart incomplet.")
+            block = stream.read(read_size)
+            progress.bytes_consumed += len(block)
+            progress.publish()
+            decoder.receive_data(block or None)
+            continue
+        yield event
+        if isinstance(event, Epilogue):
+            return
+
+
+class CsvLineSplitter:
+    def __init__(self, delimiter=';'):
+        self.delimiter = delimiter
+        self.remainder = b''
+
+    def feed(self, data):
+        """
+        Retourne les lignes CSV complètes contenues dans `data` ; la fin de ligne incomplète
+        est gardée pour l'appel suivant.
+        """
+        data = self.remainder + data
+        end = data.rfind(b'\n') + 1
+        self.remainder = data[end:]
+        return self._parse(data[:end])
+
+    def close(self):
+        rows = self._parse(self.remainder)
+        self.remainder = b''
+        return rows
+
+    def _parse(self, data):
+        if not data:
+            return []
+        return list(csv.reader(data.decode('utf-8', errors='replace').splitlines(), delimiter=self.delimiter))
+
+
+class StreamingCsvUpload:
+    def __init__(self, db_name, progress, chunk_size=DEFAULT_CHUNK_SIZE, read_size=UPLOAD_READ_SIZE):
+        self.db_name = db_name
+        self.progress = progress
+        self.chunk_size = chunk_size
+        self.read_size = read_size
+        self.db_manager = DatabaseManager(db_name)
+        self.fields = {}
+        self.filename = None
+        self.content_hash = None
+        self.session_id = None
+        self.rows = 0
+
+    def run(self, stream, boundary, open_session, keep=lambda upload: True):
+        """
+        Lit le corps de la requête et insère les lignes du champ 'file', un paquet par transaction.
+
+        :param open_session: Appelée au début du fichier avec l'envoi (champs déjà reçus, nom du fichier),
+                             retourne le session_id des lignes
+        :param keep: Appelée à la fin de l'envoi ; si elle retourne False les lignes de la session
+                     sont supprimées (fichier déjà importé par exemple)
+        :return: True si les lignes ont été enregistrées
+        """
+        self.db_manager.initialize_database()
+        pool = get_pool(self.db_name)
+        connection = pool.acquire()
+        try:
+            for pragma in BULK_IMPORT_PRAGMAS:
+                connection.execute(pragma)
+            self._consume(stream, boundary, connection, open_session)
+            if self.filename is None:
+                raise ValueError("Aucun fichier envoyé.")
+            if not keep(self):
+                self._delete_rows()
+                return False
+            return True
+        except Exception:
+            connection.rollback()
+            self._delete_rows()
+            raise
+        finally:
+            pool.apply_pragmas(connection)
+            pool.release(connection)
+
+    def _delete_rows(self):
+        """
+        Supprime les paquets déjà validés d'un envoi refusé ou interrompu.
+        """
+        if self.session_id is not None and self.rows:
+            self.db_manager.delete_session_rows(self.session_id)
+
+    def _consume(self, stream, boundary, connection, open_session):
+        current = None
+        field_value = bytearray()
+        splitter = None
+        digest = None
+        header = None
+        pending = []
+
+        for event in multipart_events(stream, boundary, self.progress, self.read_size):
+            if isinstance(event, Field):
+                current = event.name
+                field_value = bytearray()
+            elif isinstance(event, File):
+                current = event.name
+                if current == 'file':
+                    self.filename = event.filename
+                    self.session_id = open_session(self)
+                    splitter = CsvLineSplitter()
+                    digest = hashlib.sha256()
+            elif isinstance(event, Data):
+                if current == 'file' and splitter is not None:
+                    digest.update(event.data)
+                    rows = splitter.feed(event.data)
+                    if not event.more_data:
+                        rows += splitter.close()
+                    header, pending = self._add_rows(connection, header, pending, rows, final=not event.more_data)
+                    if not event.more_data:
+                        self.content_hash = digest.hexdigest()
+                        splitter = None
+                elif current is not None:
+                    field_value += event.data
+                    if len(field_value) > MAX_FIELD_SIZE:
+                        raise ValueError(f"Champ '{current}' trop long.")
+                    if not event.more_data:
+                        self.fields[current] = field_value.decode('utf-8', errors='replace')
+
+    def _add_rows(self, connection, header, pending, rows, final):
+        """
+        Ajoute des lignes au paquet en cours et insère chaque paquet complet dans sa propre transaction.
+        """
+        rows = [row for row in rows if row]
+        if header is None and rows:
+            header = [name.strip() for name in rows[0]]
+            rows = rows[1:]
+        pending.extend(rows)
+        self.progress.rows += len(rows)
+
+        while len(pending) >= self.chunk_size or (final and pending):
+            batch, pending = pending[:self.chunk_size], pending[self.chunk_size:]
+            with connection:
+                self.rows += self.db_manager.insert_csv_rows(
+                    connection.cursor(), header, batch, self.chunk_size, self.session_id
+                )
+        return header, pending
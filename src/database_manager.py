@@ -1,13 +1,157 @@
-import sqlite3
 import csv
 import os
 
+import numpy as np
+
+from chunk_storage import (
+    CHUNK_STORAGE, CHUNK_TABLE, ROW_STORAGE, SENSOR_STORAGES, append_chunks, chunk_fields, chunk_range, iterate_chunks,
+    python_values
+)
+from db_connection import ConnectionIterator, get_pool, get_stream_pool
+from metrics import REGISTRY
+from rollups import (
+    NO_SESSION_KEY, ROLLUP_LEVELS_MS, ROLLUP_TABLE, rebuild_query, rollup_fields, upsert_query, window_aggregates
+)
+
+SENSOR_COLUMNS = [
+    'Timer',
+    'Accel1X', 'Accel1Y', 'Accel1Z',
+    'Gyro1X', 'Gyro1Y', 'Gyro1Z',
+    'Accel2X', 'Accel2Y', 'Accel2Z',
+    'Gyro2X', 'Gyro2Y', 'Gyro2Z', 'Flexion'
+]
+
+GPX_COLUMNS = [
+    'Timer', 'Latitude', 'Longitude', 'Altitude',
+    'Vitesse', 'Orientation', 'Satellites', 'HDOP'
+]
+
+# En-tête du fichier CSV de l'ESP32 (21 champs)
+ESP32_CSV_HEADERS = SENSOR_COLUMNS + GPX_COLUMNS[1:]
+
+# Voies agrégées dans la table des agrégats (voir rollups.py)
+ROLLUP_CHANNELS = SENSOR_COLUMNS[1:]
+ROLLUP_UPSERT_QUERY = upsert_query(ROLLUP_CHANNELS)
+
+# Nombre de lignes CSV lues puis insérées à chaque appel à executemany
+DEFAULT_CHUNK_SIZE = 5000
+
+# Réglages appliqués uniquement pendant un import massif (la base reste en mode WAL,
+# les réglages du pool sont rétablis à la fin de l'import)
+BULK_IMPORT_PRAGMAS = [
+    "PRAGMA synchronous = OFF",
+    "PRAGMA cache_size = -64000",
+]
+
+# Stockage des mesures d'une base neuve : 'rows' (une ligne par mesure) ou 'chunks' (voir chunk_storage.py)
+DEFAULT_SENSOR_STORAGE = os.environ.get("PROADAPT_SENSOR_STORAGE", ROW_STORAGE)
+
+# Lignes lues à chaque fetchmany (lecture des mesures, conversion d'une base)
+READ_BATCH_SIZE = 20000
+MIGRATION_BATCH_SIZE = 50000
+
+MALFORMED_VALUES = REGISTRY.counter(
+    "proadapt_malformed_values_total",
+    "Valeurs non numériques (ligne série bruitée, case corrompue) enregistrées comme NULL"
+)
+
+
+def to_integer(value):
+    """
+    Convertit une valeur CSV en entier ('' ou None -> NULL).
+    Les timers exportés en flottant ('1736948126.0') sont acceptés ; une valeur qui n'est pas
+    un nombre ('1x') devient NULL et est comptée dans MALFORMED_VALUES, le reste de la ligne est gardé.
+    """
+    if value is None or value == '':
+        return None
+    try:
+        return int(value)
+    except (ValueError, TypeError):
+        pass
+    try:
+        number = float(value)
+    except (ValueError, TypeError):
+        MALFORMED_VALUES.inc()
+        return None
+    return int(number) if number.is_integer() else number
+
+
+def to_real(value):
+    """
+    Convertit une valeur CSV en flottant ('' ou None -> NULL, valeur mal formée -> NULL comptée
+    dans MALFORMED_VALUES).
+    """
+    if value is None or value == '':
+        return None
+    try:
+        return float(value)
+    except (ValueError, TypeError):
+        MALFORMED_VALUES.inc()
+        return None
+
+
+def convert_integer_column(values):
+    """
+    Convertit une colonne entière en une passe, avec repli valeur par valeur
+    si elle contient des cases vides, des None ou des flottants.
+    """
+    try:
+        return list(map(int, values))
+    except (ValueError, TypeError):
+        return list(map(to_integer, values))
+
+
+def convert_real_column(values):
+    """
+    Convertit une colonne flottante en une passe (colonne vide -> NULL partout).
+    """
+    if values.count('') + values.count(None) == len(values):
+        return [None] * len(values)
+    try:
+        return list(map(float, values))
+    except (ValueError, TypeError):
+        return list(map(to_real, values))
+
+
+def build_timer_range(start, end, session_id=None):
+    """
+    Construit la clause WHERE sur Timer, et sur la session si elle est fournie
+    (utilise l'index sur Timer ou l'index composite (session_id, Timer)).
+    """
+    conditions = []
+    params = []
+    if session_id is not None:
+        conditions.append("session_id = ?")
+        params.append(session_id)
+    if start is not None:
+        conditions.append("Timer >= ?")
+        params.append(start)
+    if end is not None:
+        conditions.append("Timer <= ?")
+        params.append(end)
+    where_clause = "WHERE " + " AND ".join(conditions) if conditions else ""
+    return where_clause, params
+
+
+def convert_text_column(values):
+    """
+    Garde une colonne texte telle quelle (cases vides -> NULL).
+    """
+    return [value if value != '' else None for value in values]
+
+
+SENSOR_CONVERTERS = [convert_integer_column] * len(SENSOR_COLUMNS)
+GPX_CONVERTERS = [
+    convert_integer_column, convert_real_column, convert_real_column, convert_real_column,
+    convert_real_column, convert_real_column, convert_integer_column, convert_real_column
+]
+
 class DatabaseManager:
     def __init__(self, db_name):
         self.db_name = db_name
 
     def initialize_database(self):
-        with sqlite3.connect(self.db_name) as connection:
+        with get_pool(self.db_name).transaction() as connection:
             cursor = connection.cursor()
             self.create_table(cursor, 'sensor_data', [
                 'Timer INTEGER',
@@ -21,42 +165,531 @@ class DatabaseManager:
                 'Latitude REAL', 'Longitude REAL', 'Altitude REAL',
                 'Vitesse REAL', 'Orientation REAL', 'Satellites INTEGER', 'HDOP REAL'
             ])
-            connection.commit()
+            self.create_table(cursor, CHUNK_TABLE, chunk_fields())
+            self.add_column_if_missing(cursor, 'sensor_data', 'device_id TEXT')
+            self.add_column_if_missing(cursor, 'gpx_data', 'device_id TEXT')
+            self.add_column_if_missing(cursor, 'sensor_data', 'session_id INTEGER')
+            self.add_column_if_missing(cursor, 'gpx_data', 'session_id INTEGER')
+            self.create_timer_indexes(cursor)
+            self.create_session_indexes(cursor)
+            self.create_version_table(cursor)
+            self.create_settings_table(cursor)
+            self.create_rollup_table(cursor)
 
     def create_table(self, cursor, table_name, fields):
         fields_definition = ', '.join(fields)
         create_table_query = f"CREATE TABLE IF NOT EXISTS {table_name} ({fields_definition})"
         cursor.execute(create_table_query)
 
-    def load_csv_to_db(self, csv_file_path):
+    def add_column_if_missing(self, cursor, table_name, field):
+        """
+        Ajoute une colonne à une table existante si elle n'y est pas encore (bases créées
+        avec une version précédente du schéma).
+        """
+        column_name = field.split()[0]
+        existing = {row[1] for row in cursor.execute(f"PRAGMA table_info({table_name})")}
+        if column_name not in existing:
+            cursor.execute(f"ALTER TABLE {table_name} ADD COLUMN {field}")
+
+    def create_timer_indexes(self, cursor):
+        """
+        Index sur Timer pour les lectures par plage de temps.
+        """
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_sensor_data_timer ON sensor_data (Timer)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_gpx_data_timer ON gpx_data (Timer)")
+        cursor.execute(f"CREATE INDEX IF NOT EXISTS idx_sensor_chunks_start ON {CHUNK_TABLE} (start_timer)")
+
+    def create_session_indexes(self, cursor):
+        """
+        Index composites (session_id, Timer) : la lecture d'une session, triée par Timer,
+        ne parcourt que les lignes de cette session.
+        """
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_sensor_data_session_timer ON sensor_data (session_id, Timer)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_gpx_data_session_timer ON gpx_data (session_id, Timer)")
+
+    def create_version_table(self, cursor):
+        """
+        Compteurs de version des mesures, par table et par session, incrémentés dans la
+        transaction de chaque écriture (voir `bump_data_versions`). Ils servent d'ETag aux routes
+        de lecture. La ligne 'epoch' distingue une base recréée, dont les compteurs repartent de 1.
+        """
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS data_versions (
+                scope TEXT PRIMARY KEY,
+                version INTEGER NOT NULL
+            )
+        ''')
+        cursor.execute("INSERT OR IGNORE INTO data_versions (scope, version) VALUES ('epoch', abs(random()))")
+
+    def create_settings_table(self, cursor):
+        """
+        Réglages propres à la base, dont le stockage des mesures ('sensor_storage'). Une base neuve
+        prend DEFAULT_SENSOR_STORAGE ; une base qui contient déjà des lignes reste en 'rows'.
+        """
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS database_settings (
+                name TEXT PRIMARY KEY,
+                value TEXT NOT NULL
+            )
+        ''')
+        if self.get_setting(cursor, 'sensor_storage') is None:
+            has_rows = cursor.execute("SELECT 1 FROM sensor_data LIMIT 1").fetchone() is not None
+            storage = ROW_STORAGE if has_rows else DEFAULT_SENSOR_STORAGE
+            if storage not in SENSOR_STORAGES:
+                raise ValueError(f"Stockage des mesures inconnu : {storage}")
+            self.set_setting(cursor, 'sensor_storage', storage)
+
+    @staticmethod
+    def get_setting(cursor, name):
+        row = cursor.execute("SELECT value FROM database_settings WHERE name = ?", (name,)).fetchone()
+        return row[0] if row else None
+
+    @staticmethod
+    def set_setting(cursor, name, value):
+        cursor.execute("INSERT OR REPLACE INTO database_settings (name, value) VALUES (?, ?)", (name, value))
+
+    def sensor_storage(self, cursor=None):
+        """
+        Stockage des mesures de la base : 'rows' ou 'chunks'. Relu à chaque appel, pour suivre
+        une conversion faite par un autre processus.
+        """
+        if cursor is not None:
+            return self.get_setting(cursor, 'sensor_storage') or ROW_STORAGE
+        with get_pool(self.db_name).connection() as connection:
+            return self.get_setting(connection, 'sensor_storage') or ROW_STORAGE
+
+    def create_rollup_table(self, cursor):
+        """
+        Table des agrégats par fenêtre (voir rollups.py). À sa création dans une base qui contient
+        déjà des mesures, elle est remplie à partir de 'sensor_data'. Les fenêtres plus fines que
+        le premier niveau (100 ms dans les anciennes bases) sont supprimées.
+        """
+        exists = cursor.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (ROLLUP_TABLE,)
+        ).fetchone()
+        self.create_table(cursor, ROLLUP_TABLE, rollup_fields(ROLLUP_CHANNELS))
+        if not exists:
+            self.rebuild_rollups(cursor)
+        else:
+            cursor.execute(f"DELETE FROM {ROLLUP_TABLE} WHERE level_ms < ?", (ROLLUP_LEVELS_MS[0],))
+
+    def rebuild_rollups(self, cursor, session_id=None):
+        """
+        Recalcule les agrégats de toutes les mesures (ou d'une session) à partir de 'sensor_data'.
+        """
+        if session_id is None:
+            cursor.execute(f"DELETE FROM {ROLLUP_TABLE}")
+            where_clause, params = "", ()
+        else:
+            cursor.execute(f"DELETE FROM {ROLLUP_TABLE} WHERE session_key = ?", (session_id,))
+            where_clause, params = "session_id = ?", (session_id,)
+        if self.sensor_storage(cursor) == CHUNK_STORAGE:
+            # Paquets relus un à un (session par session : les clés de session ne sont pas décodées)
+            sessions = [session_id] if session_id is not None else [
+                row[0] for row in cursor.execute(f"SELECT DISTINCT session_key FROM {CHUNK_TABLE}")
+            ]
+            for session_key in sessions:
+                for chunk in iterate_chunks(cursor.connection, SENSOR_COLUMNS, session_id=session_key):
+                    self.update_rollups(cursor, {
+                        'session_id': [session_key] * len(chunk['Timer']),
+                        **{name: chunk[name].tolist() for name in SENSOR_COLUMNS},
+                    })
+            return
+        for level_ms in ROLLUP_LEVELS_MS:
+            cursor.execute(rebuild_query(ROLLUP_CHANNELS, level_ms, where_clause), params)
+
+    def update_rollups(self, cursor, columns):
+        """
+        Ajoute un paquet de lignes insérées dans 'sensor_data' aux agrégats de chaque niveau.
+
+        :param columns: Dictionnaire nom de colonne -> valeurs converties (Timer obligatoire,
+                        voies et session_id facultatifs, None pour une valeur absente)
+        """
+        timer_values = columns.get('Timer')
+        if not timer_values:
+            return
+        timers = np.array(timer_values, dtype=np.float64)
+        keep = ~np.isnan(timers)
+        if not keep.any():
+            return
+        sessions = columns.get('session_id')
+        if sessions is None:
+            session_keys = np.full(len(timers), NO_SESSION_KEY, dtype=np.int64)
+        else:
+            session_keys = np.nan_to_num(np.array(sessions, dtype=np.float64), nan=NO_SESSION_KEY).astype(np.int64)
+        channels = [
+            np.array(columns[channel], dtype=np.float64)[keep] if channel in columns
+            else np.full(int(keep.sum()), np.nan)
+            for channel in ROLLUP_CHANNELS
+        ]
+        for rows in window_aggregates(timers[keep], session_keys[keep], channels, ROLLUP_LEVELS_MS).values():
+            cursor.executemany(ROLLUP_UPSERT_QUERY, rows)
+
+    def insert_sensor_columns(self, cursor, columns):
+        """
+        Enregistre un paquet de mesures selon le stockage de la base (lignes de 'sensor_data'
+        ou paquets compressés), puis l'ajoute aux agrégats. La transaction est gérée par l'appelant.
+
+        :param columns: Dictionnaire nom de colonne -> valeurs converties (None pour une valeur absente)
+        """
+        if self.sensor_storage(cursor) == CHUNK_STORAGE:
+            append_chunks(cursor, columns, SENSOR_COLUMNS)
+        else:
+            cursor.executemany(self.build_insert_query('sensor_data', list(columns)), zip(*columns.values()))
+        self.update_rollups(cursor, columns)
+
+    def iterate_sensor_columns(self, columns, start=None, end=None, session_id=None, batch_size=READ_BATCH_SIZE):
+        """
+        Lit les mesures d'une plage par paquets, triées par Timer, quel que soit le stockage.
+        Les lignes sans Timer sont ignorées.
+
+        :return: Itérateur de dictionnaires nom -> tableau float64 (NaN pour une valeur absente)
+        """
+        with get_pool(self.db_name).connection() as connection:
+            yield from self._sensor_column_chunks(connection, columns, start, end, session_id, batch_size)
+
+    def _sensor_column_chunks(self, connection, columns, start, end, session_id, batch_size):
+        if self.sensor_storage(connection) == CHUNK_STORAGE:
+            names = columns if 'Timer' in columns else ['Timer'] + list(columns)
+            for chunk in iterate_chunks(connection, names, start, end, session_id):
+                if len(chunk['Timer']):
+                    yield {name: chunk[name] for name in columns}
+            return
+
+        where_clause, params = build_timer_range(start, end, session_id)
+        condition = f"{where_clause} AND Timer IS NOT NULL" if where_clause else "WHERE Timer IS NOT NULL"
+        cursor = connection.execute(
+            f"SELECT {', '.join(columns)} FROM sensor_data {condition} ORDER BY Timer", params
+        )
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                break
+            table = np.array(rows, dtype=np.float64)
+            yield {name: table[:, index] for index, name in enumerate(columns)}
+
+    def iterate_sensor_rows(self, columns, start=None, end=None, session_id=None, batch_size=READ_BATCH_SIZE):
+        """
+        Lit les mesures d'une plage ligne par ligne (tuples de valeurs Python, None pour NULL),
+        triées par Timer, quel que soit le stockage. Les lignes sans Timer sont ignorées.
+
+        Destiné aux réponses en flux : la connexion est prise tout de suite dans le pool des flux
+        (voir get_stream_pool), pour qu'un pool saturé lève PoolTimeout avant l'envoi de la réponse,
+        et rendue à la fin du parcours ou à l'appel de close() (voir ConnectionIterator).
+        """
+        pool = get_stream_pool(self.db_name)
+        connection = pool.acquire()
+        return ConnectionIterator(
+            pool, connection, self._sensor_rows(connection, columns, start, end, session_id, batch_size)
+        )
+
+    def _sensor_rows(self, connection, columns, start, end, session_id, batch_size):
+        if self.sensor_storage(connection) == CHUNK_STORAGE:
+            for chunk in self._sensor_column_chunks(connection, columns, start, end, session_id, batch_size):
+                yield from zip(*(python_values(chunk[name]) for name in columns))
+            return
+
+        where_clause, params = build_timer_range(start, end, session_id)
+        condition = f"{where_clause} AND Timer IS NOT NULL" if where_clause else "WHERE Timer IS NOT NULL"
+        cursor = connection.execute(
+            f"SELECT {', '.join(columns)} FROM sensor_data {condition} ORDER BY Timer", params
+        )
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                break
+            yield from rows
+
+    def read_sensor_columns(self, columns, start=None, end=None, session_id=None):
+        """
+        Mesures d'une plage dans des tableaux NumPy float64 (NaN pour une valeur absente), triées par Timer.
+        """
+        chunks = list(self.iterate_sensor_columns(columns, start, end, session_id))
+        if not chunks:
+            return {name: np.zeros(0) for name in columns}
+        return {name: np.concatenate([chunk[name] for chunk in chunks]) for name in columns}
+
+    def sensor_fingerprint(self, start=None, end=None, session_id=None):
+        """
+        Empreinte des mesures d'une plage : elle change dès qu'une ligne est ajoutée ou supprimée
+        (nombre de lignes, plus grand rowid, Timer extrêmes ; à la granularité des paquets en stockage 'chunks').
+        """
+        with get_pool(self.db_name).connection() as connection:
+            if self.sensor_storage(connection) == CHUNK_STORAGE:
+                where_clause, params = chunk_range(start, end, session_id)
+                query = (f"SELECT total(sample_count), MAX(rowid), MIN(start_timer), MAX(start_timer) "
+                         f"FROM {CHUNK_TABLE} {where_clause}")
+            else:
+                where_clause, params = build_timer_range(start, end, session_id)
+                query = f"SELECT COUNT(*), MAX(rowid), MIN(Timer), MAX(Timer) FROM sensor_data {where_clause}"
+            return connection.execute(query, params).fetchone()
+
+    def read_gps_fixes(self, columns, start=None, end=None, session_id=None):
+        """
+        Relevés GPS d'une plage (lignes de 'gpx_data' avec une position, comme /api/gps-trace) dans des
+        tableaux NumPy float64 (NaN pour une valeur absente), triés par Timer.
+        """
+        where_clause, params = build_timer_range(start, end, session_id)
+        conditions = "Timer IS NOT NULL AND Latitude IS NOT NULL AND Longitude IS NOT NULL " \
+                     "AND Latitude != 0 AND Longitude != 0"
+        condition = f"{where_clause} AND {conditions}" if where_clause else f"WHERE {conditions}"
+        with get_pool(self.db_name).connection() as connection:
+            rows = connection.execute(
+                f"SELECT {', '.join(columns)} FROM gpx_data {condition} ORDER BY Timer", params
+            ).fetchall()
+        table = np.array(rows, dtype=np.float64).reshape(len(rows), len(columns))
+        return {name: table[:, index] for index, name in enumerate(columns)}
+
+    @staticmethod
+    def version_scope(table_name, session_id=None):
+        return table_name if session_id is None else f"{table_name}:session:{session_id}"
+
+    def bump_data_versions(self, cursor, table_name, session_ids=()):
+        """
+        Incrémente la version de la table et celle des sessions modifiées.
+        """
+        scopes = [table_name] + [self.version_scope(table_name, session_id)
+                                 for session_id in session_ids if session_id is not None]
+        cursor.executemany(
+            "INSERT INTO data_versions (scope, version) VALUES (?, 1) "
+            "ON CONFLICT(scope) DO UPDATE SET version = version + 1",
+            [(scope,) for scope in scopes]
+        )
+
+    def data_versions(self, scopes):
+        """
+        Versions des portées demandées (0 si jamais écrite), précédées de l'epoch de la base.
+        """
+        scopes = ['epoch'] + list(scopes)
+        placeholders = ', '.join(['?'] * len(scopes))
+        with get_pool(self.db_name).connection() as connection:
+            versions = dict(connection.execute(
+                f"SELECT scope, version FROM data_versions WHERE scope IN ({placeholders})", scopes
+            ).fetchall())
+        return [versions.get(scope, 0) for scope in scopes]
+
+    def load_csv_to_db(self, csv_file_path, chunk_size=DEFAULT_CHUNK_SIZE, session_id=None):
+        """
+        Charge un fichier CSV de l'ESP32 dans les tables 'sensor_data' et 'gpx_data'.
+
+        Le fichier est lu par paquets de `chunk_size` lignes, chaque paquet est
+        converti colonne par colonne puis inséré avec `executemany`, le tout dans
+        une seule transaction. Les colonnes entièrement vides d'un paquet (GPS absent)
+        ne sont pas liées : SQLite les remplit avec NULL.
+
+        :param csv_file_path: Chemin du fichier CSV (séparateur ';')
+        :param chunk_size: Nombre de lignes par paquet
+        :param session_id: Session à laquelle rattacher les lignes (None : aucune)
+        :return: Nombre de lignes insérées
+        """
+        if not os.path.exists(csv_file_path):
+            raise FileNotFoundError(f"CSV file '{csv_file_path}' not found.")
+
+        row_count = 0
+
+        pool = get_pool(self.db_name)
+        connection = pool.acquire()
+        try:
+            for pragma in BULK_IMPORT_PRAGMAS:
+                connection.execute(pragma)
+            cursor = connection.cursor()
+
+            with open(csv_file_path, 'r', newline='') as csv_file:
+                csv_reader = csv.reader(csv_file, delimiter=';')
+                header = next(csv_reader, None)
+                if header is None:
+                    return 0
+
+                row_count = self.insert_csv_rows(cursor, header, csv_reader, chunk_size, session_id)
+
+            connection.commit()
+        except Exception:
+            connection.rollback()
+            raise
+        finally:
+            pool.apply_pragmas(connection)
+            pool.release(connection)
+
+        return row_count
+
+    def insert_csv_rows(self, cursor, header, csv_reader, chunk_size=DEFAULT_CHUNK_SIZE, session_id=None,
+                        on_chunk=None):
+        """
+        Insère des lignes CSV déjà découpées (sans l'en-tête) dans 'sensor_data' et 'gpx_data',
+        par paquets. La transaction est gérée par l'appelant.
+        `on_chunk` est appelée après chaque paquet avec le nombre de lignes déjà insérées.
+
+        :return: Nombre de lignes insérées
+        """
+        sensor_columns, sensor_converters = SENSOR_COLUMNS, SENSOR_CONVERTERS
+        gpx_columns, gpx_converters = GPX_COLUMNS, GPX_CONVERTERS
+        sensor_indexes = self.column_indexes(header, SENSOR_COLUMNS)
+        gpx_indexes = self.column_indexes(header, GPX_COLUMNS)
+        if session_id is not None:
+            # session_id est ajouté comme une colonne supplémentaire après celles du CSV
+            sensor_columns = SENSOR_COLUMNS + ['session_id']
+            gpx_columns = GPX_COLUMNS + ['session_id']
+            sensor_converters = SENSOR_CONVERTERS + [convert_integer_column]
+            gpx_converters = GPX_CONVERTERS + [convert_integer_column]
+            sensor_indexes = sensor_indexes + [len(header)]
+            gpx_indexes = gpx_indexes + [len(header)]
+
+        row_count = 0
+        for chunk in self.read_chunks(csv_reader, chunk_size):
+            columns = self.transpose(chunk, len(header))
+            if session_id is not None:
+                columns = columns[:len(header)] + [(session_id,) * len(chunk)]
+            self.insert_columns(cursor, 'sensor_data', sensor_columns, columns, sensor_indexes, sensor_converters)
+            self.insert_columns(cursor, 'gpx_data', gpx_columns, columns, gpx_indexes, gpx_converters)
+            row_count += len(chunk)
+            if on_chunk:
+                on_chunk(row_count)
+        return row_count
+
+    def delete_session_rows(self, session_id):
+        """
+        Supprime les mesures d'une session dans les deux tables.
+
+        :return: Nombre de mesures supprimées
+        """
+        with get_pool(self.db_name).transaction() as connection:
+            cursor = connection.cursor()
+            cursor.execute("DELETE FROM sensor_data WHERE session_id = ?", (session_id,))
+            deleted = cursor.rowcount
+            deleted += int(cursor.execute(
+                f"SELECT total(sample_count) FROM {CHUNK_TABLE} WHERE session_key = ?", (session_id,)
+            ).fetchone()[0])
+            cursor.execute(f"DELETE FROM {CHUNK_TABLE} WHERE session_key = ?", (session_id,))
+            cursor.execute("DELETE FROM gpx_data WHERE session_id = ?", (session_id,))
+            cursor.execute(f"DELETE FROM {ROLLUP_TABLE} WHERE session_key = ?", (session_id,))
+            self.bump_data_versions(cursor, 'sensor_data', [session_id])
+            self.bump_data_versions(cursor, 'gpx_data', [session_id])
+        return deleted
+
+    def migrate_to_chunks(self, vacuum=False):
+        """
+        Convertit la base au stockage par paquets compressés (voir chunk_storage.py) : les lignes
+        de 'sensor_data' sont regroupées session par session, puis supprimées, dans une seule transaction.
+        Les agrégats (mêmes mesures) sont conservés.
+
+        :param vacuum: Réduit ensuite le fichier de la base (VACUUM)
+        :return: Nombre de mesures converties
+        """
+        pool = get_pool(self.db_name)
+        names = SENSOR_COLUMNS + ['session_id', 'device_id']
+        converted = 0
+        with pool.transaction() as connection:
+            cursor = connection.cursor()
+            if self.sensor_storage(cursor) == CHUNK_STORAGE:
+                print(f"{self.db_name} utilise déjà le stockage par paquets.")
+                return 0
+            sessions = [row[0] for row in cursor.execute("SELECT DISTINCT session_id FROM sensor_data")]
+            for session_id in sessions:
+                condition = "session_id IS NULL" if session_id is None else "session_id = ?"
+                params = () if session_id is None else (session_id,)
+                rows = connection.execute(
+                    f"SELECT {', '.join(names)} FROM sensor_data WHERE {condition} ORDER BY Timer", params
+                )
+                while True:
+                    batch = rows.fetchmany(MIGRATION_BATCH_SIZE)
+                    if not batch:
+                        break
+                    converted += append_chunks(cursor, dict(zip(names, zip(*batch))), SENSOR_COLUMNS)
+            cursor.execute("DELETE FROM sensor_data")
+            self.set_setting(cursor, 'sensor_storage', CHUNK_STORAGE)
+            self.bump_data_versions(cursor, 'sensor_data', sessions)
+
+        if vacuum:
+            with pool.connection() as connection:
+                connection.execute("VACUUM")
+        return converted
+
+    def load_csv_to_db_row_by_row(self, csv_file_path):
+        """
+        Ancien chargement ligne par ligne (un `execute` par ligne et par table).
+        Conservé comme référence pour les benchmarks de `load_csv_to_db`.
+        """
         if not os.path.exists(csv_file_path):
             raise FileNotFoundError(f"CSV file '{csv_file_path}' not found.")
 
-        with sqlite3.connect(self.db_name) as connection:
+        with get_pool(self.db_name).transaction() as connection:
             cursor = connection.cursor()
             with open(csv_file_path, 'r') as csv_file:
                 csv_reader = csv.DictReader(csv_file, delimiter=';')
                 for row in csv_reader:
-                    # Insertion dans la table `sensor_data` avec 14 colonnes
-                    self.insert_into_table(cursor, 'sensor_data', [
-                        row['Timer'], row['Accel1X'], row['Accel1Y'], row['Accel1Z'],
-                        row['Gyro1X'], row['Gyro1Y'], row['Gyro1Z'],
-                        row['Accel2X'], row['Accel2Y'], row['Accel2Z'],
-                        row['Gyro2X'], row['Gyro2Y'], row['Gyro2Z'],  # 13 colonnes jusqu'ici
-                        row['Flexion']  # Ajout de la 14e colonne
-                    ])
-                    
-                    # Insertion dans la table `gpx_data`
-                    self.insert_into_table(cursor, 'gpx_data', [
-                        row['Timer'], row.get('Latitude', None), row.get('Longitude', None),
-                        row.get('Altitude', None), row.get('Vitesse', None),
-                        row.get('Orientation', None), row.get('Satellites', None),
-                        row.get('HDOP', None)
-                    ])
-            connection.commit()
+                    self.insert_into_table(cursor, 'sensor_data', [row.get(column) for column in SENSOR_COLUMNS], SENSOR_COLUMNS)
+                    self.insert_into_table(cursor, 'gpx_data', [row.get(column) for column in GPX_COLUMNS], GPX_COLUMNS)
+            self.rebuild_rollups(cursor)
 
-    def insert_into_table(self, cursor, table_name, values):
-        placeholders = ', '.join(['?'] * len(values))
-        insert_query = f"INSERT INTO {table_name} VALUES ({placeholders})"
+    def insert_into_table(self, cursor, table_name, values, columns=None):
+        if columns is None:
+            placeholders = ', '.join(['?'] * len(values))
+            insert_query = f"INSERT INTO {table_name} VALUES ({placeholders})"
+        else:
+            insert_query = self.build_insert_query(table_name, columns)
         cursor.execute(insert_query, values)
-        
\ No newline at end of file
+
+    def build_insert_query(self, table_name, columns):
+        placeholders = ', '.join(['?'] * len(columns))
+        return f"INSERT INTO {table_name} ({', '.join(columns)}) VALUES ({placeholders})"
+
+    @staticmethod
+    def column_indexes(header, columns):
+        """
+        Retourne la position de chaque colonne dans l'en-tête CSV (None si absente).
+        """
+        positions = {name.strip(): index for index, name in enumerate(header)}
+        return [positions.get(column) for column in columns]
+
+    @staticmethod
+    def read_chunks(csv_reader, chunk_size):
+        """
+        Découpe le lecteur CSV en listes d'au plus `chunk_size` lignes.
+        """
+        chunk = []
+        for row in csv_reader:
+            if not row:
+                continue
+            chunk.append(row)
+            if len(chunk) >= chunk_size:
+                yield chunk
+                chunk = []
+        if chunk:
+            yield chunk
+
+    @staticmethod
+    def transpose(chunk, width):
+        """
+        Transforme un paquet de lignes en colonnes (lignes courtes complétées par '').
+        """
+        padded = [row if len(row) >= width else row + [''] * (width - len(row)) for row in chunk]
+        return list(zip(*padded))
+
+    def insert_columns(self, cursor, table_name, table_columns, columns, indexes, converters):
+        """
+        Convertit un paquet de colonnes CSV et l'insère avec un seul `executemany`.
+        """
+        names = []
+        values = []
+        for name, index, converter in zip(table_columns, indexes, converters):
+            if index is None:
+                continue
+            converted = converter(columns[index])
+            if converted.count(None) == len(converted):
+                continue
+            names.append(name)
+            values.append(converted)
+
+        if not names:
+            # Aucune donnée : on garde une ligne NULL par entrée, comme l'ancien chargement
+            # (sauf en stockage par paquets, qui ne garde pas les lignes sans Timer)
+            if table_name != 'sensor_data' or self.sensor_storage(cursor) != CHUNK_STORAGE:
+                cursor.executemany(f"INSERT INTO {table_name} DEFAULT VALUES", [()] * len(columns[0]))
+            self.bump_data_versions(cursor, table_name)
+            return
+        if table_name == 'sensor_data':
+            self.insert_sensor_columns(cursor, dict(zip(names, values)))
+        else:
+            cursor.executemany(self.build_insert_query(table_name, names), zip(*values))
+        session_ids = set(values[names.index('session_id')]) if 'session_id' in names else ()
+        self.bump_data_versions(cursor, table_name, session_ids)
@@ -0,0 +1,324 @@
+# Gestion partagée des connexions SQLite (pool, mode WAL, réglages)
+#
+# Le serveur, DatabaseManager et UserDatabaseManager passent tous par `get_pool(db_name)` :
+# une seule file de connexions par fichier de base, réutilisées d'une requête à l'autre.
+# Les réponses en flux, qui gardent leur connexion tant que le client lit, ont leur propre
+# pool (`get_stream_pool`) : des clients lents ne privent pas les autres requêtes de connexion.
+
+import os
+import queue
+import re
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from functools import lru_cache
+
+from metrics import REGISTRY
+
+# Taille maximale du pool par base (au-delà, les appelants attendent une connexion libre)
+DEFAULT_POOL_SIZE = 8
+
+# Nombre maximal de réponses en flux lisant une même base en même temps
+STREAM_POOL_SIZE = 16
+
+# Attente maximale (s) d'une connexion libre, au-delà PoolTimeout est levée (réponse 503)
+ACQUIRE_TIMEOUT = 10
+
+# Nombre de requêtes préparées gardées en cache par connexion
+CACHED_STATEMENTS = 256
+
+# Délai d'attente (ms) quand la base est verrouillée par un autre écrivain
+BUSY_TIMEOUT_MS = 5000
+
+# Réglages appliqués à chaque nouvelle connexion.
+# En mode WAL, les lecteurs ne bloquent pas l'écrivain (et inversement).
+CONNECTION_PRAGMAS = [
+    "PRAGMA journal_mode = WAL",
+    "PRAGMA synchronous = NORMAL",
+    f"PRAGMA busy_timeout = {BUSY_TIMEOUT_MS}",
+    "PRAGMA temp_store = MEMORY",
+    "PRAGMA cache_size = -16000",
+    "PRAGMA mmap_size = 268435456",
+]
+
+SQL_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 5)
+
+SQL_DURATION = REGISTRY.histogram(
+    "proadapt_sql_statement_duration_seconds",
+    "Durée d'exécution des requêtes SQL (execute / executemany, hors lecture des lignes par fetch)",
+    ("operation", "table"), SQL_BUCKETS
+)
+
+SQL_OPERATIONS = {"SELECT", "INSERT", "UPDATE", "DELETE", "REPLACE", "CREATE", "DROP", "ALTER", "PRAGMA", "WITH"}
+
+_TABLE_PATTERN = re.compile(r"\b(?:FROM|INTO|UPDATE|TABLE|ON)\s+(?:IF\s+(?:NOT\s+)?EXISTS\s+)?([A-Za-z_]\w*)", re.I)
+
+
+@lru_cache(maxsize=1024)
+def statement_labels(sql):
+    """
+    Étiquettes (opération, table) d'une requête SQL, par exemple ('SELECT', 'sensor_data').
+    """
+    words = sql.split(None, 1)
+    operation = words[0].upper() if words else ""
+    if operation not in SQL_OPERATIONS:
+        operation = "OTHER"
+    match = _TABLE_PATTERN.search(sql)
+    table = match.group(1) if match and operation != "PRAGMA" else ""
+    return operation, table
+
+
+def _observe(sql, started):
+    operation, table = statement_labels(sql)
+    SQL_DURATION.observe(time.perf_counter() - started, operation=operation, table=table)
+
+
+class TimedCursor(sqlite3.Cursor):
+    """
+    Curseur qui mesure la durée de chaque execute / executemany.
+    """
+
+    def execute(self, sql, parameters=()):
+        started = time.perf_counter()
+        try:
+            return super().execute(sql, parameters)
+        finally:
+            _observe(sql, started)
+
+    def executemany(self, sql, seq_of_parameters):
+        started = time.perf_counter()
+        try:
+            return super().executemany(sql, seq_of_parameters)
+        finally:
+            _observe(sql, started)
+
+
+class TimedConnection(sqlite3.Connection):
+    """
+    Connexion dont les curseurs (y compris ceux de connection.execute) sont des TimedCursor.
+    """
+
+    def cursor(self, factory=TimedCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+
+class PoolTimeout(TimeoutError):
+    """
+    Aucune connexion rendue au pool pendant ACQUIRE_TIMEOUT secondes.
+    """
+
+
+class ConnectionPool:
+    def __init__(self, db_name, max_size=DEFAULT_POOL_SIZE, pragmas=None):
+        self.db_name = db_name
+        self.max_size = max_size
+        self.pragmas = CONNECTION_PRAGMAS if pragmas is None else pragmas
+        self._idle = queue.LifoQueue()
+        self._created = 0
+        self._lock = threading.Lock()
+
+    def _open(self):
+        """
+        Ouvre une nouvelle connexion configurée (utilisable depuis n'importe quel thread,
+        mais par un seul à la fois).
+        """
+        connection = sqlite3.connect(
+            self.db_name,
+            timeout=BUSY_TIMEOUT_MS / 1000,
+            check_same_thread=False,
+            cached_statements=CACHED_STATEMENTS,
+            factory=TimedConnection,
+        )
+        self.apply_pragmas(connection)
+        return connection
+
+    def apply_pragmas(self, connection):
+        """
+        (Ré)applique les réglages du pool, par exemple après un import massif.
+        """
+        for pragma in self.pragmas:
+            connection.execute(pragma)
+
+    def acquire(self, timeout=ACQUIRE_TIMEOUT):
+        """
+        Récupère une connexion libre, en ouvre une nouvelle si le pool n'est pas plein,
+        sinon attend qu'une connexion soit rendue (au plus `timeout` secondes, None : sans limite).
+        """
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+
+        with self._lock:
+            can_open = self._created < self.max_size
+            if can_open:
+                self._created += 1
+        if can_open:
+            try:
+                return self._open()
+            except Exception:
+                with self._lock:
+                    self._created -= 1
+                raise
+
+        try:
+            return self._idle.get(timeout=timeout)
+        except queue.Empty:
+            raise PoolTimeout(f"Aucune connexion disponible pour {self.db_name}.")
+
+    def release(self, connection):
+        """
+        Rend une connexion au pool (une transaction restée ouverte est annulée).
+        """
+        try:
+            if connection.in_transaction:
+                connection.rollback()
+        except sqlite3.Error:
+            self._discard(connection)
+            return
+        self._idle.put(connection)
+
+    def _discard(self, connection):
+        with self._lock:
+            self._created -= 1
+        try:
+            connection.close()
+        except sqlite3.Error:
+            pass
+
+    @contextmanager
+    def connection(self):
+        """
+        Prête une connexion le temps d'un bloc `with` (lecture ou écriture sans commit automatique).
+        """
+        connection = self.acquire()
+        try:
+            yield connection
+        finally:
+            self.release(connection)
+
+    @contextmanager
+    def transaction(self):
+        """
+        Prête une connexion dans une transaction : commit à la sortie du bloc, rollback en cas d'erreur.
+        """
+        connection = self.acquire()
+        try:
+            with connection:
+                yield connection
+        finally:
+            self.release(connection)
+
+    def close_all(self):
+        """
+        Ferme les connexions libres du pool (les connexions prêtées ne sont pas touchées).
+        """
+        while True:
+            try:
+                connection = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            self._discard(connection)
+
+
+class ConnectionIterator:
+    """
+    Itérateur sur des lignes lues avec une connexion prêtée par `pool`. La connexion est rendue
+    à la fin du parcours ou à l'appel de close(), même si l'itérateur n'a jamais été parcouru
+    (réponse en flux à une requête HEAD, client déconnecté avant le premier morceau).
+    """
+
+    def __init__(self, pool, connection, rows):
+        self._pool = pool
+        self._connection = connection
+        self._rows = rows
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        if self._connection is None:
+            raise StopIteration
+        try:
+            return next(self._rows)
+        except BaseException:
+            self.close()
+            raise
+
+    def close(self):
+        connection, self._connection = self._connection, None
+        if connection is None:
+            return
+        try:
+            self._rows.close()
+        finally:
+            self._pool.release(connection)
+
+
+def state_database(db_name):
+    """
+    Base séparée (sensor_data.db -> sensor_data.state.db) pour l'état des travaux et la progression des envois.
+    Ces écritures fréquentes viennent d'autres connexions que celle d'un import, qui garde le verrou
+    d'écriture de la base des mesures jusqu'à sa fin : dans la même base, elles attendraient
+    BUSY_TIMEOUT_MS puis échoueraient.
+    """
+    if db_name == ":memory:":
+        return db_name
+    root, extension = os.path.splitext(db_name)
+    return f"{root}.state{extension or '.db'}"
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(db_name, max_size=DEFAULT_POOL_SIZE, purpose="default"):
+    """
+    Retourne le pool partagé associé au fichier `db_name` (créé au premier appel).
+    """
+    key = (db_name if db_name == ":memory:" else os.path.abspath(db_name), purpose)
+    with _pools_lock:
+        pool = _pools.get(key)
+        if pool is None:
+            pool = ConnectionPool(db_name, max_size=max_size)
+            _pools[key] = pool
+        return pool
+
+
+def get_stream_pool(db_name):
+    """
+    Pool des réponses en flux de `db_name`, distinct de celui de get_pool : une connexion y reste
+    prêtée jusqu'à ce que le client ait tout lu.
+    """
+    return get_pool(db_name, max_size=STREAM_POOL_SIZE, purpose="stream")
+
+
+def close_all_pools():
+    """
+    Ferme les connexions libres de tous les pools (arrêt du serveur, tests).
+    """
+    with _pools_lock:
+        pools = list(_pools.values())
+    for pool in pools:
+        pool.close_all()
+
+
+def _forget_pools_after_fork():
+    """
+    Un processus créé par fork (workers du serveur de production) n'utilise pas les connexions
+    héritées de son parent : il recrée ses propres pools.
+    """
+    global _pools_lock
+    _pools_lock = threading.Lock()
+    _pools.clear()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_forget_pools_after_fork)
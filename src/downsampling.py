@@ -0,0 +1,125 @@
+# Réduction du nombre de points envoyés aux graphiques (LTTB, min/max par paquet)
+
+import numpy as np
+
+DOWNSAMPLING_METHODS = ("lttb", "minmax")
+
+
+def lttb_indices(x, values, max_points):
+    """
+    Sélectionne au plus `max_points` indices avec l'algorithme
+    Largest-Triangle-Three-Buckets.
+
+    Plusieurs voies peuvent être traitées en même temps : l'aire du triangle est
+    calculée pour chaque voie (normalisée par son amplitude) puis sommée, ce qui
+    conserve les pics de toutes les voies avec un seul jeu d'indices.
+
+    :param x: Tableau 1D croissant (Timer)
+    :param values: Tableau (n,) ou (n, voies)
+    :param max_points: Nombre maximal de points (>= 3)
+    :return: Tableau d'indices triés
+    """
+    x = np.asarray(x, dtype=np.float64)
+    values = np.asarray(values, dtype=np.float64)
+    if values.ndim == 1:
+        values = values[:, None]
+    n = len(x)
+    if max_points >= n or max_points < 3:
+        return np.arange(n)
+
+    # Normalisation pour que chaque voie pèse autant dans l'aire
+    amplitude = np.ptp(values, axis=0)
+    amplitude[amplitude == 0] = 1.0
+    values = (values - values.min(axis=0)) / amplitude
+    x_span = x[-1] - x[0] or 1.0
+    x = (x - x[0]) / x_span
+
+    # Le premier et le dernier point sont toujours conservés
+    edges = np.linspace(1, n - 1, max_points - 1).astype(np.int64)
+    indices = np.empty(max_points, dtype=np.int64)
+    indices[0] = 0
+    indices[-1] = n - 1
+
+    selected = 0
+    for bucket in range(max_points - 2):
+        start, stop = edges[bucket], edges[bucket + 1]
+        next_start = stop
+        next_stop = edges[bucket + 2] if bucket + 2 < len(edges) else n
+        if next_stop <= next_start:
+            next_stop = next_start + 1
+
+        # Point moyen du paquet suivant
+        average_x = x[next_start:next_stop].mean()
+        average_y = values[next_start:next_stop].mean(axis=0)
+
+        point_x = x[selected]
+        point_y = values[selected]
+        candidates_x = x[start:stop]
+        candidates_y = values[start:stop]
+
+        areas = np.abs(
+            (point_x - average_x) * (candidates_y - point_y)
+            - (point_x - candidates_x)[:, None] * (average_y - point_y)
+        ).sum(axis=1)
+
+        selected = start + int(np.argmax(areas))
+        indices[bucket + 1] = selected
+
+    return indices
+
+
+def minmax_indices(values, max_points):
+    """
+    Découpe la série en paquets et garde, pour chaque voie, l'indice du minimum
+    et du maximum de chaque paquet.
+
+    Quand `max_points` ne permet pas un minimum et un maximum par voie dans au moins un paquet,
+    les voies (normalisées par leur amplitude) sont réunies en une seule enveloppe : minimum et
+    maximum de toutes les voies à chaque instant.
+
+    :param values: Tableau (n,) ou (n, voies)
+    :param max_points: Nombre maximal de points
+    :return: Tableau d'indices triés et uniques
+    """
+    values = np.asarray(values, dtype=np.float64)
+    if values.ndim == 1:
+        values = values[:, None]
+    n, channels = values.shape
+    if max_points >= n:
+        return np.arange(n)
+
+    lows = highs = values
+    if max_points < 2 + 2 * channels:
+        amplitude = np.ptp(values, axis=0)
+        amplitude[amplitude == 0] = 1.0
+        normalized = (values - values.min(axis=0)) / amplitude
+        if max_points < 4:
+            # Place pour un seul point en plus des extrémités : le plus éloigné de la moyenne
+            deviation = np.abs(normalized - normalized.mean(axis=0)).max(axis=1)
+            return np.unique(np.array([0, int(np.argmax(deviation)), n - 1]))[:max_points]
+        lows = normalized.min(axis=1)[:, None]
+        highs = normalized.max(axis=1)[:, None]
+        channels = 1
+
+    bucket_count = (max_points - 2) // (2 * channels)
+    edges = np.linspace(0, n, bucket_count + 1).astype(np.int64)
+
+    selected = [np.array([0, n - 1])]
+    for start, stop in zip(edges[:-1], edges[1:]):
+        if stop <= start:
+            continue
+        selected.append(start + np.argmin(lows[start:stop], axis=0))
+        selected.append(start + np.argmax(highs[start:stop], axis=0))
+
+    return np.unique(np.concatenate(selected))
+
+
+def downsample_indices(x, values, max_points, method="lttb"):
+    """
+    Retourne les indices à conserver pour afficher au plus `max_points` points.
+    """
+    if method == "lttb":
+        return lttb_indices(x, values, max_points)
+    if method == "minmax":
+        return minmax_indices(values, max_points)
+    raise ValueError(f"Méthode de sous-échantillonnage inconnue : {method}")
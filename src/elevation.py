@@ -0,0 +1,179 @@
+# Altitude des points GPS à partir de tuiles d'élévation SRTM (.hgt) stockées localement
+#
+# Une tuile couvre 1° x 1° ; son nom est celui de son coin sud-ouest (N48E002.hgt couvre
+# 48°N..49°N, 2°E..3°E). Elle contient une grille carrée d'entiers 16 bits gros-boutistes,
+# ligne par ligne du nord au sud (1201 x 1201 en SRTM3, 3601 x 3601 en SRTM1), -32768 = vide.
+# Les tuiles sont projetées en mémoire (np.memmap) : seules les pages lues sont chargées.
+# L'API Open Elevation n'est plus qu'un recours, pour les points hors des tuiles disponibles.
+
+import os
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import requests
+
+OPEN_ELEVATION_API_URL = "https://api.open-elevation.com/api/v1/lookup"
+
+# Dossier des tuiles .hgt (variable d'environnement PROADAPT_DEM_DIR)
+DEM_DIRECTORY = os.environ.get("PROADAPT_DEM_DIR", "dem")
+
+# Nombre de tuiles gardées ouvertes
+MAX_OPEN_TILES = 16
+
+HGT_VOID = -32768
+
+# Décalages (latitude, longitude) des tuiles essayées pour un point situé sur un bord de tuile
+TILE_EDGE_SHIFTS = ((0, 0), (1, 0), (0, 1), (1, 1))
+
+
+def tile_name(lat_floor, lon_floor):
+    """
+    Nom de la tuile dont le coin sud-ouest est (lat_floor, lon_floor), par exemple N48E002.hgt.
+    """
+    lat_prefix = "N" if lat_floor >= 0 else "S"
+    lon_prefix = "E" if lon_floor >= 0 else "W"
+    return f"{lat_prefix}{abs(lat_floor):02d}{lon_prefix}{abs(lon_floor):03d}.hgt"
+
+
+class HgtTile:
+    def __init__(self, path):
+        self.path = path
+        samples = int(round(np.sqrt(os.path.getsize(path) / 2)))
+        if samples * samples * 2 != os.path.getsize(path):
+            raise ValueError(f"Taille de tuile invalide : {path}")
+        self.samples = samples
+        self.data = np.memmap(path, dtype=">i2", mode="r", shape=(samples, samples))
+
+    def interpolate(self, lat, lon, lat_floor, lon_floor):
+        """
+        Interpolation bilinéaire de l'altitude pour des points situés dans la tuile.
+        Les sommets vides sont ignorés (poids répartis sur les autres, ou moyenne des sommets
+        renseignés si le point tombe sur un sommet vide) ; NaN si les quatre sont vides.
+        """
+        last = self.samples - 1
+        row = np.clip((lat_floor + 1 - lat) * last, 0, last)
+        col = np.clip((lon - lon_floor) * last, 0, last)
+        row0 = np.minimum(np.floor(row).astype(np.int64), last - 1)
+        col0 = np.minimum(np.floor(col).astype(np.int64), last - 1)
+        dy = row - row0
+        dx = col - col0
+
+        total = np.zeros(len(lat))
+        weights = np.zeros(len(lat))
+        valid_total = np.zeros(len(lat))
+        valid_count = np.zeros(len(lat))
+        for row_offset, col_offset, weight in (
+            (0, 0, (1 - dy) * (1 - dx)), (0, 1, (1 - dy) * dx),
+            (1, 0, dy * (1 - dx)), (1, 1, dy * dx),
+        ):
+            values = self.data[row0 + row_offset, col0 + col_offset].astype(np.float64)
+            valid = values != HGT_VOID
+            total += np.where(valid, values * weight, 0)
+            weights += np.where(valid, weight, 0)
+            valid_total += np.where(valid, values, 0)
+            valid_count += valid
+
+        elevation = np.full(len(lat), np.nan)
+        known = weights > 0
+        elevation[known] = total[known] / weights[known]
+        nearest_void = ~known & (valid_count > 0)
+        elevation[nearest_void] = valid_total[nearest_void] / valid_count[nearest_void]
+        return elevation
+
+
+class DemElevationProvider:
+    def __init__(self, directory=DEM_DIRECTORY, max_open_tiles=MAX_OPEN_TILES):
+        self.directory = directory
+        self.max_open_tiles = max_open_tiles
+        self._tiles = OrderedDict()  # (lat_floor, lon_floor) -> HgtTile, ou None si absente
+        self._lock = threading.Lock()
+
+    def tile(self, lat_floor, lon_floor):
+        """
+        Tuile ouverte (None si elle n'est pas dans le dossier), en gardant les plus récemment utilisées.
+        """
+        key = (lat_floor, lon_floor)
+        with self._lock:
+            if key in self._tiles:
+                self._tiles.move_to_end(key)
+                return self._tiles[key]
+
+            path = os.path.join(self.directory, tile_name(lat_floor, lon_floor))
+            tile = HgtTile(path) if os.path.isfile(path) else None
+            self._tiles[key] = tile
+            while len(self._tiles) > self.max_open_tiles:
+                self._tiles.popitem(last=False)
+            return tile
+
+    def elevations(self, latitude, longitude):
+        """
+        Altitudes (m) des points, NaN pour ceux qui ne sont couverts par aucune tuile.
+        """
+        latitude = np.asarray(latitude, dtype=np.float64)
+        longitude = np.asarray(longitude, dtype=np.float64)
+        elevation = np.full(len(latitude), np.nan)
+        finite = np.isfinite(latitude) & np.isfinite(longitude)
+        if not finite.any():
+            return elevation
+
+        indices = np.flatnonzero(finite)
+        lat_floor = np.floor(latitude[indices]).astype(np.int64)
+        lon_floor = np.floor(longitude[indices]).astype(np.int64)
+        lat_on_edge = lat_floor == latitude[indices]
+        lon_on_edge = lon_floor == longitude[indices]
+        # Un point dont la latitude (longitude) est entière est sur le bord sud (ouest) de la tuile
+        # lat_floor et sur le bord nord (est) de la tuile voisine, qui contient aussi cette ligne
+        # (colonne) : s'il n'est couvert par aucune tuile, il est cherché dans les tuiles voisines
+        pending = np.ones(len(indices), dtype=bool)
+        for lat_shift, lon_shift in TILE_EDGE_SHIFTS:
+            candidates = pending & (lat_on_edge | (lat_shift == 0)) & (lon_on_edge | (lon_shift == 0))
+            if not candidates.any():
+                continue
+            covered = self._interpolate_tiles(
+                latitude, longitude, indices[candidates],
+                lat_floor[candidates] - lat_shift, lon_floor[candidates] - lon_shift, elevation,
+            )
+            pending[np.flatnonzero(candidates)[covered]] = False
+        return elevation
+
+    def _interpolate_tiles(self, latitude, longitude, indices, lat_floor, lon_floor, elevation):
+        """
+        Interpole dans elevation les points indices, chacun dans la tuile (lat_floor, lon_floor).
+        Renvoie le masque (aligné sur indices) des points couverts par une tuile présente.
+        """
+        covered = np.zeros(len(indices), dtype=bool)
+        # Points regroupés par tuile (numéro de tuile sur la grille de 1°), une interpolation par tuile
+        tile_numbers = (lat_floor + 90) * 360 + (lon_floor + 180)
+        order = np.argsort(tile_numbers, kind="stable")
+        tile_numbers = tile_numbers[order]
+        bounds = np.flatnonzero(np.diff(tile_numbers)) + 1
+        starts = np.concatenate(([0], bounds))
+        ends = np.append(bounds, len(order))
+        for start, end in zip(starts.tolist(), ends.tolist()):
+            tile_lat, tile_lon = divmod(int(tile_numbers[start]), 360)
+            tile_lat, tile_lon = tile_lat - 90, tile_lon - 180
+            tile = self.tile(tile_lat, tile_lon)
+            if tile is None:
+                continue
+            points = indices[order[start:end]]
+            elevation[points] = tile.interpolate(latitude[points], longitude[points], tile_lat, tile_lon)
+            covered[order[start:end]] = True
+        return covered
+
+    def clear(self):
+        with self._lock:
+            self._tiles.clear()
+
+
+def fetch_remote_elevations(latitude, longitude, url=OPEN_ELEVATION_API_URL, timeout=10):
+    """
+    Altitudes fournies par l'API Open Elevation (connexion Internet nécessaire).
+
+    :raises requests.exceptions.RequestException: API injoignable ou en erreur
+    """
+    locations = [{"latitude": lat, "longitude": lon} for lat, lon in zip(latitude, longitude)]
+    response = requests.post(url, json={"locations": locations}, timeout=timeout)
+    response.raise_for_status()
+    results = response.json().get("results", [])
+    return np.array([result.get("elevation", np.nan) for result in results], dtype=np.float64)
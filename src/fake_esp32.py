@@ -0,0 +1,110 @@
+# Faux ESP32 sur un pseudo-terminal (pty) pour tester les récepteurs sans matériel
+#
+# Le faux appareil attend la commande "18", répond "184", envoie ses lignes de mesures
+# au format ASCII (21 champs séparés par ';') puis termine par "186".
+# Avec `supports_binary`, une demande "18B" reçoit "184B" suivi de trames binaires.
+
+import os
+import threading
+import tty
+
+from binary_protocol import BINARY_REQUEST, encode_end_frame, encode_frame
+
+
+def synthetic_lines(row_count, start_timer=0, period_ms=20):
+    """
+    Génère des lignes de mesures plausibles (IMU et flexion, colonnes GPS vides).
+    """
+    for index in range(row_count):
+        timer = start_timer + index * period_ms
+        phase = index % 50
+        accel = (phase - 25) * 400
+        gyro = (25 - phase) * 40
+        fields = [
+            timer,
+            accel, -accel, 16384 + accel // 4, gyro, -gyro, gyro // 2,
+            -accel, accel, 16384 - accel // 4, -gyro, gyro, -gyro // 2,
+            phase * 10,
+        ]
+        yield ";".join(str(value) for value in fields) + ";;;;;;;"
+
+
+class FakeESP32:
+    def __init__(self, lines, request=b"18", chunk_size=4096, supports_binary=False):
+        """
+        :param lines: Lignes de mesures à envoyer (sans fin de ligne)
+        :param request: Commande attendue avant l'envoi
+        :param chunk_size: Taille des écritures sur le pty
+        :param supports_binary: Répondre en trames binaires à la commande "18B"
+        """
+        self.lines = lines
+        self.request = request
+        self.chunk_size = chunk_size
+        self.supports_binary = supports_binary
+        self.master_fd, self.slave_fd = os.openpty()
+        # Mode brut : pas d'écho ni de conversion des fins de ligne
+        tty.setraw(self.master_fd)
+        tty.setraw(self.slave_fd)
+        self.port = os.ttyname(self.slave_fd)
+        self.received = b""
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name=f"fake-esp32-{self.port}", daemon=True)
+        self._thread.start()
+        return self
+
+    def _run(self):
+        # Attente de la commande de démarrage
+        while self.request not in self.received:
+            data = os.read(self.master_fd, 1024)
+            if not data:
+                return
+            self.received += data
+
+        if self.supports_binary and BINARY_REQUEST in self.received:
+            self._send_binary()
+            return
+
+        self._write(b"184\n")
+        buffer = []
+        size = 0
+        for line in self.lines:
+            encoded = line.encode("utf-8") + b"\n"
+            buffer.append(encoded)
+            size += len(encoded)
+            if size >= self.chunk_size:
+                self._write(b"".join(buffer))
+                buffer = []
+                size = 0
+        buffer.append(b"186\n")
+        self._write(b"".join(buffer))
+
+    def _send_binary(self):
+        self._write(b"184B\n")
+        buffer = bytearray()
+        for line in self.lines:
+            fields = [value if value != "" else None for value in line.split(";")]
+            buffer += encode_frame(fields)
+            if len(buffer) >= self.chunk_size:
+                self._write(bytes(buffer))
+                buffer.clear()
+        buffer += encode_end_frame()
+        self._write(bytes(buffer))
+
+    def _write(self, data):
+        view = memoryview(data)
+        while view:
+            written = os.write(self.master_fd, view)
+            view = view[written:]
+
+    def join(self, timeout=None):
+        if self._thread:
+            self._thread.join(timeout)
+
+    def close(self):
+        for fd in (self.master_fd, self.slave_fd):
+            try:
+                os.close(fd)
+            except OSError:
+                pass
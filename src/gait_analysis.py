@@ -0,0 +1,298 @@
+# Analyse de la marche / course à partir des IMU des deux prothèses (NumPy)
+#
+# Jambe gauche : Accel1* / Gyro1*, jambe droite : Accel2* / Gyro2*.
+# Pour chaque jambe on détecte les impacts (pics de l'accélération dynamique), ce qui donne
+# les foulées de cette jambe ; la phase d'appui d'une foulée est le temps passé avec une
+# vitesse angulaire faible (sous le milieu entre le minimum et le maximum de la foulée).
+# Les résultats sont gardés dans la table 'gait_analytics' et recalculés uniquement
+# quand des lignes ont été ajoutées ou retirées dans la plage analysée. Chaque session garde le
+# résultat de toutes ses mesures ; ceux des plages zoomées sont limités à MAX_RANGE_RESULTS,
+# les plus anciens étant supprimés en premier.
+
+import json
+
+import numpy as np
+
+from database_manager import DatabaseManager
+from db_connection import get_pool
+
+# À incrémenter quand l'algorithme change, pour invalider les résultats en cache
+GAIT_ANALYSIS_VERSION = 1
+
+# Nombre maximal de résultats gardés pour des plages (start / end) de toutes les sessions
+MAX_RANGE_RESULTS = 200
+
+LEGS = {
+    "left": (["Accel1X", "Accel1Y", "Accel1Z"], ["Gyro1X", "Gyro1Y", "Gyro1Z"]),
+    "right": (["Accel2X", "Accel2Y", "Accel2Z"], ["Gyro2X", "Gyro2Y", "Gyro2Z"]),
+}
+GAIT_COLUMNS = ["Timer"] + [name for accel, gyro in LEGS.values() for name in accel + gyro]
+
+# Fenêtre (s) de la moyenne glissante retirée de l'accélération (gravité, dérive)
+DETREND_WINDOW = 1.0
+
+# Seuil de détection d'un impact : moyenne + PEAK_THRESHOLD écarts-types
+PEAK_THRESHOLD = 0.5
+
+# Écart minimal (s) entre deux impacts d'une même jambe
+MIN_STEP_INTERVAL = 0.4
+
+# Durées (s) acceptées pour une foulée ; au-delà il s'agit d'une pause ou d'un trou dans les données
+MIN_STRIDE_TIME = 0.4
+MAX_STRIDE_TIME = 2.0
+
+# Fenêtre (s) de la courbe de cadence
+CADENCE_WINDOW = 30.0
+
+
+def rolling_mean(t, values, window):
+    """
+    Moyenne glissante centrée sur une fenêtre de `window` secondes (échantillonnage irrégulier).
+    """
+    sums = np.concatenate(([0.0], np.cumsum(values)))
+    low = np.searchsorted(t, t - window / 2)
+    high = np.searchsorted(t, t + window / 2, side="right")
+    return (sums[high] - sums[low]) / (high - low)
+
+
+def dynamic_magnitude(t, axes, window=DETREND_WINDOW):
+    """
+    Norme de l'accélération une fois la composante lente (gravité) retirée de chaque axe.
+    Un axe bloqué (capteur saturé) ne contribue donc pas.
+    """
+    dynamic = axes - np.column_stack([rolling_mean(t, axes[:, k], window) for k in range(axes.shape[1])])
+    return np.sqrt(np.sum(dynamic ** 2, axis=1))
+
+
+def detect_steps(t, signal, threshold=PEAK_THRESHOLD, min_interval=MIN_STEP_INTERVAL):
+    """
+    Indices des impacts : maxima locaux au-dessus du seuil, en ne gardant que le plus fort
+    des pics séparés de moins de `min_interval` secondes.
+    """
+    if len(signal) < 3:
+        return np.zeros(0, dtype=np.int64)
+    level = signal.mean() + threshold * signal.std()
+    middle = signal[1:-1]
+    candidates = np.flatnonzero((middle >= signal[:-2]) & (middle > signal[2:]) & (middle > level)) + 1
+
+    kept = []
+    for index in candidates.tolist():
+        if kept and t[index] - t[kept[-1]] < min_interval:
+            if signal[index] > signal[kept[-1]]:
+                kept[-1] = index
+        else:
+            kept.append(index)
+    return np.array(kept, dtype=np.int64)
+
+
+def stride_phases(t, gyro_magnitude, strikes):
+    """
+    Durée de chaque foulée (entre deux impacts) et durée de sa phase d'appui.
+    """
+    if len(strikes) < 2:
+        return np.zeros(0), np.zeros(0)
+
+    stride_time = np.diff(t[strikes])
+    first, last = strikes[0], strikes[-1]
+    segment = gyro_magnitude[first:last]
+    sample_time = np.diff(t[first:last + 1])
+    starts = strikes[:-1] - first
+
+    # Seuil propre à chaque foulée : milieu entre le minimum et le maximum de la vitesse angulaire
+    low = np.minimum.reduceat(segment, starts)
+    high = np.maximum.reduceat(segment, starts)
+    stride_index = np.repeat(np.arange(len(starts)), np.diff(np.append(starts, len(segment))))
+    stance = segment < ((low + high) / 2)[stride_index]
+    stance_time = np.bincount(stride_index, weights=sample_time * stance, minlength=len(starts))
+    return stride_time, stance_time
+
+
+def symmetry_index(left, right):
+    """
+    Indice de symétrie (%) : 100 * (G - D) / moyenne(G, D). 0 = symétrique, positif = gauche plus grand.
+    """
+    if left is None or right is None or left + right == 0:
+        return None
+    return 100 * (left - right) / ((left + right) / 2)
+
+
+def _number(value):
+    if value is None or not np.isfinite(value):
+        return None
+    return float(value)
+
+
+def analyze_leg(t, accel, gyro):
+    """
+    Impacts, foulées et phases d'appui / d'envol d'une jambe.
+    """
+    signal = dynamic_magnitude(t, accel)
+    strikes = detect_steps(t, signal)
+    stride_time, stance_time = stride_phases(t, np.sqrt(np.sum(gyro ** 2, axis=1)), strikes)
+    valid = (stride_time >= MIN_STRIDE_TIME) & (stride_time <= MAX_STRIDE_TIME)
+    stride_time, stance_time = stride_time[valid], stance_time[valid]
+    swing_time = stride_time - stance_time
+
+    has_strides = len(stride_time) > 0
+    summary = {
+        "steps": int(len(strikes)),
+        "strides": int(len(stride_time)),
+        "stride_time": _number(np.median(stride_time)) if has_strides else None,
+        "stride_time_std": _number(np.std(stride_time)) if has_strides else None,
+        "stance_time": _number(np.mean(stance_time)) if has_strides else None,
+        "swing_time": _number(np.mean(swing_time)) if has_strides else None,
+        "stance_ratio": _number(100 * np.sum(stance_time) / np.sum(stride_time)) if has_strides else None,
+        "impact": _number(np.median(signal[strikes])) if len(strikes) else None,
+    }
+    # Fin de chaque foulée valide, pour la courbe de cadence
+    stride_end = t[strikes[1:]][valid] if len(strikes) > 1 else np.zeros(0)
+    return summary, stride_end, stride_time
+
+
+def cadence_series(stride_end, stride_time, window=CADENCE_WINDOW):
+    """
+    Cadence (pas par minute, deux jambes) par fenêtre de `window` secondes,
+    à partir de la durée médiane des foulées terminées dans la fenêtre.
+    """
+    if len(stride_end) == 0:
+        return []
+    origin = stride_end.min()
+    bins = ((stride_end - origin) // window).astype(np.int64)
+    counts = np.bincount(bins)
+    present = np.flatnonzero(counts)
+
+    # Tri par fenêtre puis par durée : la médiane (inférieure) est au milieu de chaque groupe
+    sorted_time = stride_time[np.lexsort((stride_time, bins))]
+    starts = np.concatenate(([0], np.cumsum(counts[present])[:-1]))
+    median = sorted_time[starts + (counts[present] - 1) // 2]
+    cadence = 2 * 60 / median
+    timers = (origin + present * window) * 1000
+    return [{"Timer": float(timer), "cadence": float(value)} for timer, value in zip(timers, cadence)]
+
+
+def analyze_gait(columns):
+    """
+    Analyse complète d'une session.
+
+    :param columns: Dictionnaire {nom de colonne: tableau NumPy} (colonnes de GAIT_COLUMNS, Timer en ms)
+    :return: Dictionnaire sérialisable en JSON
+    """
+    timer = columns["Timer"]
+    order = np.argsort(timer, kind="stable")
+    t = timer[order] / 1000
+
+    legs = {}
+    stride_ends = []
+    stride_times = []
+    for leg, (accel_columns, gyro_columns) in LEGS.items():
+        accel = np.column_stack([columns[name][order] for name in accel_columns])
+        gyro = np.column_stack([columns[name][order] for name in gyro_columns])
+        summary, stride_end, stride_time = analyze_leg(t, accel, gyro)
+        legs[leg] = summary
+        stride_ends.append(stride_end)
+        stride_times.append(stride_time)
+
+    left, right = legs["left"], legs["right"]
+    leg_cadences = [60 / leg["stride_time"] for leg in (left, right) if leg["stride_time"]]
+    # Une jambe sans foulée détectée : on suppose la même cadence que l'autre
+    cadence = sum(leg_cadences) * 2 / len(leg_cadences) if leg_cadences else None
+
+    stride_end = np.concatenate(stride_ends)
+    stride_time = np.concatenate(stride_times)
+    order = np.argsort(stride_end, kind="stable")
+
+    return {
+        "samples": int(len(t)),
+        "duration": _number(t[-1] - t[0]) if len(t) else 0.0,
+        "steps": left["steps"] + right["steps"],
+        "cadence": _number(cadence),
+        "legs": legs,
+        "symmetry": {
+            metric: _number(symmetry_index(left[metric], right[metric]))
+            for metric in ("stride_time", "stance_time", "swing_time", "stance_ratio", "impact")
+        },
+        "cadence_series": cadence_series(stride_end[order], stride_time[order]),
+    }
+
+
+def load_gait_columns(db_name, start=None, end=None, session_id=None):
+    """
+    Lit Timer et les IMU des deux jambes dans des tableaux NumPy (NULL -> 0, lignes sans Timer ignorées).
+    """
+    columns = DatabaseManager(db_name).read_sensor_columns(GAIT_COLUMNS, start, end, session_id)
+    return {name: np.nan_to_num(values) for name, values in columns.items()}
+
+
+class GaitAnalyticsCache:
+    def __init__(self, db_name="sensor_data.db"):
+        self.db_name = db_name
+        self._initialize_database()
+
+    def _initialize_database(self):
+        """
+        Crée la table des résultats d'analyse si elle n'existe pas.
+        """
+        with get_pool(self.db_name).transaction() as connection:
+            connection.execute('''
+                CREATE TABLE IF NOT EXISTS gait_analytics (
+                    cache_key TEXT PRIMARY KEY,
+                    data_version TEXT NOT NULL,
+                    computed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    result TEXT NOT NULL
+                )
+            ''')
+
+    @staticmethod
+    def cache_key(session_id=None, start=None, end=None):
+        return f"session:{session_id}:range:{start}:{end}"
+
+    def data_version(self, start=None, end=None, session_id=None):
+        """
+        Empreinte des données analysées : elle change dès qu'une ligne est ajoutée ou supprimée.
+        """
+        row = DatabaseManager(self.db_name).sensor_fingerprint(start, end, session_id)
+        return f"{GAIT_ANALYSIS_VERSION}:" + ":".join(str(value) for value in row)
+
+    def get(self, start=None, end=None, session_id=None):
+        """
+        Retourne (résultat, depuis_le_cache). L'analyse n'est relancée que si l'empreinte
+        des données a changé depuis le dernier calcul pour cette plage.
+        """
+        cache_key = self.cache_key(session_id, start, end)
+        version = self.data_version(start, end, session_id)
+        with get_pool(self.db_name).connection() as conn:
+            row = conn.execute(
+                "SELECT data_version, result FROM gait_analytics WHERE cache_key = ?", (cache_key,)
+            ).fetchone()
+        if row and row[0] == version:
+            return json.loads(row[1]), True
+
+        result = analyze_gait(load_gait_columns(self.db_name, start, end, session_id))
+        with get_pool(self.db_name).transaction() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO gait_analytics (cache_key, data_version, computed_at, result) "
+                "VALUES (?, ?, CURRENT_TIMESTAMP, ?)",
+                (cache_key, version, json.dumps(result))
+            )
+            if start is not None or end is not None:
+                conn.execute(
+                    "DELETE FROM gait_analytics WHERE cache_key NOT LIKE '%:range:None:None' AND cache_key NOT IN ("
+                    "SELECT cache_key FROM gait_analytics WHERE cache_key NOT LIKE '%:range:None:None' "
+                    "ORDER BY computed_at DESC, rowid DESC LIMIT ?)",
+                    (MAX_RANGE_RESULTS,)
+                )
+        return result, False
+
+    def delete(self, session_id):
+        """
+        Supprime les résultats d'une session (toutes ses plages).
+        """
+        with get_pool(self.db_name).transaction() as conn:
+            conn.execute("DELETE FROM gait_analytics WHERE cache_key LIKE ?", (f"session:{session_id}:range:%",))
+
+    def clear(self):
+        """
+        Supprime tous les résultats en cache.
+        """
+        with get_pool(self.db_name).transaction() as conn:
+            conn.execute("DELETE FROM gait_analytics")
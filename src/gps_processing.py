@@ -0,0 +1,203 @@
+# Calculs GPS vectorisés (distances, vitesse, allure) pour les traces GPX
+
+import csv
+import os
+
+import gpxpy
+import numpy as np
+
+from trace_simplification import trace_importance
+
+EARTH_RADIUS_KM = 6371.0088
+
+# Ellipsoïde WGS-84
+WGS84_A = 6378.137
+WGS84_F = 1 / 298.257223563
+WGS84_B = WGS84_A * (1 - WGS84_F)
+
+DISTANCE_METHODS = ("vincenty", "haversine")
+
+
+def load_track_points(gpx):
+    """
+    Extrait tous les points d'un fichier GPX (toutes traces et segments confondus).
+
+    :return: Dictionnaire de tableaux NumPy : latitude, longitude, elevation (NaN si absente)
+             et time (horodatage en secondes, NaN si absent)
+    """
+    latitudes = []
+    longitudes = []
+    elevations = []
+    times = []
+    for track in gpx.tracks:
+        for segment in track.segments:
+            for point in segment.points:
+                latitudes.append(point.latitude)
+                longitudes.append(point.longitude)
+                elevations.append(point.elevation)
+                times.append(point.time.timestamp() if point.time else None)
+
+    return {
+        "latitude": np.array(latitudes, dtype=np.float64),
+        "longitude": np.array(longitudes, dtype=np.float64),
+        "elevation": np.array(elevations, dtype=np.float64),
+        "time": np.array(times, dtype=np.float64),
+    }
+
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    """
+    Distance sur une sphère (km), vectorisée.
+    """
+    lat1, lon1, lat2, lon2 = map(np.radians, (lat1, lon1, lat2, lon2))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
+def vincenty_km(lat1, lon1, lat2, lon2, max_iterations=200, tolerance=1e-12):
+    """
+    Distance sur l'ellipsoïde WGS-84 (formule inverse de Vincenty), vectorisée.
+    Les rares paires qui ne convergent pas (points quasi antipodaux) sont calculées
+    avec la formule de haversine.
+    """
+    lat1, lon1, lat2, lon2 = (np.asarray(value, dtype=np.float64) for value in (lat1, lon1, lat2, lon2))
+    f = WGS84_F
+    L = np.radians(lon2 - lon1)
+    U1 = np.arctan((1 - f) * np.tan(np.radians(lat1)))
+    U2 = np.arctan((1 - f) * np.tan(np.radians(lat2)))
+    sin_U1, cos_U1 = np.sin(U1), np.cos(U1)
+    sin_U2, cos_U2 = np.sin(U2), np.cos(U2)
+
+    lam = L.copy()
+    active = np.ones(L.shape, dtype=bool)
+    sin_sigma = np.zeros_like(L)
+    cos_sigma = np.ones_like(L)
+    sigma = np.zeros_like(L)
+    cos_sq_alpha = np.ones_like(L)
+    cos_2sigma_m = np.zeros_like(L)
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        for _ in range(max_iterations):
+            sin_lam, cos_lam = np.sin(lam), np.cos(lam)
+            sin_sigma_new = np.sqrt((cos_U2 * sin_lam) ** 2 + (cos_U1 * sin_U2 - sin_U1 * cos_U2 * cos_lam) ** 2)
+            cos_sigma_new = sin_U1 * sin_U2 + cos_U1 * cos_U2 * cos_lam
+            sigma_new = np.arctan2(sin_sigma_new, cos_sigma_new)
+            sin_alpha = np.where(sin_sigma_new == 0, 0.0, cos_U1 * cos_U2 * sin_lam / sin_sigma_new)
+            cos_sq_alpha_new = 1 - sin_alpha ** 2
+            cos_2sigma_m_new = np.where(
+                cos_sq_alpha_new == 0, 0.0, cos_sigma_new - 2 * sin_U1 * sin_U2 / cos_sq_alpha_new
+            )
+            C = f / 16 * cos_sq_alpha_new * (4 + f * (4 - 3 * cos_sq_alpha_new))
+            lam_new = L + (1 - C) * f * sin_alpha * (
+                sigma_new + C * sin_sigma_new * (cos_2sigma_m_new + C * cos_sigma_new * (-1 + 2 * cos_2sigma_m_new ** 2))
+            )
+
+            # Seules les paires non convergées sont mises à jour
+            sin_sigma = np.where(active, sin_sigma_new, sin_sigma)
+            cos_sigma = np.where(active, cos_sigma_new, cos_sigma)
+            sigma = np.where(active, sigma_new, sigma)
+            cos_sq_alpha = np.where(active, cos_sq_alpha_new, cos_sq_alpha)
+            cos_2sigma_m = np.where(active, cos_2sigma_m_new, cos_2sigma_m)
+            converged = np.abs(lam_new - lam) <= tolerance
+            lam = np.where(active, lam_new, lam)
+            active &= ~converged
+            if not active.any():
+                break
+
+        u_sq = cos_sq_alpha * (WGS84_A ** 2 - WGS84_B ** 2) / WGS84_B ** 2
+        A = 1 + u_sq / 16384 * (4096 + u_sq * (-768 + u_sq * (320 - 175 * u_sq)))
+        B = u_sq / 1024 * (256 + u_sq * (-128 + u_sq * (74 - 47 * u_sq)))
+        delta_sigma = B * sin_sigma * (cos_2sigma_m + B / 4 * (
+            cos_sigma * (-1 + 2 * cos_2sigma_m ** 2)
+            - B / 6 * cos_2sigma_m * (-3 + 4 * sin_sigma ** 2) * (-3 + 4 * cos_2sigma_m ** 2)
+        ))
+        distance = WGS84_B * A * (sigma - delta_sigma)
+
+    if active.any():
+        distance = np.where(active, haversine_km(lat1, lon1, lat2, lon2), distance)
+    return distance
+
+
+def smooth(values, window):
+    """
+    Moyenne glissante centrée sur `window` points (les bords utilisent les points disponibles).
+    """
+    if window is None or window <= 1 or len(values) == 0:
+        return values
+    kernel = np.ones(int(window))
+    sums = np.convolve(values, kernel, mode="same")
+    counts = np.convolve(np.ones(len(values)), kernel, mode="same")
+    return sums / counts
+
+
+def compute_speed_and_pace(latitude, longitude, times, method="vincenty", smoothing=0):
+    """
+    Calcule en une passe la distance entre points consécutifs, la vitesse (km/h)
+    et l'allure (min/km). Mêmes conventions que le calcul point par point :
+    premier point, écart de temps nul ou horodatage manquant -> vitesse 0, allure 0.
+
+    :param method: 'vincenty' (ellipsoïde, comme geopy) ou 'haversine' (sphère, plus rapide)
+    :param smoothing: Fenêtre (en points) de la moyenne glissante appliquée à la vitesse
+    :return: (distance_km, speed_kmh, pace_min_km), tableaux de même longueur que l'entrée
+    """
+    if method not in DISTANCE_METHODS:
+        raise ValueError(f"Méthode de distance inconnue : {method}")
+
+    count = len(latitude)
+    distance_km = np.zeros(count)
+    speed_kmh = np.zeros(count)
+    if count < 2:
+        return distance_km, speed_kmh, np.zeros(count)
+
+    distance_function = vincenty_km if method == "vincenty" else haversine_km
+    distance_km[1:] = distance_function(latitude[:-1], longitude[:-1], latitude[1:], longitude[1:])
+
+    time_diff_h = np.diff(times) / 3600
+    valid = np.isfinite(time_diff_h) & (time_diff_h > 0)
+    speed_kmh[1:][valid] = distance_km[1:][valid] / time_diff_h[valid]
+
+    speed_kmh = smooth(speed_kmh, smoothing)
+
+    pace_min_km = np.zeros(count)
+    moving = speed_kmh > 0
+    pace_min_km[moving] = 60 / speed_kmh[moving]
+    return distance_km, speed_kmh, pace_min_km
+
+
+def write_gps_csv(gpx_data, csv_file_path, method="vincenty", smoothing=0):
+    """
+    Analyse un fichier GPX et écrit la trace (Timer, position, altitude, vitesse, allure et
+    importance pour la simplification du tracé, voir trace_simplification.py) dans
+    `csv_file_path`. Le fichier est remplacé d'un coup, un lecteur ne voit jamais un fichier
+    à moitié écrit. Utilisée comme tâche de fond (voir jobs.py).
+
+    :param gpx_data: Contenu du fichier GPX (texte)
+    :return: Dictionnaire {points, file_path}
+    """
+    gpx = gpxpy.parse(gpx_data)
+
+    # Calcul vectorisé des distances, vitesses et allures sur tous les points
+    points = load_track_points(gpx)
+    _, speeds, paces = compute_speed_and_pace(
+        points["latitude"], points["longitude"], points["time"], method=method, smoothing=smoothing
+    )
+
+    # Simplifications du tracé pour tous les niveaux de zoom, calculées une fois à l'analyse
+    importances = np.round(trace_importance(points["latitude"], points["longitude"]), 2)
+
+    timers = ["" if np.isnan(value) else value for value in points["time"].tolist()]
+    elevations = [None if np.isnan(value) else value for value in points["elevation"].tolist()]
+    data = zip(
+        timers, points["latitude"].tolist(), points["longitude"].tolist(),
+        elevations, speeds.tolist(), paces.tolist(), importances.tolist()
+    )
+
+    temp_file_path = f"{csv_file_path}.{os.getpid()}.tmp"
+    with open(temp_file_path, mode='w', newline='') as csv_file:
+        writer = csv.writer(csv_file, delimiter=";")
+        writer.writerow(["Timer", "Latitude", "Longitude", "Altitude", "Vitesse", "Allure", "Importance"])
+        writer.writerows(data)
+    os.replace(temp_file_path, csv_file_path)
+
+    print(f"Données GPS enregistrées dans le fichier : {csv_file_path}")
+    return {"points": len(timers), "file_path": csv_file_path}
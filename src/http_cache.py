@@ -0,0 +1,99 @@
+# Requêtes conditionnelles (ETag / If-None-Match) et compression des réponses de l'API
+#
+# L'ETag d'une route de lecture est calculé à partir des compteurs de version de la table
+# 'data_versions' (voir DatabaseManager.bump_data_versions) : le comparer ne demande qu'une
+# lecture de quelques lignes, sans toucher aux mesures. Tant qu'aucune écriture n'a eu lieu
+# le client reçoit un 304 vide.
+# Les réponses JSON / NDJSON / binaires sont compressées en gzip, ou en brotli si le module
+# `brotli` est installé et accepté par le client. Les réponses en flux sont compressées au fil
+# de l'eau.
+
+import gzip
+import hashlib
+import zlib
+
+from flask import Response
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+COMPRESSIBLE_MIMETYPES = {"application/json", "application/x-ndjson", "application/octet-stream"}
+
+# En dessous de cette taille (octets) une réponse non diffusée en flux n'est pas compressée
+MIN_COMPRESS_SIZE = 1024
+
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 4
+
+
+def data_etag(versions):
+    """
+    ETag (faible) construit à partir des portées et des versions des données lues.
+    """
+    payload = ":".join(str(value) for value in versions)
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()
+
+
+def with_etag(response, etag):
+    response.set_etag(etag, weak=True)
+    return response
+
+
+def not_modified(etag):
+    response = Response(status=304)
+    response.set_etag(etag, weak=True)
+    response.vary.add("Accept-Encoding")
+    return response
+
+
+def supported_encodings():
+    return ["br", "gzip"] if brotli is not None else ["gzip"]
+
+
+def _gzip_chunks(chunks):
+    compressor = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def _brotli_chunks(chunks):
+    compressor = brotli.Compressor(quality=BROTLI_QUALITY)
+    for chunk in chunks:
+        data = compressor.process(chunk)
+        if data:
+            yield data
+    yield compressor.finish()
+
+
+def compress_response(response, accept_encodings):
+    """
+    Compresse la réponse selon l'en-tête Accept-Encoding (request.accept_encodings).
+    """
+    if (response.status_code != 200 or response.direct_passthrough
+            or "Content-Encoding" in response.headers
+            or response.mimetype not in COMPRESSIBLE_MIMETYPES):
+        return response
+    response.vary.add("Accept-Encoding")
+    encoding = accept_encodings.best_match(supported_encodings())
+    if encoding is None:
+        return response
+
+    if response.is_streamed:
+        chunks = response.iter_encoded()
+        response.response = _brotli_chunks(chunks) if encoding == "br" else _gzip_chunks(chunks)
+        response.headers.pop("Content-Length", None)
+    else:
+        data = response.get_data()
+        if len(data) < MIN_COMPRESS_SIZE:
+            return response
+        if encoding == "br":
+            response.set_data(brotli.compress(data, quality=BROTLI_QUALITY))
+        else:
+            response.set_data(gzip.compress(data, GZIP_LEVEL))
+    response.headers["Content-Encoding"] = encoding
+    return response
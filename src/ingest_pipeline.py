@@ -0,0 +1,215 @@
+# Chaîne producteur / consommateur pour l'enregistrement des mesures reçues de l'ESP32
+#
+# Le thread de lecture série dépose les lignes dans une file bornée ; un thread d'écriture
+# la vide par paquets : une transaction SQLite (executemany) et une écriture CSV par paquet.
+
+import csv
+import queue
+import threading
+import time
+import weakref
+
+from database_manager import (
+    DatabaseManager, SENSOR_COLUMNS, GPX_COLUMNS, SENSOR_CONVERTERS, GPX_CONVERTERS, convert_text_column
+)
+from db_connection import get_pool
+from metrics import REGISTRY
+
+# Nombre maximal de lignes en attente avant que le lecteur ne soit ralenti
+DEFAULT_QUEUE_SIZE = 10000
+
+# Un paquet est écrit dès qu'il atteint FLUSH_SIZE lignes ou que FLUSH_INTERVAL secondes se sont écoulées
+DEFAULT_FLUSH_SIZE = 500
+DEFAULT_FLUSH_INTERVAL = 0.5
+
+_STOP = object()
+
+# Chaînes en cours d'exécution (profondeur de file exposée dans les métriques)
+_active_writers = weakref.WeakSet()
+
+ROWS_WRITTEN = REGISTRY.counter("proadapt_ingest_rows_written_total", "Lignes reçues écrites en base")
+ROWS_DROPPED = REGISTRY.counter(
+    "proadapt_ingest_dropped_rows_total", "Lignes reçues perdues (paquet dont l'écriture a échoué)"
+)
+# Une valeur mal formée n'écarte pas la ligne ni son paquet : elle est enregistrée comme NULL
+# et comptée dans proadapt_malformed_values_total (voir database_manager.to_real)
+BATCHES_WRITTEN = REGISTRY.counter("proadapt_ingest_batches_total", "Paquets de lignes écrits en base")
+FLUSH_DURATION = REGISTRY.histogram(
+    "proadapt_ingest_flush_duration_seconds", "Durée d'écriture d'un paquet (CSV et transaction SQLite)"
+)
+BLOCKED_SECONDS = REGISTRY.counter(
+    "proadapt_ingest_blocked_seconds_total", "Temps d'attente du lecteur quand la file d'écriture est pleine"
+)
+QUEUE_DEPTH = REGISTRY.gauge("proadapt_ingest_queue_depth", "Lignes en attente d'écriture")
+QUEUE_DEPTH.set_function(lambda: sum(writer.queue.qsize() for writer in list(_active_writers)))
+
+
+class IngestWriter:
+    def __init__(self, db_name, csv_file, headers, queue_size=DEFAULT_QUEUE_SIZE,
+                 flush_size=DEFAULT_FLUSH_SIZE, flush_interval=DEFAULT_FLUSH_INTERVAL, csv_delimiter=',',
+                 extra_columns=()):
+        """
+        :param db_name: Base SQLite (tables 'sensor_data' et 'gpx_data')
+        :param csv_file: Fichier CSV de sauvegarde (None pour ne pas écrire de CSV)
+        :param headers: Noms des champs d'une ligne reçue
+        :param queue_size: Taille de la file entre lecteur et écrivain
+        :param flush_size: Nombre de lignes par transaction
+        :param flush_interval: Délai maximal (s) avant d'écrire un paquet incomplet
+        :param extra_columns: Champs texte ajoutés aux deux tables (ex. 'device_id'), présents dans `headers`
+        """
+        self.db_name = db_name
+        self.csv_file = csv_file
+        self.headers = headers
+        self.flush_size = flush_size
+        self.flush_interval = flush_interval
+        self.csv_delimiter = csv_delimiter
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.db_manager = DatabaseManager(db_name)
+        extra_columns = list(extra_columns)
+        self.sensor_columns = SENSOR_COLUMNS + extra_columns
+        self.gpx_columns = GPX_COLUMNS + extra_columns
+        self.sensor_converters = SENSOR_CONVERTERS + [convert_text_column] * len(extra_columns)
+        self.gpx_converters = GPX_CONVERTERS + [convert_text_column] * len(extra_columns)
+        self.sensor_indexes = DatabaseManager.column_indexes(headers, self.sensor_columns)
+        self.gpx_indexes = DatabaseManager.column_indexes(headers, self.gpx_columns)
+        self._thread = None
+        self._stats_lock = threading.Lock()
+        self._stats = {
+            "rows_received": 0,
+            "rows_written": 0,
+            "batches_written": 0,
+            "write_errors": 0,
+            "blocked_puts": 0,
+            "blocked_seconds": 0.0,
+            "max_queue_depth": 0,
+        }
+
+    def start(self):
+        """
+        Démarre le thread d'écriture.
+        """
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._run, name="ingest-writer", daemon=True)
+        self._thread.start()
+        _active_writers.add(self)
+
+    def try_put(self, row):
+        """
+        Ajoute une ligne sans attendre. Retourne False si la file est pleine
+        (l'appelant asynchrone peut alors attendre avec `put` dans un thread).
+        """
+        try:
+            self.queue.put_nowait(row)
+        except queue.Full:
+            return False
+        self._count_received()
+        return True
+
+    def put(self, row):
+        """
+        Ajoute une ligne reçue. Si la file est pleine, le lecteur attend (contre-pression)
+        et l'attente est comptabilisée dans les statistiques.
+        """
+        try:
+            self.queue.put_nowait(row)
+        except queue.Full:
+            started = time.perf_counter()
+            self.queue.put(row)
+            blocked = time.perf_counter() - started
+            BLOCKED_SECONDS.inc(blocked)
+            with self._stats_lock:
+                self._stats["blocked_puts"] += 1
+                self._stats["blocked_seconds"] += blocked
+        self._count_received()
+
+    def _count_received(self):
+        depth = self.queue.qsize()
+        with self._stats_lock:
+            self._stats["rows_received"] += 1
+            if depth > self._stats["max_queue_depth"]:
+                self._stats["max_queue_depth"] = depth
+
+    def stop(self):
+        """
+        Écrit les lignes restantes puis arrête le thread d'écriture.
+        """
+        if self._thread is None:
+            return
+        self.queue.put(_STOP)
+        self._thread.join()
+        self._thread = None
+        _active_writers.discard(self)
+        REGISTRY.publish(force=True)
+
+    def stats(self):
+        """
+        Statistiques de la chaîne (lignes reçues / écrites, attente du lecteur, profondeur de file).
+        """
+        with self._stats_lock:
+            stats = dict(self._stats)
+        stats["queue_depth"] = self.queue.qsize()
+        return stats
+
+    def _run(self):
+        csv_handle = open(self.csv_file, mode='a', newline='') if self.csv_file else None
+        csv_writer = csv.writer(csv_handle, delimiter=self.csv_delimiter) if csv_handle else None
+        batch = []
+        deadline = time.monotonic() + self.flush_interval
+        try:
+            while True:
+                timeout = max(0.0, deadline - time.monotonic())
+                try:
+                    item = self.queue.get(timeout=timeout)
+                except queue.Empty:
+                    item = None
+
+                if item is _STOP:
+                    break
+                if item is not None:
+                    batch.append(item)
+
+                if len(batch) >= self.flush_size or (batch and time.monotonic() >= deadline):
+                    self._flush(batch, csv_handle, csv_writer)
+                    batch = []
+                if time.monotonic() >= deadline:
+                    deadline = time.monotonic() + self.flush_interval
+        finally:
+            if batch:
+                self._flush(batch, csv_handle, csv_writer)
+            if csv_handle:
+                csv_handle.close()
+
+    def _flush(self, batch, csv_handle, csv_writer):
+        """
+        Écrit un paquet : CSV (un seul writerows) puis une transaction SQLite pour les deux tables.
+        """
+        started = time.perf_counter()
+        try:
+            if csv_writer:
+                csv_writer.writerows(batch)
+                csv_handle.flush()
+
+            columns = DatabaseManager.transpose(batch, len(self.headers))
+            with get_pool(self.db_name).transaction() as connection:
+                cursor = connection.cursor()
+                self.db_manager.insert_columns(
+                    cursor, 'sensor_data', self.sensor_columns, columns, self.sensor_indexes, self.sensor_converters
+                )
+                self.db_manager.insert_columns(
+                    cursor, 'gpx_data', self.gpx_columns, columns, self.gpx_indexes, self.gpx_converters
+                )
+        except Exception as e:
+            print(f"Erreur lors de l'écriture d'un paquet de {len(batch)} lignes : {e}")
+            ROWS_DROPPED.inc(len(batch))
+            with self._stats_lock:
+                self._stats["write_errors"] += 1
+            return
+
+        FLUSH_DURATION.observe(time.perf_counter() - started)
+        ROWS_WRITTEN.inc(len(batch))
+        BATCHES_WRITTEN.inc()
+        REGISTRY.publish()
+        with self._stats_lock:
+            self._stats["rows_written"] += len(batch)
+            self._stats["batches_written"] += 1
@@ -0,0 +1,211 @@
+# Mesures des requêtes HTTP (durée, statut, octets et lignes envoyés) et profilage à la demande
+#
+# `instrument_app(app)` enveloppe l'application WSGI : la durée d'une requête court jusqu'à la
+# fin de l'envoi de la réponse, ce qui compte aussi les réponses en flux. La route (règle Flask,
+# ex. /api/sessions/<int:session_id>) sert d'étiquette, pas l'URL : le nombre de séries reste borné.
+#
+# Profilage (cProfile) d'une requête, selon le réglage `profiling` (PROADAPT_PROFILING) :
+#   - "off" : jamais (par défaut)
+#   - "header" : requêtes envoyées avec l'en-tête `X-Profile: 1`
+#   - un nombre entre 0 et 1 : cette proportion des requêtes, tirées au hasard, et celles avec l'en-tête
+# Le profil est enregistré dans PROFILE_DIRECTORY (fichier .prof, lisible avec pstats ou snakeviz)
+# et son nom est renvoyé dans l'en-tête `X-Profile-File`. Une seule requête est profilée à la fois.
+
+import cProfile
+import os
+import random
+import re
+import threading
+import time
+from datetime import datetime
+
+from flask import has_request_context, request
+
+from metrics import LATENCY_BUCKETS, REGISTRY, ROW_BUCKETS, SIZE_BUCKETS
+
+# Dossier des profils (variable d'environnement PROADAPT_PROFILE_DIR)
+PROFILE_DIRECTORY = os.environ.get("PROADAPT_PROFILE_DIR", "profiles")
+
+# Nombre de profils gardés (les plus anciens sont supprimés)
+MAX_PROFILES = 200
+
+PROFILE_HEADER = "HTTP_X_PROFILE"
+
+ROUTE_KEY = "proadapt.route"
+ROWS_KEY = "proadapt.rows"
+
+REQUESTS = REGISTRY.counter(
+    "proadapt_http_requests_total", "Requêtes HTTP traitées", ("method", "route", "status")
+)
+REQUEST_DURATION = REGISTRY.histogram(
+    "proadapt_http_request_duration_seconds", "Durée des requêtes HTTP, envoi de la réponse compris",
+    ("method", "route"), LATENCY_BUCKETS
+)
+RESPONSE_BYTES = REGISTRY.histogram(
+    "proadapt_http_response_bytes", "Taille des réponses HTTP (après compression)", ("route",), SIZE_BUCKETS
+)
+RESPONSE_ROWS = REGISTRY.histogram(
+    "proadapt_http_response_rows", "Lignes de mesures renvoyées par les routes de lecture", ("route",), ROW_BUCKETS
+)
+IN_PROGRESS = REGISTRY.gauge("proadapt_http_requests_in_progress", "Requêtes HTTP en cours")
+PROFILED = REGISTRY.counter("proadapt_http_profiled_requests_total", "Requêtes HTTP profilées", ("route",))
+
+
+def count_rows(records):
+    """
+    Compte les enregistrements d'une réponse en flux au fil de l'envoi (à appeler pendant la requête).
+    """
+    if not has_request_context():
+        return records
+    counter = request.environ.setdefault(ROWS_KEY, [0])
+    return _counted(records, counter)
+
+
+def _counted(records, counter):
+    for record in records:
+        counter[0] += 1
+        yield record
+
+
+def record_rows(row_count):
+    """
+    Nombre de lignes d'une réponse construite d'un bloc (réponse binaire, tableau JSON...).
+    """
+    if has_request_context():
+        request.environ[ROWS_KEY] = [row_count]
+
+
+def parse_profiling(value):
+    """
+    Réglage du profilage : "off", "header" ou une proportion de requêtes (float entre 0 et 1).
+    """
+    value = (value or "off").strip().lower()
+    if value in ("off", "0", "false"):
+        return "off"
+    if value == "header":
+        return "header"
+    rate = float(value)
+    if not 0 < rate <= 1:
+        raise ValueError(f"Proportion de requêtes profilées invalide : {value}")
+    return rate
+
+
+class _InstrumentedBody:
+    """
+    Corps de réponse qui compte les octets envoyés et enregistre les mesures à la fermeture.
+    """
+
+    def __init__(self, iterable, on_close):
+        self._iterable = iterable
+        self._on_close = on_close
+        self.bytes_sent = 0
+
+    def __iter__(self):
+        for chunk in self._iterable:
+            self.bytes_sent += len(chunk)
+            yield chunk
+
+    def close(self):
+        try:
+            if hasattr(self._iterable, "close"):
+                self._iterable.close()
+        finally:
+            self._on_close(self.bytes_sent)
+
+
+class InstrumentationMiddleware:
+    def __init__(self, wsgi_app, profiling="off", profile_directory=PROFILE_DIRECTORY):
+        self.wsgi_app = wsgi_app
+        self.profiling = profiling
+        self.profile_directory = profile_directory
+        self._profile_lock = threading.Lock()
+        self._profile_count = 0
+
+    def _wants_profile(self, environ):
+        if self.profiling == "off":
+            return False
+        if environ.get(PROFILE_HEADER) == "1":
+            return True
+        return self.profiling != "header" and random.random() < self.profiling
+
+    def _profile_path(self, route):
+        self._profile_count += 1
+        slug = re.sub(r"[^A-Za-z0-9]+", "-", route).strip("-") or "racine"
+        stamp = datetime.now().strftime("%Y%m%d-%H%M%S")
+        return os.path.join(self.profile_directory, f"{stamp}-{os.getpid()}-{self._profile_count}-{slug}.prof")
+
+    def _save_profile(self, profiler, path):
+        try:
+            os.makedirs(self.profile_directory, exist_ok=True)
+            profiler.dump_stats(path)
+            profiles = sorted(
+                (entry for entry in os.scandir(self.profile_directory) if entry.name.endswith(".prof")),
+                key=lambda entry: entry.stat().st_mtime,
+            )
+            for entry in profiles[:-MAX_PROFILES]:
+                os.remove(entry.path)
+        except OSError as e:
+            print(f"Impossible d'enregistrer le profil {path} : {e}")
+
+    def __call__(self, environ, start_response):
+        started = time.perf_counter()
+        method = environ.get("REQUEST_METHOD", "GET")
+        profiler = None
+        if self._wants_profile(environ) and self._profile_lock.acquire(blocking=False):
+            profiler = cProfile.Profile()
+        state = {"status": "500", "profile_path": None, "content_length": None}
+
+        def capture(status, headers, exc_info=None):
+            state["status"] = status.split(" ", 1)[0]
+            for name, value in headers:
+                if name.lower() == "content-length":
+                    state["content_length"] = int(value)
+            if profiler is not None:
+                state["profile_path"] = self._profile_path(environ.get(ROUTE_KEY, "inconnue"))
+                headers.append(("X-Profile-File", os.path.basename(state["profile_path"])))
+            return start_response(status, headers, exc_info)
+
+        def finish(bytes_sent):
+            route = environ.get(ROUTE_KEY, "inconnue")
+            REQUESTS.inc(method=method, route=route, status=state["status"])
+            REQUEST_DURATION.observe(time.perf_counter() - started, method=method, route=route)
+            RESPONSE_BYTES.observe(bytes_sent, route=route)
+            rows = environ.get(ROWS_KEY)
+            if rows is not None:
+                RESPONSE_ROWS.observe(rows[0], route=route)
+            IN_PROGRESS.dec()
+            if profiler is not None:
+                profiler.disable()
+                if state["profile_path"]:
+                    self._save_profile(profiler, state["profile_path"])
+                    PROFILED.inc(route=route)
+                self._profile_lock.release()
+            REGISTRY.publish()
+
+        IN_PROGRESS.inc()
+        if profiler is not None:
+            profiler.enable()
+        try:
+            iterable = self.wsgi_app(environ, capture)
+        except BaseException:
+            finish(0)
+            raise
+
+        file_wrapper = environ.get("wsgi.file_wrapper")
+        if file_wrapper is not None and isinstance(file_wrapper, type) and isinstance(iterable, file_wrapper):
+            # Fichier envoyé directement par le serveur (sendfile) : on ne l'enveloppe pas
+            finish(state["content_length"] or 0)
+            return iterable
+        return _InstrumentedBody(iterable, finish)
+
+
+def instrument_app(app, profiling="off", profile_directory=PROFILE_DIRECTORY):
+    """
+    Ajoute les mesures HTTP (et le profilage à la demande) à une application Flask.
+    """
+    @app.before_request
+    def label_route():
+        request.environ[ROUTE_KEY] = request.url_rule.rule if request.url_rule else "inconnue"
+
+    app.wsgi_app = InstrumentationMiddleware(app.wsgi_app, profiling, profile_directory)
+    return app
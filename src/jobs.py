@@ -0,0 +1,402 @@
+# Exécution des traitements lourds (chargement CSV, analyse GPX...) hors des requêtes Flask
+#
+# Les routes soumettent une tâche et répondent tout de suite avec l'identifiant du travail ;
+# le client suit son avancement sur /api/jobs/<id>. Les tâches tournent dans un pool de
+# processus (démarrés en 'spawn' : ils n'héritent pas des connexions SQLite du serveur).
+# Deux soumissions identiques (même clé) pendant qu'un travail est en attente ou en cours
+# partagent ce travail au lieu de le lancer deux fois.
+# Avec une base (`db_name`, la base d'état du serveur, voir db_connection.state_database), l'état des
+# travaux est aussi enregistré dans la table 'jobs' :
+# le statut est consultable et les doublons détectés depuis n'importe quel processus du
+# serveur de production (voir serving.py), chaque processus gardant son propre pool.
+
+import atexit
+import json
+import multiprocessing
+import os
+import queue
+import sqlite3
+import threading
+import time
+import traceback
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from db_connection import get_pool
+
+# Nombre de processus de travail (tâches exécutées en parallèle)
+DEFAULT_MAX_WORKERS = min(4, os.cpu_count() or 1)
+
+# Nombre maximal de travaux en attente ou en cours ; au-delà les soumissions sont refusées
+DEFAULT_MAX_PENDING = 16
+
+# Nombre de travaux terminés dont le statut reste consultable
+JOB_HISTORY = 200
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+
+class JobQueueFull(Exception):
+    pass
+
+
+class JobError(Exception):
+    """
+    Erreur d'une tâche, transmise au serveur sous forme de message : l'exception d'origine
+    n'est pas forcément sérialisable et casserait le pool.
+    """
+    pass
+
+
+# --- Côté processus de travail -------------------------------------------------------------
+
+_events = None
+_current_job_id = None
+
+
+def _init_worker(events):
+    global _events
+    _events = events
+
+
+def report_progress(**progress):
+    """
+    Publie l'avancement du travail en cours (à appeler depuis une tâche).
+    Sans effet quand la tâche est exécutée directement, hors du pool.
+    """
+    if _events is not None and _current_job_id is not None:
+        _events.put((_current_job_id, RUNNING, progress))
+
+
+def _run_job(job_id, function, args, kwargs):
+    global _current_job_id
+    _current_job_id = job_id
+    _events.put((job_id, RUNNING, None))
+    try:
+        return function(*args, **kwargs)
+    except Exception as e:
+        traceback.print_exc()
+        raise JobError(str(e) or e.__class__.__name__) from None
+    finally:
+        _current_job_id = None
+
+
+# --- Côté serveur --------------------------------------------------------------------------
+
+class Job:
+    def __init__(self, kind, key):
+        self.id = uuid.uuid4().hex
+        self.kind = kind
+        self.key = key
+        self.status = QUEUED
+        self.progress = {}
+        self.result = None
+        self.error = None
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+
+    @property
+    def finished(self):
+        return self.status in (DONE, FAILED)
+
+    @classmethod
+    def from_record(cls, record):
+        """
+        Travail lu dans la table 'jobs' (soumis par un autre processus).
+        """
+        job = cls(record["kind"], None)
+        for name, value in record.items():
+            if name != "key":
+                setattr(job, name, value)
+        return job
+
+    def as_dict(self):
+        return {
+            "id": self.id,
+            "kind": self.kind,
+            "status": self.status,
+            "progress": self.progress,
+            "result": self.result,
+            "error": self.error,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+        }
+
+
+def _process_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class JobStore:
+    FIELDS = ["id", "kind", "status", "progress", "result", "error", "created_at", "started_at", "finished_at"]
+
+    def __init__(self, db_name):
+        self.db_name = db_name
+        self._initialize_database()
+
+    def _initialize_database(self):
+        """
+        Crée la table des travaux. L'index unique partiel interdit deux travaux actifs de même clé.
+        """
+        with get_pool(self.db_name).transaction() as connection:
+            connection.execute('''
+                CREATE TABLE IF NOT EXISTS jobs (
+                    id TEXT PRIMARY KEY,
+                    kind TEXT NOT NULL,
+                    job_key TEXT,
+                    owner INTEGER NOT NULL,
+                    status TEXT NOT NULL,
+                    progress TEXT,
+                    result TEXT,
+                    error TEXT,
+                    created_at REAL,
+                    started_at REAL,
+                    finished_at REAL
+                )
+            ''')
+            connection.execute(
+                "CREATE UNIQUE INDEX IF NOT EXISTS idx_jobs_active_key ON jobs (job_key) "
+                f"WHERE status IN ('{QUEUED}', '{RUNNING}')"
+            )
+
+    @staticmethod
+    def encode_key(key):
+        return json.dumps(key, default=str) if key is not None else None
+
+    def claim(self, job):
+        """
+        Enregistre un nouveau travail, sauf si un travail actif a déjà la même clé.
+
+        :return: None si le travail est enregistré, sinon le travail actif existant (dictionnaire)
+        """
+        job_key = self.encode_key(job.key)
+        self.reap(job_key)
+        try:
+            with get_pool(self.db_name).transaction() as connection:
+                connection.execute(
+                    "INSERT INTO jobs (id, kind, job_key, owner, status, progress, created_at) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (job.id, job.kind, job_key, os.getpid(), job.status, json.dumps(job.progress), job.created_at)
+                )
+            return None
+        except sqlite3.IntegrityError:
+            return self.load(key=job_key)
+
+    def reap(self, job_key=None):
+        """
+        Marque en échec les travaux actifs dont le processus propriétaire n'existe plus.
+        """
+        query = f"SELECT id, owner FROM jobs WHERE status IN ('{QUEUED}', '{RUNNING}')"
+        params = ()
+        if job_key is not None:
+            query += " AND job_key = ?"
+            params = (job_key,)
+        with get_pool(self.db_name).connection() as connection:
+            rows = connection.execute(query, params).fetchall()
+        dead = [(FAILED, "Processus du serveur arrêté.", time.time(), job_id)
+                for job_id, owner in rows if not _process_alive(owner)]
+        if dead:
+            with get_pool(self.db_name).transaction() as connection:
+                connection.executemany(
+                    "UPDATE jobs SET status = ?, error = ?, finished_at = ? WHERE id = ?", dead
+                )
+
+    def save(self, job):
+        """
+        :param job: État du travail (Job.as_dict) ; un travail terminé n'est plus modifié
+        """
+        with get_pool(self.db_name).transaction() as connection:
+            connection.execute(
+                "UPDATE jobs SET status = ?, progress = ?, result = ?, error = ?, started_at = ?, finished_at = ? "
+                f"WHERE id = ? AND status NOT IN ('{DONE}', '{FAILED}')",
+                (job["status"], json.dumps(job["progress"]), json.dumps(job["result"], default=str), job["error"],
+                 job["started_at"], job["finished_at"], job["id"])
+            )
+
+    def load(self, job_id=None, key=None):
+        """
+        Travail par identifiant, ou travail actif par clé (None si absent).
+        """
+        fields = ', '.join(self.FIELDS)
+        with get_pool(self.db_name).connection() as connection:
+            if job_id is not None:
+                row = connection.execute(f"SELECT {fields} FROM jobs WHERE id = ?", (job_id,)).fetchone()
+            else:
+                row = connection.execute(
+                    f"SELECT {fields} FROM jobs WHERE job_key = ? AND status IN ('{QUEUED}', '{RUNNING}')", (key,)
+                ).fetchone()
+        if row is None:
+            return None
+        record = dict(zip(self.FIELDS, row))
+        record["progress"] = json.loads(record["progress"]) if record["progress"] else {}
+        record["result"] = json.loads(record["result"]) if record["result"] else None
+        return record
+
+    def forget_old_jobs(self, history=JOB_HISTORY):
+        with get_pool(self.db_name).transaction() as connection:
+            connection.execute(
+                f"DELETE FROM jobs WHERE status IN ('{DONE}', '{FAILED}') AND id NOT IN ("
+                f"SELECT id FROM jobs WHERE status IN ('{DONE}', '{FAILED}') ORDER BY finished_at DESC LIMIT ?)",
+                (history,)
+            )
+
+
+class JobManager:
+    def __init__(self, max_workers=DEFAULT_MAX_WORKERS, max_pending=DEFAULT_MAX_PENDING, db_name=None):
+        """
+        :param db_name: Base où enregistrer l'état des travaux (partagé entre les processus du serveur) ;
+                        None : état gardé en mémoire seulement
+        """
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self._store = JobStore(db_name) if db_name else None
+        self._context = multiprocessing.get_context("spawn")
+        self._executor = None
+        self._events = None
+        self._listener = None
+        self._lock = threading.Lock()
+        self._jobs = OrderedDict()
+        self._active = {}  # clé -> travail en attente ou en cours
+        self._broken = False
+        atexit.register(self.shutdown)
+
+    def _start(self):
+        """
+        Démarre le pool au premier travail soumis (ou après la perte d'un processus de travail).
+        """
+        if self._broken:
+            self._broken = False
+            self._stop(wait=False)
+        if self._executor is not None:
+            return
+        self._events = self._context.Queue()
+        self._executor = ProcessPoolExecutor(
+            max_workers=self.max_workers, mp_context=self._context,
+            initializer=_init_worker, initargs=(self._events,)
+        )
+        self._listener = threading.Thread(target=self._listen, name="job-events", daemon=True)
+        self._listener.start()
+
+    def submit(self, kind, function, *args, key=None, **kwargs):
+        """
+        Soumet une tâche (fonction importable, arguments sérialisables) au pool.
+
+        :param key: Identité de la tâche ; si un travail de même clé est en attente ou en cours,
+                    il est retourné au lieu d'en lancer un nouveau
+        :return: (travail, nouveau)
+        :raises JobQueueFull: trop de travaux en attente
+        """
+        key = (kind, key) if key is not None else None
+        with self._lock:
+            if key is not None and key in self._active:
+                return self._active[key], False
+            if sum(1 for job in self._jobs.values() if not job.finished) >= self.max_pending:
+                raise JobQueueFull("Trop de traitements en cours, réessayez plus tard.")
+
+            job = Job(kind, key)
+            if self._store is not None:
+                existing = self._store.claim(job)
+                if existing is not None:
+                    return Job.from_record(existing), False
+            self._start()
+            self._jobs[job.id] = job
+            if key is not None:
+                self._active[key] = job
+            self._forget_old_jobs()
+
+        future = self._executor.submit(_run_job, job.id, function, args, kwargs)
+        future.add_done_callback(lambda future: self._finish(job, future))
+        return job, True
+
+    def get(self, job_id):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is not None:
+                return job.as_dict()
+        if self._store is not None:
+            # Travail soumis par un autre processus du serveur
+            return self._store.load(job_id)
+        return None
+
+    def _save(self, job):
+        if self._store is None:
+            return
+        with self._lock:
+            state = job.as_dict()
+            state["progress"] = dict(state["progress"])
+        try:
+            self._store.save(state)
+        except sqlite3.Error as e:
+            print(f"Impossible d'enregistrer l'état du traitement {job.id} : {e}")
+
+    def _finish(self, job, future):
+        with self._lock:
+            try:
+                job.result = future.result()
+                job.status = DONE
+            except Exception as e:
+                job.error = str(e) or e.__class__.__name__
+                job.status = FAILED
+                print(f"Échec du traitement {job.kind} ({job.id}) : {job.error}")
+                if isinstance(e, BrokenProcessPool):
+                    # Processus de travail tué : le pool sera recréé à la prochaine soumission
+                    self._broken = True
+            job.finished_at = time.time()
+            if job.key is not None and self._active.get(job.key) is job:
+                del self._active[job.key]
+        self._save(job)
+        if self._store is not None:
+            self._store.forget_old_jobs()
+
+    def _listen(self):
+        """
+        Reçoit les événements des processus de travail (démarrage, avancement).
+        """
+        while True:
+            try:
+                job_id, status, progress = self._events.get()
+            except (EOFError, OSError, queue.Empty):
+                return
+            if job_id is None:
+                return
+            with self._lock:
+                job = self._jobs.get(job_id)
+                if job is None or job.finished:
+                    continue
+                if job.status == QUEUED:
+                    job.status = RUNNING
+                    job.started_at = time.time()
+                if progress:
+                    job.progress.update(progress)
+            self._save(job)
+
+    def _forget_old_jobs(self):
+        finished = [job_id for job_id, job in self._jobs.items() if job.finished]
+        for job_id in finished[:max(0, len(finished) - JOB_HISTORY)]:
+            del self._jobs[job_id]
+
+    def _stop(self, wait):
+        if self._executor is None:
+            return
+        self._executor.shutdown(wait=wait)
+        self._events.put((None, None, None))
+        if wait and self._listener is not threading.current_thread():
+            self._listener.join(timeout=5)
+        self._executor = None
+
+    def shutdown(self, wait=True):
+        # Sans le verrou : l'arrêt attend la fin des travaux, dont les rappels le prennent
+        self._stop(wait)
@@ -1,16 +1,29 @@
 import logging
-from multiprocessing import Process
+import signal
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.request
 from database_manager import DatabaseManager
+from serving import GRACEFUL_TIMEOUT
 from tools import find_free_port
 import os
-import subprocess
+
+# Délai (s) accordé au serveur Flask pour répondre sur /api/health au démarrage
+READY_TIMEOUT = 60
+
+# Redémarrages automatiques du serveur Flask autorisés en cas d'arrêt inattendu
+MAX_SERVER_RESTARTS = 5
 
 class Application:
-    def __init__(self, db_name="sensor_data.db"):
+    def __init__(self, db_name="sensor_data.db", debug=False):
         self.db_name = db_name
+        self.debug = debug or os.environ.get("PROADAPT_DEBUG") == "1"
         self.csv_file_path = "./data/GPS_OK.csv"
         self.server_port = find_free_port()
         self.vue_port = 5173  # Port par défaut pour Vue.js
+        self._stopping = False
 
     def setup_logging(self):
         logging.basicConfig(
@@ -27,44 +40,112 @@ class Application:
         #db_manager.load_csv_to_db(csv_file_path=self.csv_file_path)
 
     def start_server(self):
+        """
+        Lance server.py (serveur de production, ou de développement avec --debug).
+        Les processus enfants ont leur propre groupe : Ctrl+C n'arrive qu'ici, et l'arrêt
+        leur est transmis avec SIGTERM (arrêt progressif de gunicorn).
+        """
         self.logger.info(f"Starting Flask server on port {self.server_port}...")
         os.environ["FLASK_RUN_PORT"] = str(self.server_port)
-        os.system("python3 server.py")
+        command = [sys.executable, "server.py", "--port", str(self.server_port)]
+        if self.debug:
+            command.append("--debug")
+        return subprocess.Popen(command, start_new_session=True)
+
+    def wait_until_ready(self, process, timeout=READY_TIMEOUT):
+        """
+        Attend que le serveur réponde sur /api/health (False s'il s'arrête ou ne répond pas à temps).
+        """
+        url = f"http://127.0.0.1:{self.server_port}/api/health"
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline and not self._stopping:
+            if process.poll() is not None:
+                return False
+            try:
+                with urllib.request.urlopen(url, timeout=2) as response:
+                    if response.status == 200:
+                        return True
+            except (urllib.error.URLError, ConnectionError, TimeoutError):
+                pass
+            time.sleep(0.25)
+        return False
 
     def start_vue(self):
         self.logger.info(f"Starting Vue.js dev server on port {self.vue_port}...")
         os.environ["VUE_DEV_PORT"] = str(self.vue_port)
-        subprocess.run(["npm", "run", "dev"], cwd="./", check=True)
+        return subprocess.Popen(["npm", "run", "dev"], cwd="./", start_new_session=True)
+
+    def stop_process(self, process, name, timeout=GRACEFUL_TIMEOUT + 5):
+        """
+        Demande l'arrêt d'un processus (SIGTERM) et le tue s'il ne s'est pas arrêté à temps.
+        """
+        if process is None or process.poll() is not None:
+            return
+        self.logger.info(f"Stopping {name} (PID {process.pid})...")
+        process.terminate()
+        try:
+            process.wait(timeout=timeout)
+        except subprocess.TimeoutExpired:
+            self.logger.warning(f"{name} did not stop within {timeout}s, killing it.")
+            process.kill()
+            process.wait()
+
+    def _request_stop(self, signum, frame):
+        self._stopping = True
 
     def run(self):
         self.setup_logging()
         self.logger.info("Starting the ProAdapt application...")
+        signal.signal(signal.SIGTERM, self._request_stop)
+        signal.signal(signal.SIGINT, self._request_stop)
 
+        server_process = None
+        vue_process = None
         try:
             self.initialize_database()
 
-            # Démarrer le serveur Flask dans un processus séparé
-            server_process = Process(target=self.start_server)
-            server_process.start()
+            server_process = self.start_server()
             self.logger.info(f"Server process started with PID {server_process.pid}")
+            if not self.wait_until_ready(server_process):
+                if not self._stopping:
+                    self.logger.error("Flask server did not become ready.")
+                return
+            self.logger.info(f"Flask server ready on http://127.0.0.1:{self.server_port}")
 
-            # Démarrer le serveur Vue.js dans un autre processus séparé
-            vue_process = Process(target=self.start_vue)
-            vue_process.start()
+            vue_process = self.start_vue()
             self.logger.info(f"Vue.js dev server started with PID {vue_process.pid}")
 
-            # Attendre que les processus se terminent
-            server_process.join()
-            vue_process.join()
+            # Surveillance : redémarrer le serveur Flask s'il s'arrête de lui-même
+            restarts = 0
+            while not self._stopping:
+                if server_process.poll() is not None:
+                    if restarts >= MAX_SERVER_RESTARTS:
+                        self.logger.error("Flask server keeps stopping, giving up.")
+                        break
+                    restarts += 1
+                    self.logger.warning(
+                        f"Flask server exited with code {server_process.returncode}, restarting ({restarts}/{MAX_SERVER_RESTARTS})..."
+                    )
+                    time.sleep(min(2 ** restarts, 30))
+                    server_process = self.start_server()
+                    if self.wait_until_ready(server_process):
+                        self.logger.info("Flask server ready again.")
+                if vue_process.poll() is not None:
+                    self.logger.info("Vue.js dev server stopped.")
+                    break
+                time.sleep(1)
+
+            if self._stopping:
+                self.logger.info("Application interrupted. Shutting down gracefully...")
 
-        except KeyboardInterrupt:
-            self.logger.info("Application interrupted. Shutting down gracefully...")
         except Exception as e:
             self.logger.error(f"Unexpected error: {e}")
         finally:
+            self.stop_process(vue_process, "Vue.js dev server", timeout=10)
+            self.stop_process(server_process, "Flask server")
             self.logger.info("ProAdapt application stopped.")
 
 
 if __name__ == "__main__":
-    app = Application()
+    app = Application(debug="--debug" in sys.argv)
     app.run()
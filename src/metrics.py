@@ -0,0 +1,323 @@
+# Métriques du serveur et de l'enregistrement des mesures, au format texte de Prometheus
+#
+# Trois types : compteur (Counter), jauge (Gauge) et histogramme (Histogram), avec étiquettes.
+# Les métriques sont déclarées au niveau des modules instrumentés (db_connection.py,
+# ingest_pipeline.py, instrumentation.py...) et enregistrées dans REGISTRY ; /api/metrics
+# renvoie REGISTRY.exposition().
+#
+# Plusieurs processus (workers gunicorn, récepteur Bluetooth lancé à part) : si la variable
+# d'environnement PROADAPT_METRICS_DIR désigne un dossier, chaque processus y écrit l'état de
+# ses métriques (<pid>.json, au plus une fois par PUBLISH_INTERVAL secondes) et l'exposition
+# additionne les fichiers de tous les processus. Les compteurs et histogrammes des processus
+# terminés restent comptés ; leurs jauges sont ignorées.
+
+import bisect
+import json
+import math
+import os
+import threading
+import time
+
+METRICS_DIRECTORY_ENV = "PROADAPT_METRICS_DIR"
+
+# Intervalle minimal (s) entre deux écritures de l'état d'un processus
+PUBLISH_INTERVAL = 1.0
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Limites des histogrammes (la dernière classe, +Inf, est ajoutée automatiquement)
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+SIZE_BUCKETS = tuple(256 * 4 ** power for power in range(11))  # 256 o .. 256 Mo
+ROW_BUCKETS = (1, 10, 100, 1000, 10000, 100000, 1000000, 10000000)
+
+
+def _format_value(value):
+    if value == math.inf:
+        return "+Inf"
+    if isinstance(value, float) and value.is_integer() and abs(value) < 1e15:
+        return str(int(value))
+    return repr(value)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names, values, extra=None):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} : étiquettes attendues {self.labelnames}, reçues {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def reset(self):
+        with self._lock:
+            self._values.clear()
+
+    def _samples(self):
+        with self._lock:
+            return [[list(key), value] for key, value in self._values.items()]
+
+    def snapshot(self):
+        return {
+            "name": self.name, "type": self.kind, "help": self.documentation,
+            "labelnames": list(self.labelnames), "samples": self._samples(),
+        }
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        with self._lock:
+            return self._values.get(self._key(labels), 0)
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def __init__(self, name, documentation, labelnames=()):
+        super().__init__(name, documentation, labelnames)
+        self._function = None
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+    def set_function(self, function):
+        """
+        Valeur calculée à chaque lecture (jauge sans étiquette), par exemple une taille de file.
+        """
+        self._function = function
+
+    def _samples(self):
+        if self._function is not None:
+            return [[[], self._function()]]
+        return super()._samples()
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                # Effectifs par classe (non cumulés, la dernière est +Inf), somme, nombre
+                state = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            state[0][index] += 1
+            state[1] += value
+            state[2] += 1
+
+    def _samples(self):
+        with self._lock:
+            return [[list(key), [list(state[0]), state[1], state[2]]] for key, state in self._values.items()]
+
+    def snapshot(self):
+        snapshot = super().snapshot()
+        snapshot["buckets"] = list(self.buckets)
+        return snapshot
+
+
+def _process_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def merge_snapshots(snapshots):
+    """
+    Additionne les états de plusieurs processus, métrique par métrique et étiquettes par étiquettes.
+
+    :param snapshots: Listes de métriques (voir MetricsRegistry.snapshot)
+    """
+    merged = {}
+    for snapshot in snapshots:
+        for metric in snapshot:
+            target = merged.get(metric["name"])
+            if target is None:
+                target = merged[metric["name"]] = dict(metric, samples={})
+            elif target["type"] != metric["type"]:
+                continue
+            for labels, value in metric["samples"]:
+                key = tuple(labels)
+                previous = target["samples"].get(key)
+                if previous is None:
+                    target["samples"][key] = value
+                elif metric["type"] == "histogram":
+                    target["samples"][key] = [
+                        [a + b for a, b in zip(previous[0], value[0])], previous[1] + value[1], previous[2] + value[2]
+                    ]
+                else:
+                    target["samples"][key] = previous + value
+    return list(merged.values())
+
+
+def render(metrics):
+    """
+    Format texte de Prometheus (version 0.0.4).
+    """
+    lines = []
+    for metric in metrics:
+        name = metric["name"]
+        lines.append(f"# HELP {name} {_escape(metric['help'])}")
+        lines.append(f"# TYPE {name} {metric['type']}")
+        labelnames = metric["labelnames"]
+        for key, value in sorted(metric["samples"].items()):
+            if metric["type"] == "histogram":
+                counts, total, count = value
+                cumulative = 0
+                for bound, bucket_count in zip(list(metric["buckets"]) + [math.inf], counts):
+                    cumulative += bucket_count
+                    labels = _format_labels(labelnames, key, f'le="{_format_value(float(bound))}"')
+                    lines.append(f"{name}_bucket{labels} {cumulative}")
+                labels = _format_labels(labelnames, key)
+                lines.append(f"{name}_sum{labels} {_format_value(float(total))}")
+                lines.append(f"{name}_count{labels} {count}")
+            else:
+                lines.append(f"{name}{_format_labels(labelnames, key)} {_format_value(value)}")
+    return "\n".join(lines) + "\n"
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+        self._last_publish = 0.0
+
+    def register(self, metric):
+        """
+        Enregistre une métrique ; une métrique de même nom et de même type déjà enregistrée est réutilisée.
+        """
+        with self._lock:
+            existing = self._metrics.get(metric.name)
+            if existing is not None:
+                if type(existing) is not type(metric):
+                    raise ValueError(f"Métrique déjà enregistrée avec un autre type : {metric.name}")
+                return existing
+            self._metrics[metric.name] = metric
+            return metric
+
+    def counter(self, name, documentation, labelnames=()):
+        return self.register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name, documentation, labelnames=()):
+        return self.register(Gauge(name, documentation, labelnames))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def snapshot(self):
+        with self._lock:
+            metrics = list(self._metrics.values())
+        return [metric.snapshot() for metric in metrics]
+
+    def reset(self):
+        """
+        Remet les valeurs à zéro (processus enfant après un fork : il ne recompte pas celles du parent).
+        """
+        self._lock = threading.Lock()
+        self._last_publish = 0.0
+        for metric in self._metrics.values():
+            metric._lock = threading.Lock()
+            metric.reset()
+
+    @staticmethod
+    def directory():
+        return os.environ.get(METRICS_DIRECTORY_ENV) or None
+
+    def publish(self, force=False):
+        """
+        Écrit l'état des métriques du processus dans le dossier partagé (s'il est configuré).
+        """
+        directory = self.directory()
+        if directory is None:
+            return
+        now = time.monotonic()
+        if not force and now - self._last_publish < PUBLISH_INTERVAL:
+            return
+        self._last_publish = now
+
+        path = os.path.join(directory, f"{os.getpid()}.json")
+        temp_path = f"{path}.tmp"
+        try:
+            os.makedirs(directory, exist_ok=True)
+            with open(temp_path, "w") as snapshot_file:
+                json.dump(self.snapshot(), snapshot_file)
+            os.replace(temp_path, path)
+        except OSError as e:
+            print(f"Impossible d'enregistrer les métriques dans {directory} : {e}")
+
+    def _other_processes(self):
+        """
+        États publiés par les autres processus (sans les jauges des processus terminés).
+        """
+        directory = self.directory()
+        if directory is None or not os.path.isdir(directory):
+            return []
+        snapshots = []
+        for file_name in os.listdir(directory):
+            pid_text, extension = os.path.splitext(file_name)
+            if extension != ".json" or not pid_text.isdigit() or int(pid_text) == os.getpid():
+                continue
+            try:
+                with open(os.path.join(directory, file_name)) as snapshot_file:
+                    snapshot = json.load(snapshot_file)
+            except (OSError, ValueError):
+                continue
+            if not _process_alive(int(pid_text)):
+                snapshot = [metric for metric in snapshot if metric["type"] != "gauge"]
+            snapshots.append(snapshot)
+        return snapshots
+
+    def exposition(self):
+        """
+        Texte renvoyé par /api/metrics : ce processus et, si configuré, les autres processus.
+        """
+        self.publish()
+        return render(merge_snapshots([self.snapshot()] + self._other_processes()))
+
+
+REGISTRY = MetricsRegistry()
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=REGISTRY.reset)
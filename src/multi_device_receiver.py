@@ -0,0 +1,181 @@
+# Réception asynchrone (asyncio) depuis plusieurs kits ESP32 en même temps
+#
+# Chaque appareil a son port série, sa poignée de main "18" / "184" / "186" et son identifiant :
+# les lignes sont étiquetées avec `device_id` puis confiées à un unique IngestWriter
+# (une seule transaction SQLite par paquet, tous appareils confondus).
+
+import asyncio
+import os
+import time
+
+import serial
+
+from bluetooth_receiver import HEADERS, MALFORMED_LINES
+from ingest_pipeline import IngestWriter, DEFAULT_QUEUE_SIZE, DEFAULT_FLUSH_SIZE, DEFAULT_FLUSH_INTERVAL
+
+DEVICE_HEADERS = HEADERS + ["device_id"]
+
+# Délai maximal (s) entre l'envoi de "18" et la réception de "184"
+DEFAULT_HANDSHAKE_TIMEOUT = 10.0
+
+# Délai maximal (s) sans aucune ligne reçue pendant la transmission
+DEFAULT_IDLE_TIMEOUT = 30.0
+
+
+class DeviceStats:
+    def __init__(self, device_id, port):
+        self.device_id = device_id
+        self.port = port
+        self.rows = 0
+        self.malformed_lines = 0
+        self.started_at = None
+        self.finished_at = None
+        self.error = None
+
+    def as_dict(self):
+        duration = (self.finished_at or time.perf_counter()) - self.started_at if self.started_at else 0.0
+        return {
+            "device_id": self.device_id,
+            "port": self.port,
+            "rows": self.rows,
+            "malformed_lines": self.malformed_lines,
+            "seconds": duration,
+            "error": self.error,
+        }
+
+
+class MultiDeviceReceiver:
+    def __init__(self, devices, baudrate=9600, db_name="sensor_data.db", csv_file="./data/sensor_data.csv",
+                 queue_size=DEFAULT_QUEUE_SIZE, flush_size=DEFAULT_FLUSH_SIZE, flush_interval=DEFAULT_FLUSH_INTERVAL,
+                 handshake_timeout=DEFAULT_HANDSHAKE_TIMEOUT, idle_timeout=DEFAULT_IDLE_TIMEOUT):
+        """
+        :param devices: Dictionnaire {device_id: port série}
+        :param csv_file: Fichier CSV commun (colonne device_id en plus), None pour ne pas en écrire
+        """
+        self.devices = dict(devices)
+        self.baudrate = baudrate
+        self.db_name = db_name
+        self.csv_file = csv_file
+        self.handshake_timeout = handshake_timeout
+        self.idle_timeout = idle_timeout
+        self.writer = IngestWriter(
+            db_name, csv_file, DEVICE_HEADERS,
+            queue_size=queue_size, flush_size=flush_size, flush_interval=flush_interval,
+            extra_columns=["device_id"]
+        )
+        self.stats = {device_id: DeviceStats(device_id, port) for device_id, port in self.devices.items()}
+
+    def listen(self):
+        """
+        Point d'entrée synchrone : écoute tous les appareils jusqu'à leur "186".
+        """
+        return asyncio.run(self.run())
+
+    async def run(self):
+        """
+        Écoute tous les appareils en parallèle et retourne les statistiques par appareil
+        et celles de l'écriture.
+        """
+        self.writer.start()
+        try:
+            await asyncio.gather(*(self._run_device(device_id, port) for device_id, port in self.devices.items()))
+        finally:
+            await asyncio.to_thread(self.writer.stop)
+
+        return {
+            "devices": [stats.as_dict() for stats in self.stats.values()],
+            "writer": self.writer.stats(),
+        }
+
+    async def _run_device(self, device_id, port):
+        stats = self.stats[device_id]
+        loop = asyncio.get_running_loop()
+        try:
+            serial_connection = serial.Serial(port, self.baudrate, timeout=0)
+        except Exception as e:
+            stats.error = f"Failed to connect: {e}"
+            print(f"[{device_id}] Failed to connect to ESP32 on {port}: {e}")
+            return
+
+        reader = asyncio.StreamReader()
+        fd = serial_connection.fileno()
+
+        def on_readable():
+            try:
+                data = os.read(fd, 65536)
+            except BlockingIOError:
+                return
+            except OSError:
+                data = b""
+            if data:
+                reader.feed_data(data)
+            else:
+                loop.remove_reader(fd)
+                reader.feed_eof()
+
+        loop.add_reader(fd, on_readable)
+        try:
+            serial_connection.write(b'18\n')
+            print(f"[{device_id}] Sent '18' to request data on {port}.")
+            await asyncio.wait_for(self._wait_for_start(reader), self.handshake_timeout)
+            print(f"[{device_id}] Start of data transmission.")
+            stats.started_at = time.perf_counter()
+            await self._receive_rows(device_id, reader, stats)
+            print(f"[{device_id}] End of data transmission.")
+        except asyncio.TimeoutError:
+            stats.error = "Timeout"
+            print(f"[{device_id}] No data received before timeout.")
+        except Exception as e:
+            stats.error = str(e)
+            print(f"[{device_id}] Error: {e}")
+        finally:
+            stats.finished_at = time.perf_counter()
+            loop.remove_reader(fd)
+            serial_connection.close()
+
+    async def _wait_for_start(self, reader):
+        """
+        Ignore tout ce qui précède "184".
+        """
+        while True:
+            line = await reader.readline()
+            if not line:
+                raise ConnectionError("Connexion fermée avant le début de la transmission.")
+            if line.strip() == b"184":
+                return
+
+    async def _receive_rows(self, device_id, reader, stats):
+        field_count = len(HEADERS)
+        while True:
+            line = await asyncio.wait_for(reader.readline(), self.idle_timeout)
+            if not line:
+                break  # Connexion fermée
+            raw_data = line.decode('utf-8', errors='replace').strip()
+            if not raw_data:
+                continue
+            if raw_data == "186":
+                break
+
+            data = raw_data.split(";")
+            if len(data) != field_count:
+                stats.malformed_lines += 1
+                MALFORMED_LINES.inc(receiver="multi_device")
+                continue
+
+            data.append(device_id)
+            if not self.writer.try_put(data):
+                # File pleine : on attend l'écrivain sans bloquer les autres appareils
+                await asyncio.to_thread(self.writer.put, data)
+            stats.rows += 1
+
+
+if __name__ == "__main__":
+    import sys
+
+    # Utilisation : python multi_device_receiver.py kit1=/dev/tty.ESP32R kit2=/dev/tty.ESP32L
+    devices = dict(argument.split("=", 1) for argument in sys.argv[1:])
+    if not devices:
+        print("Usage: python multi_device_receiver.py <device_id>=<port> [...]")
+        sys.exit(1)
+    results = MultiDeviceReceiver(devices).listen()
+    print(results)
@@ -0,0 +1,245 @@
+# Orientation de chaque prothèse (roulis / tangage) par fusion accéléromètre + gyroscope (NumPy)
+#
+# Filtre complémentaire, calculé sur toute une session à la fois : pour chaque jambe, l'angle
+# intégré à partir du gyroscope (précis à court terme, mais qui dérive) est corrigé en continu
+# par l'angle de la gravité mesuré par l'accéléromètre (bruité, mais sans dérive) :
+#     angle[k] = alpha * (angle[k-1] + vitesse[k] * dt[k]) + (1 - alpha) * angle_accel[k]
+# avec alpha = tau / (tau + dt). C'est un filtre récursif du premier ordre à coefficient constant :
+# il se calcule par blocs avec des sommes cumulées (first_order_filter), sans boucle par mesure.
+#
+# Repère du capteur : roulis autour de X (gravité dans le plan Y-Z), tangage autour de Y ;
+# vitesses angulaires GyroX / GyroY. Angles en degrés, entre -180 et 180. Le cap (lacet) n'est
+# pas observable sans magnétomètre : les quaternions renvoyés ont un lacet nul.
+# Le résultat d'une session (Timer, angles des deux jambes, Flexion) est conservé dans la table
+# 'leg_orientation' et recalculé seulement quand les mesures de la session ont changé.
+
+import zlib
+
+import numpy as np
+
+from columnar import decode_columnar, encode_columnar
+from database_manager import DatabaseManager
+from db_connection import get_pool
+from gait_analysis import LEGS
+
+# À incrémenter quand l'algorithme change, pour invalider les résultats enregistrés
+ORIENTATION_VERSION = 1
+
+# Sensibilité du gyroscope (LSB par °/s, MPU-6050 réglé sur ±250 °/s)
+GYRO_LSB_PER_DPS = 131.0
+
+# Constante de temps (s) du filtre : en dessous, le gyroscope domine ; au-dessus, l'accéléromètre
+TIME_CONSTANT = 0.5
+
+# Écart (s) entre deux mesures au-delà duquel le filtre repart de l'angle de l'accéléromètre
+MAX_SAMPLE_GAP = 0.5
+
+# Gain maximal (alpha^-B) accepté dans un bloc de first_order_filter (précision des sommes cumulées)
+MAX_BLOCK_GAIN = 1e6
+
+# Angles enregistrés en centièmes de degré (int16)
+ANGLE_SCALE = 100
+
+ANGLE_NAMES = ("roll", "pitch")
+ORIENTATION_COLUMNS = ["Timer"] + [f"{leg}_{angle}" for leg in LEGS for angle in ANGLE_NAMES] + ["Flexion"]
+QUATERNION_NAMES = ("qw", "qx", "qy", "qz")
+
+
+def first_order_filter(inputs, alpha, initial=0.0):
+    """
+    Filtre récursif y[k] = alpha * y[k-1] + inputs[k], avec y[-1] = initial (0 < alpha < 1).
+
+    Calcul par blocs de B valeurs : dans un bloc, y[j] = alpha^j * cumsum(inputs * alpha^-i)[j]
+    + alpha^(j+1) * (dernière valeur du bloc précédent). Seule la reprise d'un bloc à l'autre
+    est une boucle Python (une itération pour plusieurs centaines de mesures).
+    """
+    count = len(inputs)
+    if count == 0:
+        return np.zeros(0)
+    block = int(max(1, min(count, np.log(MAX_BLOCK_GAIN) / -np.log(alpha))))
+    block_count = -(-count // block)
+    padded = np.zeros(block_count * block)
+    padded[:count] = inputs
+    powers = alpha ** np.arange(block)
+    local = np.cumsum(padded.reshape(block_count, block) / powers, axis=1) * powers
+
+    carries = np.empty(block_count)
+    carry = initial
+    decay = alpha ** block
+    for index, last in enumerate(local[:, -1].tolist()):
+        carries[index] = carry
+        carry = decay * carry + last
+    return (local + carries[:, None] * (powers * alpha)).ravel()[:count]
+
+
+def segment_bounds(t, max_gap=MAX_SAMPLE_GAP):
+    """
+    Débuts et fins des segments sans trou de plus de `max_gap` secondes.
+    """
+    breaks = np.flatnonzero(np.diff(t) > max_gap) + 1
+    return np.concatenate(([0], breaks)), np.concatenate((breaks, [len(t)]))
+
+
+def complementary_filter(t, accel_angle, rate, time_constant=TIME_CONSTANT):
+    """
+    Fusion d'un angle (degrés) mesuré par l'accéléromètre et de sa vitesse (°/s) mesurée par le gyroscope.
+
+    :param t: Instants en secondes, croissants
+    """
+    if len(t) == 0:
+        return np.zeros(0)
+    dt = np.diff(t, prepend=t[0])
+    positive = dt[dt > 0]
+    alpha = time_constant / (time_constant + (np.median(positive) if len(positive) else 1.0))
+
+    angle = np.empty(len(t))
+    starts, ends = segment_bounds(t)
+    for start, end in zip(starts.tolist(), ends.tolist()):
+        # Angle de l'accéléromètre déroulé : pas de saut de 360° au passage de ±180°
+        measured = np.unwrap(accel_angle[start:end], period=360)
+        inputs = alpha * rate[start + 1:end] * dt[start + 1:end] + (1 - alpha) * measured[1:]
+        angle[start] = measured[0]
+        angle[start + 1:end] = first_order_filter(inputs, alpha, initial=measured[0])
+    return np.mod(angle + 180, 360) - 180
+
+
+def accel_angles(accel):
+    """
+    Roulis et tangage (degrés) de la gravité mesurée par l'accéléromètre (colonnes X, Y, Z).
+    """
+    x, y, z = accel[:, 0], accel[:, 1], accel[:, 2]
+    roll = np.degrees(np.arctan2(y, z))
+    pitch = np.degrees(np.arctan2(-x, np.hypot(y, z)))
+    return roll, pitch
+
+
+def leg_orientation(t, accel, gyro, time_constant=TIME_CONSTANT):
+    """
+    Roulis et tangage filtrés (degrés) d'une jambe.
+
+    :param accel: Tableau (n, 3) des accélérations brutes (seule la direction compte)
+    :param gyro: Tableau (n, 3) des vitesses angulaires brutes (LSB)
+    """
+    roll, pitch = accel_angles(accel)
+    rates = gyro / GYRO_LSB_PER_DPS
+    return (complementary_filter(t, roll, rates[:, 0], time_constant),
+            complementary_filter(t, pitch, rates[:, 1], time_constant))
+
+
+def quaternions(roll, pitch):
+    """
+    Quaternions (w, x, y, z) correspondant au roulis et au tangage (degrés), lacet nul.
+    """
+    half_roll = np.radians(roll) / 2
+    half_pitch = np.radians(pitch) / 2
+    cr, sr = np.cos(half_roll), np.sin(half_roll)
+    cp, sp = np.cos(half_pitch), np.sin(half_pitch)
+    return cr * cp, sr * cp, cr * sp, -sr * sp
+
+
+def compute_orientation(columns, time_constant=TIME_CONSTANT):
+    """
+    Orientation des deux jambes sur toute une session.
+
+    :param columns: Dictionnaire {nom: tableau} avec Timer (ms, trié), les IMU et Flexion
+    :return: Dictionnaire {nom: tableau} des colonnes de ORIENTATION_COLUMNS
+    """
+    t = columns["Timer"] / 1000
+    result = {"Timer": columns["Timer"]}
+    for leg, (accel_columns, gyro_columns) in LEGS.items():
+        accel = np.nan_to_num(np.column_stack([columns[name] for name in accel_columns]))
+        gyro = np.nan_to_num(np.column_stack([columns[name] for name in gyro_columns]))
+        result[f"{leg}_roll"], result[f"{leg}_pitch"] = leg_orientation(t, accel, gyro, time_constant)
+    result["Flexion"] = columns["Flexion"]
+    return result
+
+
+def add_quaternions(result):
+    """
+    Ajoute les quaternions de chaque jambe (colonnes <jambe>_qw ... <jambe>_qz).
+    """
+    for leg in LEGS:
+        for name, values in zip(QUATERNION_NAMES, quaternions(result[f"{leg}_roll"], result[f"{leg}_pitch"])):
+            result[f"{leg}_{name}"] = values
+    return result
+
+
+def encode_orientation(result):
+    """
+    Résultat compressé pour la table 'leg_orientation' (angles en centièmes de degré, int16).
+    """
+    columns = [("Timer", result["Timer"], "d")]
+    for name in ORIENTATION_COLUMNS[1:-1]:
+        columns.append((name, np.rint(result[name] * ANGLE_SCALE).astype(np.int64), "h"))
+    columns.append(("Flexion", result["Flexion"], "d"))
+    return zlib.compress(encode_columnar(columns))
+
+
+def decode_orientation(payload):
+    stored = decode_columnar(zlib.decompress(payload))
+    result = {"Timer": stored["Timer"].copy()}
+    for name in ORIENTATION_COLUMNS[1:-1]:
+        result[name] = stored[name] / ANGLE_SCALE
+    result["Flexion"] = stored["Flexion"].copy()
+    return result
+
+
+class OrientationCache:
+    def __init__(self, db_name="sensor_data.db"):
+        self.db_name = db_name
+        self.db_manager = DatabaseManager(db_name)
+        self._initialize_database()
+
+    def _initialize_database(self):
+        """
+        Crée la table des orientations calculées si elle n'existe pas.
+        """
+        with get_pool(self.db_name).transaction() as connection:
+            connection.execute('''
+                CREATE TABLE IF NOT EXISTS leg_orientation (
+                    cache_key TEXT PRIMARY KEY,
+                    data_version TEXT NOT NULL,
+                    computed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    payload BLOB NOT NULL
+                )
+            ''')
+
+    @staticmethod
+    def cache_key(session_id):
+        return "all" if session_id is None else f"session:{session_id}"
+
+    def data_version(self, session_id=None):
+        row = self.db_manager.sensor_fingerprint(session_id=session_id)
+        return f"{ORIENTATION_VERSION}:" + ":".join(str(value) for value in row)
+
+    def get(self, session_id=None):
+        """
+        Retourne (orientation de la session, depuis_la_table). Le filtre n'est relancé que si les
+        mesures de la session ont changé depuis le dernier calcul.
+        """
+        cache_key = self.cache_key(session_id)
+        version = self.data_version(session_id)
+        with get_pool(self.db_name).connection() as conn:
+            row = conn.execute(
+                "SELECT data_version, payload FROM leg_orientation WHERE cache_key = ?", (cache_key,)
+            ).fetchone()
+        if row and row[0] == version:
+            return decode_orientation(row[1]), True
+
+        columns = self.db_manager.read_sensor_columns(
+            ["Timer"] + [name for accel, gyro in LEGS.values() for name in accel + gyro] + ["Flexion"],
+            session_id=session_id
+        )
+        payload = encode_orientation(compute_orientation(columns))
+        with get_pool(self.db_name).transaction() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO leg_orientation (cache_key, data_version, computed_at, payload) "
+                "VALUES (?, ?, CURRENT_TIMESTAMP, ?)",
+                (cache_key, version, payload)
+            )
+        # Même précision que le résultat relu depuis la table
+        return decode_orientation(payload), False
+
+    def delete(self, session_id):
+        with get_pool(self.db_name).transaction() as conn:
+            conn.execute("DELETE FROM leg_orientation WHERE cache_key = ?", (self.cache_key(session_id),))
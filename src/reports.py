@@ -0,0 +1,366 @@
+# Rapport PDF d'une session (statistiques, courbes, tracé GPS) et cache disque des rapports
+#
+# Un rapport est identifié par une empreinte des données de la session et de la version du
+# modèle de rapport : tant que ni l'une ni l'autre ne change, le PDF déjà généré est renvoyé
+# tel quel. Les rapports sont gardés dans REPORT_CACHE_DIR ; au-delà de la taille maximale,
+# les moins récemment consultés sont supprimés (date de modification = dernier accès).
+# La génération est faite en tâche de fond (voir jobs.py).
+
+import hashlib
+import os
+import time
+
+import numpy as np
+from reportlab.graphics import renderPDF
+from reportlab.graphics.charts.lineplots import LinePlot
+from reportlab.graphics.shapes import Circle, Drawing, PolyLine, String
+from reportlab.lib import colors
+from reportlab.lib.pagesizes import letter
+from reportlab.pdfgen import canvas
+
+from database_manager import DatabaseManager
+from db_connection import get_pool
+from downsampling import downsample_indices
+from gait_analysis import GaitAnalyticsCache, dynamic_magnitude, load_gait_columns, LEGS
+from gps_processing import compute_speed_and_pace
+
+# À incrémenter quand le contenu ou la mise en page du rapport change, pour invalider le cache
+REPORT_TEMPLATE_VERSION = 1
+
+REPORT_CACHE_DIR = "reports"
+
+# Taille maximale du cache des rapports (octets)
+REPORT_CACHE_MAX_BYTES = 200 * 1024 * 1024
+
+# Nombre maximal de points tracés par courbe
+CHART_POINTS = 400
+
+LEG_LABELS = {"left": "gauche", "right": "droite"}
+LEG_COLORS = {"left": colors.HexColor("#2563eb"), "right": colors.HexColor("#dc2626")}
+
+
+def report_key(db_name, session_id, title):
+    """
+    Clé du rapport d'une session : empreinte de ses mesures (elle change dès qu'une ligne est
+    ajoutée ou supprimée), du titre et de la version du modèle de rapport.
+    """
+    parts = [f"template:{REPORT_TEMPLATE_VERSION}", f"session:{session_id}", f"title:{title}"]
+    row = DatabaseManager(db_name).sensor_fingerprint(session_id=session_id)
+    parts.append("sensor_data:" + ":".join(str(value) for value in row))
+    with get_pool(db_name).connection() as conn:
+        row = conn.execute(
+            "SELECT COUNT(*), MAX(rowid), MIN(Timer), MAX(Timer) FROM gpx_data WHERE session_id = ?", (session_id,)
+        ).fetchone()
+        parts.append("gpx_data:" + ":".join(str(value) for value in row))
+    return hashlib.sha256("|".join(parts).encode("utf-8")).hexdigest()
+
+
+class ReportCache:
+    def __init__(self, cache_dir=REPORT_CACHE_DIR, max_bytes=REPORT_CACHE_MAX_BYTES):
+        self.cache_dir = os.path.abspath(cache_dir)
+        self.max_bytes = max_bytes
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+    def path(self, key):
+        return os.path.join(self.cache_dir, f"{key}.pdf")
+
+    def open(self, key):
+        """
+        Ouvre le rapport en cache (None s'il n'existe pas) et le marque comme récemment utilisé.
+        Le fichier reste lisible même s'il est supprimé du cache pendant l'envoi.
+        """
+        path = self.path(key)
+        try:
+            report_file = open(path, 'rb')
+        except FileNotFoundError:
+            return None
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            pass
+        return report_file
+
+    def put(self, key, temp_path):
+        """
+        Ajoute au cache un rapport écrit dans `temp_path`, puis applique la taille maximale.
+        """
+        path = self.path(key)
+        os.replace(temp_path, path)
+        self.evict(keep=path)
+        return path
+
+    def evict(self, keep=None):
+        """
+        Supprime les rapports les moins récemment utilisés jusqu'à revenir sous la taille maximale.
+        """
+        entries = []
+        for entry in os.scandir(self.cache_dir):
+            if entry.name.endswith(".pdf"):
+                try:
+                    stat_result = entry.stat()
+                except FileNotFoundError:
+                    continue
+                entries.append((stat_result.st_mtime, stat_result.st_size, entry.path))
+
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            if path == keep:
+                continue
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+
+
+# --- Données du rapport --------------------------------------------------------------------
+
+def load_gps_track(db_name, session_id):
+    """
+    Points GPS valides de la session (Timer en s, latitude, longitude, altitude), triés par Timer.
+    """
+    query = '''
+        SELECT Timer, Latitude, Longitude, Altitude FROM gpx_data
+        WHERE session_id = ? AND Latitude IS NOT NULL AND Longitude IS NOT NULL
+        ORDER BY Timer
+    '''
+    with get_pool(db_name).connection() as conn:
+        rows = conn.execute(query, (session_id,)).fetchall()
+    table = np.array(rows, dtype=np.float64).reshape(-1, 4)
+    # Coordonnées à 0 : pas de position (GPS sans satellites)
+    table = table[(table[:, 1] != 0) & (table[:, 2] != 0)]
+    return {
+        "time": table[:, 0] / 1000, "latitude": table[:, 1], "longitude": table[:, 2], "altitude": table[:, 3]
+    }
+
+
+def gps_summary(track):
+    """
+    Distance, vitesses et dénivelé d'une trace.
+    """
+    if len(track["time"]) < 2:
+        return None, np.zeros(0)
+    distance, speed, _ = compute_speed_and_pace(track["latitude"], track["longitude"], track["time"], smoothing=5)
+    altitude = track["altitude"][np.isfinite(track["altitude"])]
+    duration = track["time"][-1] - track["time"][0]
+    total_distance = float(distance.sum())
+    return {
+        "distance": total_distance,
+        "duration": float(duration),
+        "average_speed": total_distance / (duration / 3600) if duration > 0 else None,
+        "max_speed": float(speed.max()),
+        "altitude_min": float(altitude.min()) if len(altitude) else None,
+        "altitude_max": float(altitude.max()) if len(altitude) else None,
+        "elevation_gain": float(np.clip(np.diff(altitude), 0, None).sum()) if len(altitude) > 1 else None,
+    }, speed
+
+
+def reduce_series(x, values, max_points=CHART_POINTS):
+    """
+    Série (x, y) réduite à `max_points` points pour le tracé.
+    """
+    if len(x) == 0:
+        return []
+    indices = downsample_indices(x, values, max_points)
+    return list(zip(x[indices].tolist(), values[indices].tolist()))
+
+
+# --- Mise en page ----------------------------------------------------------------------------
+
+def _format(value, unit="", digits=1):
+    if value is None:
+        return "--"
+    return f"{value:.{digits}f}{unit}"
+
+
+def _format_duration(seconds):
+    if seconds is None:
+        return "--"
+    minutes, seconds = divmod(int(round(seconds)), 60)
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours} h {minutes:02d} min {seconds:02d} s" if hours else f"{minutes} min {seconds:02d} s"
+
+
+def line_chart(title, series, width, height, x_label):
+    """
+    Courbes (liste de (légende, couleur, points)) dans un dessin reportlab.
+    """
+    drawing = Drawing(width, height)
+    drawing.add(String(0, height - 12, title, fontName="Helvetica-Bold", fontSize=10))
+    series = [(label, color, points) for label, color, points in series if len(points) > 1]
+    if not series:
+        drawing.add(String(0, height / 2, "Pas de données.", fontName="Helvetica", fontSize=9))
+        return drawing
+
+    plot = LinePlot()
+    plot.x, plot.y = 40, 25
+    plot.width, plot.height = width - 50, height - 55
+    plot.data = [points for _, _, points in series]
+    for index, (_, color, _) in enumerate(series):
+        plot.lines[index].strokeColor = color
+        plot.lines[index].strokeWidth = 0.8
+    plot.xValueAxis.labels.fontSize = 7
+    plot.yValueAxis.labels.fontSize = 7
+    plot.xValueAxis.labelTextFormat = "%.0f"
+    drawing.add(plot)
+    drawing.add(String(width / 2, 2, x_label, fontName="Helvetica", fontSize=7, textAnchor="middle"))
+
+    # Légende
+    legend_x = width - 10
+    for label, color, _ in reversed(series):
+        drawing.add(String(legend_x, height - 12, label, fontName="Helvetica", fontSize=8,
+                           fillColor=color, textAnchor="end"))
+        legend_x -= 8 + 4.5 * len(label)
+    return drawing
+
+
+def trace_drawing(track, width, height):
+    """
+    Tracé GPS (projection équirectangulaire) avec le départ en vert et l'arrivée en rouge.
+    """
+    drawing = Drawing(width, height)
+    drawing.add(String(0, height - 12, "Tracé GPS", fontName="Helvetica-Bold", fontSize=10))
+    latitude, longitude = track["latitude"], track["longitude"]
+    if len(latitude) < 2:
+        drawing.add(String(0, height / 2, "Pas de position GPS.", fontName="Helvetica", fontSize=9))
+        return drawing
+
+    x = longitude * np.cos(np.radians(latitude.mean()))
+    y = latitude
+    span = max(x.max() - x.min(), y.max() - y.min()) or 1.0
+    area_width, area_height = width - 20, height - 30
+    scale = min(area_width, area_height) / span
+    px = 10 + (x - x.min()) * scale + (area_width - (x.max() - x.min()) * scale) / 2
+    py = 10 + (y - y.min()) * scale + (area_height - (y.max() - y.min()) * scale) / 2
+
+    indices = downsample_indices(np.arange(len(px), dtype=np.float64), py, CHART_POINTS * 2)
+    points = np.column_stack((px[indices], py[indices])).ravel().tolist()
+    drawing.add(PolyLine(points, strokeColor=colors.HexColor("#2563eb"), strokeWidth=1.2))
+    drawing.add(Circle(px[0], py[0], 3, fillColor=colors.green, strokeColor=None))
+    drawing.add(Circle(px[-1], py[-1], 3, fillColor=colors.red, strokeColor=None))
+    return drawing
+
+
+def render_report(output, title, gait, gps, gps_track, speed, accel_series):
+    """
+    Écrit le rapport PDF (deux pages : statistiques et courbes, puis tracé GPS).
+    """
+    page_width, page_height = letter
+    margin = 50
+    pdf = canvas.Canvas(output, pagesize=letter)
+    pdf.setTitle(f"Rapport de course - {title}")
+
+    y = page_height - margin
+    pdf.setFont("Helvetica-Bold", 18)
+    pdf.drawString(margin, y, "Rapport de course ProAdapt")
+    y -= 20
+    pdf.setFont("Helvetica", 11)
+    pdf.drawString(margin, y, title)
+    pdf.drawRightString(page_width - margin, y, time.strftime("Généré le %d/%m/%Y"))
+    y -= 30
+
+    left, right = gait["legs"]["left"], gait["legs"]["right"]
+    symmetry = gait["symmetry"]
+    lines = [
+        ("Durée", _format_duration(gait["duration"])),
+        ("Échantillons IMU", str(gait["samples"])),
+        ("Pas détectés", str(gait["steps"])),
+        ("Cadence", _format(gait["cadence"], " pas/min")),
+        ("Temps de foulée (G / D)", f"{_format(left['stride_time'], ' s', 2)} / {_format(right['stride_time'], ' s', 2)}"),
+        ("Temps d'appui (G / D)", f"{_format(left['stance_time'], ' s', 2)} / {_format(right['stance_time'], ' s', 2)}"),
+        ("Part d'appui (G / D)", f"{_format(left['stance_ratio'], ' %')} / {_format(right['stance_ratio'], ' %')}"),
+        ("Symétrie foulée / appui", f"{_format(symmetry['stride_time'], ' %')} / {_format(symmetry['stance_time'], ' %')}"),
+    ]
+    if gps:
+        lines += [
+            ("Distance", _format(gps["distance"], " km", 2)),
+            ("Vitesse moyenne / max", f"{_format(gps['average_speed'], ' km/h')} / {_format(gps['max_speed'], ' km/h')}"),
+            ("Altitude min / max", f"{_format(gps['altitude_min'], ' m', 0)} / {_format(gps['altitude_max'], ' m', 0)}"),
+            ("Dénivelé positif", _format(gps["elevation_gain"], " m", 0)),
+        ]
+    else:
+        lines.append(("GPS", "aucune position enregistrée"))
+
+    pdf.setFont("Helvetica-Bold", 12)
+    pdf.drawString(margin, y, "Résumé")
+    y -= 18
+    for label, value in lines:
+        pdf.setFont("Helvetica", 10)
+        pdf.drawString(margin, y, label)
+        pdf.setFont("Helvetica-Bold", 10)
+        pdf.drawString(margin + 200, y, value)
+        y -= 15
+    y -= 10
+
+    chart_width = page_width - 2 * margin
+    chart_height = 150
+    cadence_points = [(point["Timer"] / 1000, point["cadence"]) for point in gait["cadence_series"]]
+    charts = [
+        line_chart("Accélération dynamique", accel_series, chart_width, chart_height, "Temps (s)"),
+        line_chart("Cadence (pas/min)", [("cadence", colors.black, cadence_points)],
+                   chart_width, chart_height, "Temps (s)"),
+    ]
+    for chart in charts:
+        y -= chart_height
+        renderPDF.draw(chart, pdf, margin, y)
+        y -= 15
+    pdf.showPage()
+
+    y = page_height - margin
+    trace = trace_drawing(gps_track, chart_width, 330)
+    y -= 330
+    renderPDF.draw(trace, pdf, margin, y)
+    y -= 20
+    gps_time = gps_track["time"] - gps_track["time"][0] if len(gps_track["time"]) else gps_track["time"]
+    altitude = np.nan_to_num(gps_track["altitude"])
+    for chart in (
+        line_chart("Altitude (m)", [("altitude", colors.HexColor("#16a34a"), reduce_series(gps_time, altitude))],
+                   chart_width, chart_height, "Temps (s)"),
+        line_chart("Vitesse (km/h)", [("vitesse", colors.HexColor("#9333ea"), reduce_series(gps_time, speed))],
+                   chart_width, chart_height, "Temps (s)"),
+    ):
+        y -= chart_height
+        renderPDF.draw(chart, pdf, margin, y)
+        y -= 15
+    pdf.showPage()
+    pdf.save()
+
+
+def build_session_report(db_name, session_id, title, cache_dir, max_bytes, key):
+    """
+    Tâche de fond (voir jobs.py) : génère le rapport d'une session et l'ajoute au cache.
+
+    :return: Dictionnaire {key, size}
+    """
+    cache = ReportCache(cache_dir, max_bytes)
+    cached = cache.open(key)
+    if cached is not None:
+        cached.close()
+        return {"key": key, "size": os.path.getsize(cache.path(key))}
+
+    gait, _ = GaitAnalyticsCache(db_name).get(session_id=session_id)
+
+    columns = load_gait_columns(db_name, session_id=session_id)
+    order = np.argsort(columns["Timer"], kind="stable")
+    t = columns["Timer"][order] / 1000
+    elapsed = t - t[0] if len(t) else t
+    accel_series = []
+    for leg, (accel_columns, _) in LEGS.items():
+        accel = np.column_stack([columns[name][order] for name in accel_columns])
+        magnitude = dynamic_magnitude(t, accel) if len(t) else np.zeros(0)
+        accel_series.append((f"jambe {LEG_LABELS[leg]}", LEG_COLORS[leg], reduce_series(elapsed, magnitude)))
+
+    gps_track = load_gps_track(db_name, session_id)
+    gps, speed = gps_summary(gps_track)
+
+    temp_path = os.path.join(cache.cache_dir, f"{key}.{os.getpid()}.tmp")
+    try:
+        render_report(temp_path, title, gait, gps, gps_track, speed, accel_series)
+        path = cache.put(key, temp_path)
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+    print(f"Rapport de la session {session_id} généré : {path}")
+    return {"key": key, "size": os.path.getsize(path)}
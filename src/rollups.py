@@ -0,0 +1,179 @@
+# Agrégats des mesures par fenêtres de temps fixes (1 s, 10 s, 60 s) pour les graphiques zoomables
+#
+# La table 'sensor_rollup' contient, pour chaque niveau (largeur de fenêtre en ms), chaque session
+# et chaque fenêtre [window_start, window_start + level_ms[ : le nombre de lignes, puis pour chaque
+# voie le minimum, le maximum, la somme et le nombre de valeurs renseignées (la moyenne est
+# somme / nombre). Ces quatre valeurs se cumulent exactement : un paquet de lignes reçu plus tard
+# dans la même fenêtre est ajouté par un UPSERT, sans relire 'sensor_data'.
+# Les lignes sans session sont rangées sous session_key = 0 (les sessions commencent à 1).
+# Tenue à jour par DatabaseManager.update_rollups, à chaque insertion dans 'sensor_data'.
+
+import numpy as np
+
+ROLLUP_TABLE = "sensor_rollup"
+
+# Largeurs des fenêtres (ms), de la plus fine à la plus grossière. Une fenêtre stocke quatre valeurs
+# par voie : elle n'est rentable que si elle regroupe de nombreuses mesures (une quarantaine par
+# seconde à 40 Hz). Les zooms plus fins que la seconde lisent les mesures elles-mêmes.
+ROLLUP_LEVELS_MS = (1000, 10000, 60000)
+
+NO_SESSION_KEY = 0
+
+
+def rollup_fields(channels):
+    """
+    Colonnes de la table des agrégats (définitions SQL).
+    """
+    fields = ["level_ms INTEGER NOT NULL", "session_key INTEGER NOT NULL",
+              "window_start INTEGER NOT NULL", "samples INTEGER NOT NULL"]
+    for channel in channels:
+        fields += [f"{channel}_min INTEGER", f"{channel}_max INTEGER",
+                   f"{channel}_sum REAL NOT NULL", f"{channel}_n INTEGER NOT NULL"]
+    fields.append("PRIMARY KEY (level_ms, session_key, window_start)")
+    return fields
+
+
+def upsert_query(channels):
+    """
+    INSERT qui ajoute un agrégat partiel à la fenêtre existante (ou la crée).
+    """
+    columns = ["level_ms", "session_key", "window_start", "samples"]
+    updates = ["samples = samples + excluded.samples"]
+    for channel in channels:
+        low, high, total, count = (f"{channel}_min", f"{channel}_max", f"{channel}_sum", f"{channel}_n")
+        columns += [low, high, total, count]
+        # min / max à plusieurs arguments renvoient NULL si l'un est NULL : voie vide d'un côté
+        updates += [
+            f"{low} = min(coalesce({low}, excluded.{low}), coalesce(excluded.{low}, {low}))",
+            f"{high} = max(coalesce({high}, excluded.{high}), coalesce(excluded.{high}, {high}))",
+            f"{total} = {total} + excluded.{total}",
+            f"{count} = {count} + excluded.{count}",
+        ]
+    placeholders = ", ".join(["?"] * len(columns))
+    return (
+        f"INSERT INTO {ROLLUP_TABLE} ({', '.join(columns)}) VALUES ({placeholders}) "
+        f"ON CONFLICT(level_ms, session_key, window_start) DO UPDATE SET {', '.join(updates)}"
+    )
+
+
+def rebuild_query(channels, level_ms, where_clause=""):
+    """
+    INSERT ... SELECT qui recalcule un niveau à partir de 'sensor_data' (migration, reconstruction).
+    `window_start` est le multiple de `level_ms` inférieur ou égal à Timer, comme dans window_aggregates.
+    """
+    window = f"(Timer - ((Timer % {level_ms}) + {level_ms}) % {level_ms})"
+    columns = ["level_ms", "session_key", "window_start", "samples"]
+    selects = [str(level_ms), f"coalesce(session_id, {NO_SESSION_KEY})", window, "count(*)"]
+    for channel in channels:
+        columns += [f"{channel}_min", f"{channel}_max", f"{channel}_sum", f"{channel}_n"]
+        selects += [f"min({channel})", f"max({channel})", f"total({channel})", f"count({channel})"]
+    conditions = "Timer IS NOT NULL" + (f" AND ({where_clause})" if where_clause else "")
+    return (
+        f"INSERT INTO {ROLLUP_TABLE} ({', '.join(columns)}) "
+        f"SELECT {', '.join(selects)} FROM sensor_data WHERE {conditions} "
+        f"GROUP BY coalesce(session_id, {NO_SESSION_KEY}), {window}"
+    )
+
+
+def _group_starts(windows, sessions):
+    """
+    Début de chaque groupe (session, fenêtre) dans des tableaux déjà triés.
+    """
+    boundaries = np.flatnonzero((np.diff(windows) != 0) | (np.diff(sessions) != 0)) + 1
+    return np.concatenate(([0], boundaries))
+
+
+def _reduce(starts, samples, stats):
+    samples = np.add.reduceat(samples, starts)
+    # fmin / fmax ignorent les NaN (voie absente) tant qu'une valeur est renseignée
+    stats = [
+        (np.fmin.reduceat(low, starts), np.fmax.reduceat(high, starts),
+         np.add.reduceat(total, starts), np.add.reduceat(count, starts))
+        for low, high, total, count in stats
+    ]
+    return samples, stats
+
+
+def window_aggregates(timers, session_keys, channels, levels=ROLLUP_LEVELS_MS):
+    """
+    Agrégats d'un paquet de lignes pour chaque niveau, prêts pour `upsert_query`.
+    Chaque niveau est calculé à partir du précédent (les largeurs sont multiples les unes des autres).
+
+    :param timers: Tableau des Timer (float64, sans NaN)
+    :param session_keys: Tableau des clés de session (int64)
+    :param channels: Liste de tableaux float64, un par voie (NaN pour les valeurs absentes)
+    :return: Dictionnaire niveau -> liste de tuples (level_ms, session_key, window_start, samples,
+             puis min, max, somme, nombre pour chaque voie)
+    """
+    if len(timers) == 0:
+        return {level_ms: [] for level_ms in levels}
+
+    windows = np.floor_divide(timers, levels[0]).astype(np.int64) * levels[0]
+    order = np.lexsort((windows, session_keys))
+    windows = windows[order]
+    sessions = session_keys[order]
+    samples = np.ones(len(order), dtype=np.int64)
+    stats = []
+    for values in channels:
+        values = values[order]
+        valid = ~np.isnan(values)
+        stats.append((values, values, np.where(valid, values, 0.0), valid.astype(np.int64)))
+
+    rows = {}
+    for level_ms in levels:
+        # Les lignes restent triées par (session, fenêtre) d'un niveau au suivant
+        windows = np.floor_divide(windows, level_ms) * level_ms
+        starts = _group_starts(windows, sessions)
+        samples, stats = _reduce(starts, samples, stats)
+        windows = windows[starts]
+        sessions = sessions[starts]
+
+        columns = [[level_ms] * len(starts), sessions.tolist(), windows.tolist(), samples.tolist()]
+        for low, high, total, count in stats:
+            # Voie vide dans la fenêtre : NaN, enregistré comme NULL par SQLite
+            columns += [low.tolist(), high.tolist(), total.tolist(), count.tolist()]
+        rows[level_ms] = list(zip(*columns))
+    return rows
+
+
+def choose_level(resolution_ms, levels=ROLLUP_LEVELS_MS):
+    """
+    Niveau le plus grossier dont les fenêtres ne dépassent pas la résolution demandée
+    (None si la résolution est plus fine que le plus petit niveau : lignes brutes).
+    """
+    eligible = [level for level in levels if level <= resolution_ms]
+    return max(eligible) if eligible else None
+
+
+def rollup_select(channels, level_ms, start=None, end=None, session_id=None):
+    """
+    Requête de lecture d'un niveau (toutes sessions confondues, ou une seule session) :
+    une ligne par fenêtre chevauchant [start, end], triée par début de fenêtre.
+
+    :return: (requête, paramètres, noms des colonnes renvoyées)
+    """
+    conditions = ["level_ms = ?"]
+    params = [level_ms]
+    if session_id is not None:
+        conditions.append("session_key = ?")
+        params.append(session_id)
+    if start is not None:
+        conditions.append("window_start > ?")
+        params.append(start - level_ms)
+    if end is not None:
+        conditions.append("window_start <= ?")
+        params.append(end)
+
+    selects = ["window_start", "sum(samples)"]
+    names = ["Timer", "count"]
+    for channel in channels:
+        selects += [
+            f"sum({channel}_sum) / nullif(sum({channel}_n), 0)",
+            f"min({channel}_min)", f"max({channel}_max)",
+        ]
+        names += [channel, f"{channel}_min", f"{channel}_max"]
+    query = (
+        f"SELECT {', '.join(selects)} FROM {ROLLUP_TABLE} WHERE {' AND '.join(conditions)} "
+        f"GROUP BY window_start ORDER BY window_start"
+    )
+    return query, params, names
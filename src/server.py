@@ -1,111 +1,536 @@
-from flask import Flask, request, jsonify, redirect
+from flask import Flask, Response, request, jsonify, redirect
 import requests
 from flask_cors import CORS
 import sqlite3
 import os
 import hashlib
 from user_database_manager import UserDatabaseManager
-from database_manager import DatabaseManager
+from database_manager import DatabaseManager, build_timer_range
 from tools import get_vue_port
 import csv
 import shutil
-import gpxpy
 from flask import send_file
-from reportlab.lib.pagesizes import letter
-from reportlab.pdfgen import canvas
-from geopy.distance import geodesic
-
-
-def load_csv_file_to_database(csv_file_path, db_name="sensor_data.db"):
+import numpy as np
+from downsampling import downsample_indices, DOWNSAMPLING_METHODS
+from streaming import STREAM_FORMATS, column_records, csv_records, query_records, streaming_response
+from columnar import COLUMNAR_MIMETYPE, encode_columnar, load_sensor_columns
+from db_connection import PoolTimeout, close_all_pools, get_pool, state_database
+from gps_processing import DISTANCE_METHODS, write_gps_csv
+from gait_analysis import GaitAnalyticsCache
+from orientation import ORIENTATION_COLUMNS, OrientationCache, add_quaternions
+from tail_ingest import CsvTailIngester, ingest_csv_file
+from jobs import JobManager, JobQueueFull
+from csv_upload import StreamingCsvUpload, get_progress, initialize_progress_table, start_progress
+from reports import ReportCache, build_session_report, report_key
+from elevation import DEM_DIRECTORY, DemElevationProvider, fetch_remote_elevations
+from http_cache import compress_response, data_etag, not_modified, with_etag
+from serving import DEFAULT_THREADS, DEFAULT_WORKERS, gunicorn_available, run_production
+from metrics import CONTENT_TYPE as METRICS_CONTENT_TYPE, REGISTRY
+from instrumentation import instrument_app, parse_profiling, record_rows
+from rollups import choose_level, rollup_select
+from timeline_join import (
+    ASOF_DIRECTIONS, DEFAULT_TOLERANCE_MS, GPS_JOIN_COLUMNS, IMU_JOIN_COLUMNS, JOIN_MODES, aggregate_by_fix,
+    clip_timer_range, join_samples
+)
+from trace_simplification import (
+    MAX_ZOOM, TRACE_COLUMNS, GpsTraceCache, parse_bbox, simplify_trace, tile_bbox, trace_importance
+)
+
+
+def load_csv_file_to_database(csv_file_path, db_name="sensor_data.db", session_id=None):
     db_manager = DatabaseManager(db_name)
     db_manager.initialize_database()
-    db_manager.load_csv_to_db(csv_file_path=csv_file_path)
-
-OPEN_ELEVATION_API_URL = "https://api.open-elevation.com/api/v1/lookup"
+    return db_manager.load_csv_to_db(csv_file_path=csv_file_path, session_id=session_id)
+
+def parse_optional_int(value):
+    """
+    Convertit un paramètre de requête en entier (None si absent).
+    """
+    if value is None or value == "":
+        return None
+    return int(value)
+
+def parse_optional_float(value):
+    """
+    Convertit un paramètre de requête en nombre réel (None si absent).
+    """
+    if value is None or value == "":
+        return None
+    return float(value)
+
+def parse_simplification(args):
+    """
+    Paramètres de simplification d'un tracé GPS : (zoom, tolérance en m, cadre), None s'ils sont absents.
+    Lève ValueError si l'un d'eux est invalide.
+    """
+    zoom = parse_optional_int(args.get('zoom'))
+    tolerance = parse_optional_float(args.get('tolerance'))
+    bbox = parse_bbox(args['bbox']) if args.get('bbox') else None
+    if zoom is not None and not 0 <= zoom <= MAX_ZOOM:
+        raise ValueError(f"zoom doit être compris entre 0 et {MAX_ZOOM}.")
+    if tolerance is not None and not tolerance >= 0:
+        raise ValueError("tolerance doit être positive ou nulle.")
+    return zoom, tolerance, bbox
+
+SIMPLIFICATION_ERROR = (
+    f"Paramètres invalides : zoom (entier de 0 à {MAX_ZOOM}), tolerance (m, >= 0), bbox (ouest,sud,est,nord)."
+)
 
 class Server:
-    def __init__(self, db_name="sensor_data.db", user_db_name="user_data.db"):
+    def __init__(self, db_name="sensor_data.db", user_db_name="user_data.db", dem_directory=DEM_DIRECTORY,
+                 remote_elevation=None, profiling=None):
+        """
+        :param profiling: Profilage des requêtes : "off", "header" (en-tête X-Profile: 1) ou proportion
+                          de requêtes profilées (par défaut la variable d'environnement PROADAPT_PROFILING)
+        """
         self.app = Flask(__name__)
         CORS(self.app)
+        # Mesures des requêtes (/api/metrics) et profilage à la demande
+        if profiling is None:
+            profiling = os.environ.get("PROADAPT_PROFILING", "off")
+        instrument_app(self.app, profiling=parse_profiling(profiling))
         self.db_name = db_name
+        self.db_manager = DatabaseManager(db_name)
         self.user_db_manager = UserDatabaseManager(user_db_name)
         self.user_db_manager._initialize_database()
+        self.gait_cache = GaitAnalyticsCache(db_name)
+        self.orientation_cache = OrientationCache(db_name)
+        self.gps_trace_cache = GpsTraceCache(db_name)
+        self.csv_ingester = CsvTailIngester(db_name, os.path.join(os.getcwd(), "esp32_data.csv"))
+        # État des travaux et progression des envois : partagés entre les processus du serveur de production,
+        # dans une base à part pour ne pas attendre le verrou d'un import en cours (voir state_database)
+        self.state_db_name = state_database(db_name)
+        self.job_manager = JobManager(db_name=self.state_db_name)
+        initialize_progress_table(self.state_db_name)
+        self.report_cache = ReportCache()
+        self.elevation_provider = DemElevationProvider(dem_directory)
+        # Recours à l'API Open Elevation (désactivable avec PROADAPT_ELEVATION_FALLBACK=0)
+        if remote_elevation is None:
+            remote_elevation = os.environ.get("PROADAPT_ELEVATION_FALLBACK", "1") != "0"
+        self.remote_elevation = remote_elevation
         self._initialize_routes()
 
     def _initialize_database(self):
-        conn = sqlite3.connect(self.db_name)
-        cursor = conn.cursor()
-
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS sensor_data (
-                Timer INTEGER PRIMARY KEY,
-                Accel1X INTEGER, Accel1Y INTEGER, Accel1Z INTEGER,
-                Gyro1X INTEGER, Gyro1Y INTEGER, Gyro1Z INTEGER,
-                Accel2X INTEGER, Accel2Y INTEGER, Accel2Z INTEGER,
-                Gyro2X INTEGER, Gyro2Y INTEGER, Gyro2Z INTEGER
-            )
-        ''')
-
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS gpx_data (
-                Timer INTEGER PRIMARY KEY,
-                Latitude REAL, Longitude REAL, Altitude REAL,
-                Vitesse REAL, Orientation REAL, Satellites INTEGER, HDOP REAL
-            )
-        ''')
-
-        conn.commit()
-        conn.close()
+        # Même schéma que DatabaseManager : une session peut réutiliser les valeurs de Timer
+        # d'une autre, Timer n'est donc plus une clé primaire
+        DatabaseManager(self.db_name).initialize_database()
+
+    def close(self):
+        """
+        Arrêt du serveur : attend la fin des tâches de fond et ferme les connexions.
+        """
+        self.job_manager.shutdown()
+        close_all_pools()
+        REGISTRY.publish(force=True)
+
+    def _submit_job(self, kind, function, *args, key=None, message=None):
+        """
+        Soumet une tâche de fond et construit la réponse 202 (ou 503 si trop de travaux sont en cours).
+        """
+        try:
+            job, created = self.job_manager.submit(kind, function, *args, key=key)
+        except JobQueueFull as e:
+            return jsonify({"error": str(e)}), 503
+        if not created:
+            message = "Ce traitement est déjà en cours."
+        return jsonify({
+            "message": message, "job": job.as_dict(), "status_url": f"/api/jobs/{job.id}", "duplicate": not created
+        }), 202
+
+    def _data_etag(self, tables, session_id=None):
+        """
+        ETag des données lues par une route : versions des tables (ou de la session) concernées.
+        """
+        scopes = [DatabaseManager.version_scope(table, session_id) for table in tables]
+        return data_etag(scopes + self.db_manager.data_versions(scopes))
+
+    def _simplified_trace_response(self, session_id, zoom, tolerance, bbox, stream_format, etag):
+        """
+        Tracé de 'gpx_data' simplifié pour un zoom ou une tolérance, limité à un cadre (voir trace_simplification.py).
+        """
+        try:
+            trace, cached = self.gps_trace_cache.get(session_id)
+        except Exception as e:
+            print(f"Erreur lors de la simplification du tracé GPS : {e}")
+            return jsonify({"error": str(e)}), 500
+
+        indices, segments, tolerance = simplify_trace(
+            trace["Latitude"], trace["Longitude"], trace["Importance"], zoom, tolerance, bbox
+        )
+        result = {name: trace[name][indices] for name in TRACE_COLUMNS}
+        if segments is not None:
+            result["Segment"] = segments
+        response = streaming_response(column_records([result], list(result)), stream_format)
+        response.headers["X-Trace-Tolerance"] = f"{tolerance:.2f}"
+        response.headers["X-Trace-Cached"] = "1" if cached else "0"
+        return with_etag(response, etag)
 
     def _initialize_routes(self):
         app = self.app
 
+        @app.after_request
+        def compress(response):
+            # Compression gzip / brotli selon Accept-Encoding
+            return compress_response(response, request.accept_encodings)
+
+        @app.errorhandler(PoolTimeout)
+        def pool_exhausted(error):
+            # Toutes les connexions à la base sont prêtées (réponses en flux lentes par exemple)
+            response = jsonify({"error": f"Serveur occupé, réessayez plus tard. {error}"})
+            response.headers["Retry-After"] = "1"
+            return response, 503
+
+        @app.route('/api/health', methods=['GET'])
+        def health():
+            """
+            Disponibilité du serveur (utilisée par main.py avant d'annoncer le serveur prêt).
+            """
+            with get_pool(self.db_name).connection() as conn:
+                conn.execute("SELECT 1").fetchone()
+            return jsonify({"status": "ok", "pid": os.getpid()})
+
+        @app.route('/api/metrics', methods=['GET'])
+        def get_metrics():
+            """
+            Métriques au format texte de Prometheus (requêtes, SQL, enregistrement des mesures).
+            """
+            return Response(REGISTRY.exposition(), content_type=METRICS_CONTENT_TYPE)
+
+        @app.route('/api/jobs/<job_id>', methods=['GET'])
+        def get_job(job_id):
+            """
+            Statut d'un traitement de fond : queued, running, done ou failed, avec son avancement
+            et son résultat une fois terminé.
+            """
+            job = self.job_manager.get(job_id)
+            if job is None:
+                return jsonify({"error": "Traitement inconnu."}), 404
+            return jsonify(job)
+
         @app.route('/api/sensor-data', methods=['GET'])
         def get_sensor_data():
-            query = '''
-                SELECT Timer, Accel1X, Accel1Y, Accel1Z, Accel2X, Accel2Y, Accel2Z 
-                FROM sensor_data
-            '''
-            conn = sqlite3.connect(self.db_name)
-            cursor = conn.cursor()
-            cursor.execute(query)
-            rows = cursor.fetchall()
-            conn.close()
+            """
+            Données des accéléromètres, triées par Timer.
+            Paramètres optionnels :
+              - start / end : bornes (incluses) sur Timer
+              - max_points : nombre maximal de points renvoyés (sous-échantillonnage côté serveur)
+              - method : 'lttb' (par défaut) ou 'minmax'
+              - session : identifiant de la session à lire
+              - resolution : largeur maximale (ms) d'un point ; le serveur lit alors le niveau d'agrégats
+                le plus grossier qui convient (moyenne, min et max par fenêtre, voir rollups.py)
+            """
+            try:
+                start = parse_optional_int(request.args.get('start'))
+                end = parse_optional_int(request.args.get('end'))
+                max_points = parse_optional_int(request.args.get('max_points'))
+                session_id = parse_optional_int(request.args.get('session'))
+                resolution = parse_optional_int(request.args.get('resolution'))
+            except ValueError:
+                return jsonify({"error": "Les paramètres start, end, max_points, session et resolution doivent être des entiers."}), 400
+
+            method = request.args.get('method', 'lttb')
+            if method not in DOWNSAMPLING_METHODS:
+                return jsonify({"error": f"Méthode inconnue : {method}"}), 400
+            if max_points is not None and max_points < 3:
+                return jsonify({"error": "max_points doit être supérieur ou égal à 3."}), 400
+
+            stream_format = request.args.get('format', 'json')
+            if stream_format not in STREAM_FORMATS:
+                return jsonify({"error": f"Format inconnu : {stream_format}"}), 400
+
+            etag = self._data_etag(["sensor_data"], session_id)
+            if request.if_none_match.contains_weak(etag):
+                return not_modified(etag)
+
+            columns = ["Timer", "Accel1X", "Accel1Y", "Accel1Z", "Accel2X", "Accel2Y", "Accel2Z"]
+            level_ms = choose_level(resolution) if resolution is not None else None
+            if level_ms is not None:
+                # Une ligne par fenêtre : Timer (début), count, puis moyenne, min et max de chaque voie
+                query, params, names = rollup_select(columns[1:], level_ms, start, end, session_id)
+                response = streaming_response(query_records(self.db_name, query, params, names), stream_format)
+                response.headers["X-Rollup-Level"] = str(level_ms)
+                return with_etag(response, etag)
+
+            if max_points is None:
+                rows = self.db_manager.iterate_sensor_rows(columns, start, end, session_id)
+                response = streaming_response((dict(zip(columns, row)) for row in rows), stream_format)
+                # La connexion des lignes est rendue même si la réponse n'est jamais lue (requête HEAD)
+                response.call_on_close(rows.close)
+                return with_etag(response, etag)
+
+            # Le sous-échantillonnage a besoin de toute la plage demandée
+            table = self.db_manager.read_sensor_columns(columns, start, end, session_id)
+            if len(table["Timer"]) > max_points:
+                samples = np.nan_to_num(np.column_stack([table[name] for name in columns]))
+                indices = downsample_indices(samples[:, 0], samples[:, 1:], max_points, method)
+                table = {name: values[indices] for name, values in table.items()}
+
+            return with_etag(streaming_response(column_records([table], columns), stream_format), etag)
+
+        @app.route('/api/sensor-data/binary', methods=['GET'])
+        def get_sensor_data_binary():
+            """
+            Données capteurs complètes (IMU des deux jambes et flexion) au format binaire
+            colonne par colonne (voir columnar.py). Paramètres optionnels : start / end sur Timer, session.
+            """
+            try:
+                start = parse_optional_int(request.args.get('start'))
+                end = parse_optional_int(request.args.get('end'))
+                session_id = parse_optional_int(request.args.get('session'))
+            except ValueError:
+                return jsonify({"error": "Les paramètres start, end et session doivent être des entiers."}), 400
+
+            etag = self._data_etag(["sensor_data"], session_id)
+            if request.if_none_match.contains_weak(etag):
+                return not_modified(etag)
+
+            columns = load_sensor_columns(self.db_manager, start, end, session_id)
+            record_rows(len(columns[0][1]))
+            return with_etag(Response(encode_columnar(columns), mimetype=COLUMNAR_MIMETYPE), etag)
+
+        @app.route('/api/gait-analytics', methods=['GET'])
+        def get_gait_analytics():
+            """
+            Analyse de la foulée (pas par jambe, cadence, appui / envol, symétrie gauche-droite).
+            Le résultat est mis en cache et recalculé seulement si des lignes ont changé.
+            Paramètres optionnels : start / end sur Timer, session.
+            """
+            try:
+                start = parse_optional_int(request.args.get('start'))
+                end = parse_optional_int(request.args.get('end'))
+                session_id = parse_optional_int(request.args.get('session'))
+            except ValueError:
+                return jsonify({"error": "Les paramètres start, end et session doivent être des entiers."}), 400
 
-            data = [{"Timer": row[0], "Accel1X": row[1], "Accel1Y": row[2], "Accel1Z": row[3],
-                     "Accel2X": row[4], "Accel2Y": row[5], "Accel2Z": row[6]} for row in rows]
-            return jsonify(data)
+            etag = self._data_etag(["sensor_data"], session_id)
+            if request.if_none_match.contains_weak(etag):
+                return not_modified(etag)
+
+            try:
+                result, cached = self.gait_cache.get(start, end, session_id)
+            except Exception as e:
+                print(f"Erreur lors de l'analyse de la foulée : {e}")
+                return jsonify({"error": str(e)}), 500
+
+            result["cached"] = cached
+            return with_etag(jsonify(result), etag)
+
+        @app.route('/api/orientation', methods=['GET'])
+        def get_orientation():
+            """
+            Orientation de chaque prothèse (roulis / tangage, filtre complémentaire, voir orientation.py)
+            avec la flexion du genou. Calculée sur toute la session à la première demande puis conservée.
+            Paramètres optionnels :
+              - session : identifiant de la session
+              - start / end : bornes (incluses) sur Timer
+              - max_points, method : sous-échantillonnage, comme pour /api/sensor-data
+              - quaternions=1 : ajoute les quaternions (w, x, y, z) de chaque jambe
+            """
+            try:
+                start = parse_optional_int(request.args.get('start'))
+                end = parse_optional_int(request.args.get('end'))
+                max_points = parse_optional_int(request.args.get('max_points'))
+                session_id = parse_optional_int(request.args.get('session'))
+            except ValueError:
+                return jsonify({"error": "Les paramètres start, end, max_points et session doivent être des entiers."}), 400
+
+            method = request.args.get('method', 'lttb')
+            if method not in DOWNSAMPLING_METHODS:
+                return jsonify({"error": f"Méthode inconnue : {method}"}), 400
+            if max_points is not None and max_points < 3:
+                return jsonify({"error": "max_points doit être supérieur ou égal à 3."}), 400
+            stream_format = request.args.get('format', 'json')
+            if stream_format not in STREAM_FORMATS:
+                return jsonify({"error": f"Format inconnu : {stream_format}"}), 400
+            with_quaternions = request.args.get('quaternions') == '1'
+
+            etag = self._data_etag(["sensor_data"], session_id)
+            if request.if_none_match.contains_weak(etag):
+                return not_modified(etag)
+
+            try:
+                result, cached = self.orientation_cache.get(session_id)
+            except Exception as e:
+                print(f"Erreur lors du calcul de l'orientation : {e}")
+                return jsonify({"error": str(e)}), 500
+
+            timer = result["Timer"]
+            keep = np.ones(len(timer), dtype=bool)
+            if start is not None:
+                keep &= timer >= start
+            if end is not None:
+                keep &= timer <= end
+            result = {name: values[keep] for name, values in result.items()}
+            if max_points is not None and len(result["Timer"]) > max_points:
+                angles = np.column_stack([result[name] for name in ORIENTATION_COLUMNS[1:-1]])
+                indices = downsample_indices(result["Timer"], angles, max_points, method)
+                result = {name: values[indices] for name, values in result.items()}
+            if with_quaternions:
+                add_quaternions(result)
+
+            response = streaming_response(column_records([result], list(result)), stream_format)
+            response.headers["X-Orientation-Cached"] = "1" if cached else "0"
+            return with_etag(response, etag)
 
         @app.route('/api/gpx-data', methods=['GET'])
         def get_gpx_data():
-            query = '''
+            stream_format = request.args.get('format', 'json')
+            if stream_format not in STREAM_FORMATS:
+                return jsonify({"error": f"Format inconnu : {stream_format}"}), 400
+            try:
+                session_id = parse_optional_int(request.args.get('session'))
+            except ValueError:
+                return jsonify({"error": "Le paramètre session doit être un entier."}), 400
+
+            etag = self._data_etag(["gpx_data"], session_id)
+            if request.if_none_match.contains_weak(etag):
+                return not_modified(etag)
+
+            where_clause, params = build_timer_range(None, None, session_id)
+            query = f'''
                 SELECT Timer, Latitude, Longitude, Altitude 
                 FROM gpx_data
+                {where_clause}
             '''
-            conn = sqlite3.connect(self.db_name)
-            cursor = conn.cursor()
-            cursor.execute(query)
-            rows = cursor.fetchall()
-            conn.close()
-
-            data = [{"Timer": row[0], "Latitude": row[1], "Longitude": row[2], "Altitude": row[3]} for row in rows]
-            return jsonify(data)
+            columns = ["Timer", "Latitude", "Longitude", "Altitude"]
+            return with_etag(streaming_response(query_records(self.db_name, query, params, columns), stream_format), etag)
 
         @app.route('/api/gps-trace', methods=['GET'])
         def get_gps_trace():
-            conn = sqlite3.connect(self.db_name)
-            cursor = conn.cursor()
-            cursor.execute('''
+            """
+            Tracé GPS (Timer, Latitude, Longitude), complet par défaut.
+            Paramètres optionnels :
+              - session : identifiant de la session
+              - zoom : niveau de zoom de la carte, ou tolerance : écart toléré (m) ; le tracé est alors simplifié
+                (Douglas-Peucker, calculé une fois par session, voir trace_simplification.py)
+              - bbox : cadre 'ouest,sud,est,nord' ; seules les portions visibles sont renvoyées, avec Segment
+            """
+            stream_format = request.args.get('format', 'json')
+            if stream_format not in STREAM_FORMATS:
+                return jsonify({"error": f"Format inconnu : {stream_format}"}), 400
+            try:
+                session_id = parse_optional_int(request.args.get('session'))
+            except ValueError:
+                return jsonify({"error": "Le paramètre session doit être un entier."}), 400
+            try:
+                zoom, tolerance, bbox = parse_simplification(request.args)
+            except ValueError:
+                return jsonify({"error": SIMPLIFICATION_ERROR}), 400
+
+            etag = self._data_etag(["gpx_data"], session_id)
+            if request.if_none_match.contains_weak(etag):
+                return not_modified(etag)
+
+            if zoom is not None or tolerance is not None or bbox is not None:
+                return self._simplified_trace_response(session_id, zoom, tolerance, bbox, stream_format, etag)
+
+            session_clause = "AND session_id = ?" if session_id is not None else ""
+            params = (session_id,) if session_id is not None else ()
+            query = f'''
                 SELECT Timer, Latitude, Longitude 
                 FROM gpx_data 
-                WHERE Latitude IS NOT NULL AND Longitude IS NOT NULL
-            ''')
-            rows = cursor.fetchall()
-            conn.close()
+                WHERE Latitude IS NOT NULL AND Longitude IS NOT NULL {session_clause}
+            '''
+            columns = ["Timer", "Latitude", "Longitude"]
 
             # Inclure le champ Timer dans chaque point GPS
-            trace_data = [{"Timer": row[0], "Latitude": row[1], "Longitude": row[2]} for row in rows if row[1] and row[2]]
-            return jsonify(trace_data)
+            trace_data = query_records(self.db_name, query, params, columns, row_filter=lambda row: row[1] and row[2])
+            return with_etag(streaming_response(trace_data, stream_format), etag)
+
+        @app.route('/api/gps-trace/tiles/<int:zoom>/<int:x>/<int:y>', methods=['GET'])
+        def get_gps_trace_tile(zoom, x, y):
+            """
+            Tracé simplifié pour le zoom de la tuile, limité à la tuile (numérotation OSM z/x/y, comme
+            les tuiles de fond de carte de Leaflet). Paramètres optionnels : session, format.
+            """
+            stream_format = request.args.get('format', 'json')
+            if stream_format not in STREAM_FORMATS:
+                return jsonify({"error": f"Format inconnu : {stream_format}"}), 400
+            try:
+                session_id = parse_optional_int(request.args.get('session'))
+            except ValueError:
+                return jsonify({"error": "Le paramètre session doit être un entier."}), 400
+            if zoom > MAX_ZOOM or not (0 <= x < 2 ** zoom and 0 <= y < 2 ** zoom):
+                return jsonify({"error": "Tuile inexistante."}), 404
+
+            etag = self._data_etag(["gpx_data"], session_id)
+            if request.if_none_match.contains_weak(etag):
+                return not_modified(etag)
+            return self._simplified_trace_response(session_id, zoom, None, tile_bbox(zoom, x, y), stream_format, etag)
+
+        @app.route('/api/sensor-gps', methods=['GET'])
+        def get_sensor_gps():
+            """
+            Mesures IMU et relevés GPS alignés sur Timer côté serveur (jointure « asof », voir timeline_join.py).
+            Paramètres optionnels :
+              - mode : 'samples' (par défaut, une ligne par mesure avec sa position et sa vitesse)
+                ou 'fixes' (une ligne par relevé GPS avec le nombre, la moyenne, le min et le max des mesures)
+              - direction : relevé 'previous' (par défaut), 'nearest' ou 'next'
+              - tolerance : écart maximal (ms) entre une mesure et son relevé
+              - session, start / end : bornes (incluses) sur Timer
+              - max_points, method : sous-échantillonnage des mesures (mode 'samples'), comme pour /api/sensor-data
+            """
+            try:
+                start = parse_optional_int(request.args.get('start'))
+                end = parse_optional_int(request.args.get('end'))
+                max_points = parse_optional_int(request.args.get('max_points'))
+                session_id = parse_optional_int(request.args.get('session'))
+                tolerance = parse_optional_int(request.args.get('tolerance'))
+            except ValueError:
+                return jsonify({"error": "Les paramètres start, end, max_points, session et tolerance doivent être des entiers."}), 400
+
+            mode = request.args.get('mode', 'samples')
+            if mode not in JOIN_MODES:
+                return jsonify({"error": f"Mode inconnu : {mode}"}), 400
+            direction = request.args.get('direction', 'previous')
+            if direction not in ASOF_DIRECTIONS:
+                return jsonify({"error": f"Direction inconnue : {direction}"}), 400
+            if tolerance is None:
+                tolerance = DEFAULT_TOLERANCE_MS
+            if tolerance < 0:
+                return jsonify({"error": "tolerance doit être positif ou nul."}), 400
+            method = request.args.get('method', 'lttb')
+            if method not in DOWNSAMPLING_METHODS:
+                return jsonify({"error": f"Méthode inconnue : {method}"}), 400
+            if max_points is not None and max_points < 3:
+                return jsonify({"error": "max_points doit être supérieur ou égal à 3."}), 400
+            stream_format = request.args.get('format', 'json')
+            if stream_format not in STREAM_FORMATS:
+                return jsonify({"error": f"Format inconnu : {stream_format}"}), 400
+
+            etag = self._data_etag(["sensor_data", "gpx_data"], session_id)
+            if request.if_none_match.contains_weak(etag):
+                return not_modified(etag)
+
+            def widen(bound, margin):
+                return None if bound is None else bound + margin
+
+            imu_columns = ["Timer"] + IMU_JOIN_COLUMNS
+            gps_columns = ["Timer"] + GPS_JOIN_COLUMNS
+            if mode == 'samples':
+                # Relevés jusqu'à `tolerance` ms autour de la plage : ceux d'avant `start` comptent aussi
+                samples = self.db_manager.read_sensor_columns(imu_columns, start, end, session_id)
+                if max_points is not None and len(samples["Timer"]) > max_points:
+                    table = np.nan_to_num(np.column_stack([samples[name] for name in imu_columns]))
+                    indices = downsample_indices(table[:, 0], table[:, 1:], max_points, method)
+                    samples = {name: values[indices] for name, values in samples.items()}
+                fixes = self.db_manager.read_gps_fixes(
+                    gps_columns, widen(start, -tolerance), widen(end, tolerance), session_id
+                )
+                result = join_samples(samples, fixes, direction, tolerance)
+            else:
+                # Mesures à moins de `tolerance` ms des relevés de la plage, et relevés concurrents pour ces mesures
+                samples = self.db_manager.read_sensor_columns(
+                    imu_columns, widen(start, -tolerance), widen(end, tolerance), session_id
+                )
+                fixes = self.db_manager.read_gps_fixes(
+                    gps_columns, widen(start, -2 * tolerance), widen(end, 2 * tolerance), session_id
+                )
+                result = clip_timer_range(aggregate_by_fix(samples, fixes, IMU_JOIN_COLUMNS, direction, tolerance),
+                                          start, end)
+
+            record_rows(len(result["Timer"]))
+            return with_etag(streaming_response(column_records([result], list(result)), stream_format), etag)
 
 
         # Catch all route to redirect to Vue.js frontend
@@ -117,13 +542,14 @@ class Server:
             vue_port = int(get_vue_port())
             return redirect(f"http://127.0.0.1:{vue_port}/{path}", code=307)
 
-        # Route to calculate altitude using Open Elevation API
+        # Route to calculate altitude (local DEM tiles, Open Elevation API as fallback)
         @app.route('/api/calculate-altitude', methods=['POST'])
         def calculate_altitude():
             """
-            Calcule les altitudes pour les points GPS fournis en utilisant l'API Open Elevation.
+            Calcule les altitudes pour les points GPS fournis à partir des tuiles d'élévation locales (.hgt).
             Les données GPS doivent être envoyées sous forme de liste de points GPS, chaque point contenant les clés "Latitude", "Longitude" et "Timer".
-            ATTENTION : Cette route nécessite une connexion Internet pour fonctionner. L'API Open Elevation peut être sujette à des blocages ou des limitations.
+            Les points hors des tuiles disponibles sont demandés à l'API Open Elevation si le recours est activé
+            (connexion Internet nécessaire) ; sinon leur altitude est null.
             """
             try:
                 data = request.get_json()  # Récupère les données envoyées dans la requête
@@ -138,34 +564,30 @@ class Server:
                     if "Latitude" not in point or "Longitude" not in point or "Timer" not in point:
                         return jsonify({"error": "Missing required keys in GPS points"}), 400
 
-                # Préparer les données pour l'API Open Elevation
-                locations = [{"latitude": point["Latitude"], "longitude": point["Longitude"]} for point in gps_points]
-
-                # Envoyer une requête POST à l'API Open Elevation
-                response = requests.post(
-                    OPEN_ELEVATION_API_URL,
-                    json={"locations": locations},
-                    timeout=10  # Timeout de 10 secondes pour éviter les blocages
-                )
-
-                if response.status_code != 200:
-                    return jsonify({"error": "Failed to fetch altitude data from Open Elevation API"}), 502
-
-                elevation_data = response.json().get("results", [])
+                latitude = np.array([point["Latitude"] for point in gps_points], dtype=np.float64)
+                longitude = np.array([point["Longitude"] for point in gps_points], dtype=np.float64)
+                altitude = self.elevation_provider.elevations(latitude, longitude)
+
+                # Points non couverts par les tuiles : recours à l'API Open Elevation
+                missing = np.flatnonzero(np.isnan(altitude))
+                if len(missing) and self.remote_elevation:
+                    try:
+                        remote = fetch_remote_elevations(latitude[missing].tolist(), longitude[missing].tolist())
+                        if len(remote) == len(missing):
+                            altitude[missing] = remote
+                    except requests.exceptions.RequestException as e:
+                        print(f"API Open Elevation indisponible : {e}")
+                        if len(missing) == len(gps_points):
+                            return jsonify({"error": f"Request to Open Elevation API failed: {str(e)}"}), 502
 
                 # Construire la réponse contenant les altitudes avec les timers correspondants
                 altitudes = [
-                    {
-                        "Timer": gps_points[i]["Timer"],
-                        "Altitude": elevation_data[i].get("elevation", 0)
-                    }
-                    for i in range(len(elevation_data))
+                    {"Timer": point["Timer"], "Altitude": None if np.isnan(value) else float(value)}
+                    for point, value in zip(gps_points, altitude.tolist())
                 ]
 
                 return jsonify(altitudes), 200
 
-            except requests.exceptions.RequestException as e:
-                return jsonify({"error": f"Request to Open Elevation API failed: {str(e)}"}), 500
             except Exception as e:
                 return jsonify({"error": str(e)}), 500
 
@@ -248,9 +670,12 @@ class Server:
                         # Ouvrir le fichier en mode 'w' pour vider son contenu
                         with open(temp_file_path, mode='w', newline='') as file:
                             file.write("")  # Effacer tout le contenu du fichier
+                        # Le prochain chargement repart du début du fichier, dans une nouvelle session
+                        self.csv_ingester.reset()
                         print(f"Le fichier {temp_file_path} a été vidé avec succès.")
                         return jsonify({"message": "Fichier vidé avec succès."}), 200
                     else:
+                        self.csv_ingester.reset()
                         return jsonify({"message": "Le fichier est déjà vide."}), 200
                 else:
                     return jsonify({"error": "Fichier non trouvé."}), 404
@@ -263,24 +688,82 @@ class Server:
         # Endpoint pour recevoir un fichier CSV
         @app.route('/api/upload-csv', methods=['POST'])
         def upload_csv():
-            if 'file' not in request.files:
+            """
+            Reçoit un fichier CSV (champ 'file', champs optionnels 'name' et 'course_id') et l'insère
+            au fil de la réception, sans fichier temporaire, comme une nouvelle session.
+            Avec ?upload_id=..., la progression est consultable sur /api/upload-csv/progress/<upload_id>.
+            """
+            boundary = request.mimetype_params.get('boundary')
+            if request.mimetype != 'multipart/form-data' or not boundary:
                 return jsonify({"error": "Aucun fichier envoyé."}), 400
 
-            file = request.files['file']
-            print(f"Fichier reçu : {file.filename}")
+            progress = start_progress(request.args.get('upload_id'), request.content_length, self.state_db_name)
+            upload = StreamingCsvUpload(self.db_name, progress)
+            duplicates = []
+
+            def parse_course_id(upload):
+                try:
+                    return parse_optional_int(upload.fields.get('course_id'))
+                except ValueError:
+                    raise ValueError("Le paramètre course_id doit être un entier.")
+
+            def open_session(upload):
+                print(f"Fichier reçu : {upload.filename}")
+                return self.user_db_manager.create_session(
+                    name=upload.fields.get('name') or upload.filename,
+                    course_id=parse_course_id(upload), source_file=upload.filename
+                )
 
-            # Sauvegarde du fichier dans un dossier temporaire
-            csv_file_path = os.path.join(os.getcwd(), "uploaded_esp32_data.csv")
-            file.save(csv_file_path)
+            def keep(upload):
+                # Tous les champs sont reçus : course_id peut avoir été envoyé après le fichier
+                upload.fields['course_id'] = parse_course_id(upload)
+                # Un fichier identique à une session déjà importée n'est pas enregistré une deuxième fois
+                existing = self.user_db_manager.find_session_by_hash(upload.content_hash)
+                if existing:
+                    duplicates.append(existing)
+                    return False
+                return True
 
-            # Charger le fichier CSV dans la base de données
             try:
-                load_csv_file_to_database(csv_file_path=csv_file_path)
-                return jsonify({"message": "Fichier CSV chargé dans la base de données avec succès."}), 200
+                stored = upload.run(request.stream, boundary.encode('latin-1'), open_session, keep)
             except Exception as e:
-                return jsonify({"error": f"Erreur lors du chargement du fichier CSV : {str(e)}"}), 500
+                progress.finish(error=str(e))
+                if upload.session_id is not None:
+                    self.user_db_manager.delete_session(upload.session_id)
+                print(f"Erreur lors du chargement du fichier CSV : {e}")
+                status = 400 if isinstance(e, ValueError) else 503 if isinstance(e, PoolTimeout) else 500
+                return jsonify({"error": f"Erreur lors du chargement du fichier CSV : {str(e)}"}), status
+
+            progress.finish()
+            if not stored:
+                self.user_db_manager.delete_session(upload.session_id)
+                print(f"Fichier déjà importé dans la session {duplicates[0]['id']}, chargement ignoré.")
+                return jsonify({
+                    "message": "Fichier déjà chargé dans la base de données.", "session": duplicates[0],
+                    "duplicate": True, "upload": progress.as_dict()
+                }), 200
+
+            self.user_db_manager.set_session_row_count(upload.session_id, upload.rows, upload.content_hash)
+            # Tracé simplifié pour tous les zooms, calculé une fois au chargement
+            self.gps_trace_cache.get(upload.session_id)
+            if upload.fields['course_id'] is not None:
+                self.user_db_manager.attach_session_to_course(upload.session_id, upload.fields['course_id'])
+            return jsonify({
+                "message": "Fichier CSV chargé dans la base de données avec succès.",
+                "session": self.user_db_manager.get_session(upload.session_id),
+                "duplicate": False, "upload": progress.as_dict()
+            }), 200
+
+        @app.route('/api/upload-csv/progress/<upload_id>', methods=['GET'])
+        def upload_csv_progress(upload_id):
+            """
+            Progression d'un envoi en cours : octets reçus, lignes lues.
+            """
+            progress = get_progress(upload_id, self.state_db_name)
+            if progress is None:
+                return jsonify({"error": "Envoi inconnu."}), 404
+            return jsonify(progress)
 
-        
         @app.route('/api/receive-bluetooth-data', methods=['POST'])
         def receive_bluetooth_data():
             try:
@@ -300,8 +783,8 @@ class Server:
                 project_root = os.getcwd()  # Chemin racine du projet
                 temp_file_path = os.path.join(project_root, "esp32_data.csv")  # Fichier directement dans la racine
 
-                # Vérifier si le fichier existe déjà
-                file_exists = os.path.isfile(temp_file_path)
+                # Vérifier si le fichier existe déjà (un fichier vidé par /api/clear-csv n'a plus d'en-tête)
+                file_exists = os.path.isfile(temp_file_path) and os.path.getsize(temp_file_path) > 0
                 
                 with open(temp_file_path, mode='a', newline='') as file:
                     writer = csv.DictWriter(file, fieldnames=headers, delimiter=";")
@@ -352,39 +835,93 @@ class Server:
                 user_id = data.get('userId')
                 file_name = data.get('file_name')
                 uploaded_at = data.get('uploaded_at')
-
                 if not user_id or not file_name or not uploaded_at:
                     return jsonify({"error": "Données manquantes pour l'enregistrement."}), 400
+                try:
+                    session_id = parse_optional_int(data.get('session_id'))
+                except (TypeError, ValueError):
+                    return jsonify({"error": "Le champ session_id doit être un entier."}), 400
 
-                # Connexion à la base de données
-                conn = sqlite3.connect("user_data.db")
-                cursor = conn.cursor()
+                course_id = self.user_db_manager.save_course(user_id, file_name, uploaded_at, session_id)
 
-                # Création de la table courses si elle n'existe pas
-                cursor.execute('''
-                    CREATE TABLE IF NOT EXISTS courses (
-                        id INTEGER PRIMARY KEY AUTOINCREMENT,
-                        user_id TEXT,
-                        file_name TEXT,
-                        uploaded_at TEXT
-                    )
-                ''')
+                return jsonify({"message": "Course enregistrée avec succès.", "course_id": course_id}), 201
 
-                # Insertion des données de la course
-                cursor.execute('''
-                    INSERT INTO courses (user_id, file_name, uploaded_at)
-                    VALUES (?, ?, ?)
-                ''', (user_id, file_name, uploaded_at))
+            except Exception as e:
+                return jsonify({"error": f"Erreur lors de l'enregistrement : {str(e)}"}), 500
 
-                conn.commit()
-                conn.close()
 
-                return jsonify({"message": "Course enregistrée avec succès."}), 201
 
+        @app.route('/api/sessions', methods=['GET'])
+        def get_sessions():
+            """
+            Liste des sessions importées (toutes, ou celles des courses de l'utilisateur `userId`).
+            """
+            return jsonify(self.user_db_manager.get_sessions(request.args.get('userId')))
+
+        @app.route('/api/sessions/<int:session_id>', methods=['GET'])
+        def get_session(session_id):
+            session = self.user_db_manager.get_session(session_id)
+            if session is None:
+                return jsonify({"error": "Session introuvable."}), 404
+            return jsonify(session)
+
+        @app.route('/api/sessions/<int:session_id>', methods=['DELETE'])
+        def delete_session(session_id):
+            """
+            Supprime une session et toutes ses mesures.
+            """
+            if self.user_db_manager.get_session(session_id) is None:
+                return jsonify({"error": "Session introuvable."}), 404
+            try:
+                deleted = DatabaseManager(self.db_name).delete_session_rows(session_id)
+                self.gait_cache.delete(session_id)
+                self.orientation_cache.delete(session_id)
+                self.gps_trace_cache.delete(session_id)
+                self.user_db_manager.delete_session(session_id)
             except Exception as e:
-                return jsonify({"error": f"Erreur lors de l'enregistrement : {str(e)}"}), 500
+                print(f"Erreur lors de la suppression de la session {session_id} : {e}")
+                return jsonify({"error": str(e)}), 500
+            return jsonify({"message": "Session supprimée.", "deleted_rows": deleted}), 200
 
+        @app.route('/api/generate-pdf', methods=['GET'])
+        def generate_pdf():
+            """
+            Rapport PDF d'une course (file_name) ou d'une session (session).
+            Renvoie le PDF s'il est déjà en cache pour ces données, sinon lance sa génération
+            en tâche de fond (202) : il suffit de rappeler la route une fois le travail terminé.
+            """
+            file_name = request.args.get('file_name')
+            user_id = request.args.get('userId')
+            try:
+                session_id = parse_optional_int(request.args.get('session'))
+            except ValueError:
+                return jsonify({"error": "Le paramètre session doit être un entier."}), 400
+
+            if session_id is not None:
+                session = self.user_db_manager.get_session(session_id)
+            elif file_name:
+                session = self.user_db_manager.find_session_for_course(file_name, user_id)
+            else:
+                return jsonify({"error": "Paramètre file_name ou session manquant."}), 400
+            if session is None:
+                return jsonify({
+                    "error": "Aucune session enregistrée pour cette course : chargez le fichier CSV des mesures "
+                             "(page Bluetooth) puis enregistrez la course pour pouvoir générer son rapport."
+                }), 404
+
+            title = file_name or session["name"] or f"Session {session['id']}"
+            key = report_key(self.db_name, session["id"], title)
+            report_file = self.report_cache.open(key)
+            if report_file is not None:
+                return send_file(
+                    report_file, mimetype='application/pdf', as_attachment=True, download_name=f"{title}.pdf"
+                )
 
+            return self._submit_job(
+                "generate-pdf", build_session_report, self.db_name, session["id"], title,
+                self.report_cache.cache_dir, self.report_cache.max_bytes, key,
+                key=key, message="Génération du rapport lancée."
+            )
 
         @app.route('/api/get-courses', methods=['GET'])
         def get_courses():
@@ -392,14 +929,7 @@ class Server:
             if not user_id:
                 return jsonify({"error": "ID utilisateur manquant."}), 400
 
-            conn = sqlite3.connect("user_data.db")
-            cursor = conn.cursor()
-
-            cursor.execute('''
-                SELECT file_name, uploaded_at FROM courses WHERE user_id = ?
-            ''', (user_id,))
-            rows = cursor.fetchall()
-            conn.close()
+            rows = self.user_db_manager.get_course_files(user_id)
 
             courses = [{"file_name": row[0], "uploaded_at": row[1]} for row in rows]
             return jsonify(courses)
@@ -417,11 +947,11 @@ class Server:
                 if not os.path.isfile(csv_file_path):
                     return jsonify({"error": "Fichier CSV non trouvé."}), 404
 
-                # Charger les données du fichier CSV dans la base de données
-                load_csv_file_to_database(csv_file_path=csv_file_path)
-
-                print(f"Le fichier CSV {csv_file_path} a été chargé dans la base de données.")
-                return jsonify({"message": "Fichier CSV chargé avec succès dans la base de données."}), 200
+                # Charger en tâche de fond uniquement les lignes ajoutées depuis le dernier chargement
+                return self._submit_job(
+                    "load-csv-to-db", ingest_csv_file, self.db_name, csv_file_path, self.user_db_manager.db_name,
+                    key=csv_file_path, message="Chargement du fichier CSV dans la base de données lancé."
+                )
 
             except Exception as e:
                 print(f"Erreur lors du chargement du fichier CSV dans la base de données : {e}")
@@ -429,57 +959,31 @@ class Server:
 
         @app.route('/api/upload-gpx', methods=['POST'])
         def upload_gpx():
+            """
+            Lance l'analyse d'un fichier GPX en tâche de fond (écriture de gps_data.csv).
+            Répond tout de suite avec le travail à suivre sur /api/jobs/<id>.
+            """
             if 'file' not in request.files:
                 return jsonify({"error": "Aucun fichier GPX envoyé."}), 400
 
             file = request.files['file']
             gpx_data = file.read().decode('utf-8')
 
+            # Paramètres du calcul de vitesse (méthode de distance et lissage)
+            method = request.form.get('distance_method', 'vincenty')
             try:
-                # Analyse du fichier GPX
-                gpx = gpxpy.parse(gpx_data)
-
-                # Préparer les données pour le fichier CSV dédié aux données GPS
-                data = []
-                previous_point = None
-                for track in gpx.tracks:
-                    for segment in track.segments:
-                        for point in segment.points:
-                            if previous_point:
-                                # Calculer la distance et la vitesse entre les points
-                                current_coords = (point.latitude, point.longitude)
-                                previous_coords = (previous_point.latitude, previous_point.longitude)
-                                distance_km = geodesic(previous_coords, current_coords).km
-                                time_diff_h = (point.time - previous_point.time).total_seconds() / 3600 if point.time and previous_point.time else 0
-                                speed_kmh = distance_km / time_diff_h if time_diff_h > 0 else 0
-                                pace_min_km = (60 / speed_kmh) if speed_kmh > 0 else 0
-                            else:
-                                speed_kmh = 0
-                                pace_min_km = 0
-
-                            data.append({
-                                "Timer": point.time.timestamp() if point.time else "",
-                                "Latitude": point.latitude,
-                                "Longitude": point.longitude,
-                                "Altitude": point.elevation,
-                                "Vitesse": speed_kmh,
-                                "Allure": pace_min_km,
-                            })
-                            previous_point = point
-
-                # Sauvegarder les données GPS dans un fichier dédié
-                gps_csv_file_path = os.path.join(os.getcwd(), "gps_data.csv")
-                with open(gps_csv_file_path, mode='w', newline='') as csv_file:
-                    writer = csv.DictWriter(csv_file, fieldnames=["Timer", "Latitude", "Longitude", "Altitude", "Vitesse", "Allure"], delimiter=";")
-                    writer.writeheader()
-                    writer.writerows(data)
-
-                print(f"Données GPS enregistrées dans le fichier : {gps_csv_file_path}")
-                return jsonify({"message": "Données GPX chargées et sauvegardées dans gps_data.csv.", "file_path": gps_csv_file_path}), 200
+                smoothing = parse_optional_int(request.form.get('smoothing')) or 0
+            except ValueError:
+                return jsonify({"error": "Le paramètre smoothing doit être un entier."}), 400
+            if method not in DISTANCE_METHODS:
+                return jsonify({"error": f"Paramètre 'distance_method' invalide (valeurs possibles : {', '.join(DISTANCE_METHODS)})."}), 400
 
-            except Exception as e:
-                print(f"Erreur lors de l'analyse du fichier GPX : {e}")
-                return jsonify({"error": f"Erreur lors de l'analyse du fichier GPX : {str(e)}"}), 500
+            gps_csv_file_path = os.path.join(os.getcwd(), "gps_data.csv")
+            key = (hashlib.sha256(gpx_data.encode('utf-8')).hexdigest(), method, smoothing)
+            return self._submit_job(
+                "upload-gpx", write_gps_csv, gpx_data, gps_csv_file_path, method, smoothing, key=key,
+                message="Analyse du fichier GPX lancée."
+            )
 
         @app.route('/api/gps-data', methods=['GET'])
         def get_gps_data():
@@ -489,24 +993,86 @@ class Server:
             if not os.path.isfile(gps_csv_file_path):
                 return jsonify({"error": "Fichier gps_data.csv non trouvé."}), 404
 
+            stream_format = request.args.get('format', 'json')
+            if stream_format not in STREAM_FORMATS:
+                return jsonify({"error": f"Format inconnu : {stream_format}"}), 400
+            # zoom / tolerance / bbox : tracé simplifié, comme pour /api/gps-trace
             try:
-                with open(gps_csv_file_path, mode='r', newline='') as csv_file:
-                    reader = csv.DictReader(csv_file, delimiter=";")
-                    data = [row for row in reader]
-                return jsonify(data), 200
+                zoom, tolerance, bbox = parse_simplification(request.args)
+            except ValueError:
+                return jsonify({"error": SIMPLIFICATION_ERROR}), 400
+
+            try:
+                if zoom is None and tolerance is None and bbox is None:
+                    return streaming_response(csv_records(gps_csv_file_path), stream_format), 200
+
+                rows = list(csv_records(gps_csv_file_path))
+                latitude = np.array([float(row['Latitude']) for row in rows])
+                longitude = np.array([float(row['Longitude']) for row in rows])
+                if rows and 'Importance' in rows[0]:
+                    importance = np.array([float(row['Importance']) for row in rows])
+                else:
+                    # Fichier écrit avant l'ajout de la colonne Importance
+                    importance = trace_importance(latitude, longitude)
+                indices, segments, tolerance = simplify_trace(latitude, longitude, importance, zoom, tolerance, bbox)
+                records = [rows[index] for index in indices.tolist()]
+                if segments is not None:
+                    for record, segment in zip(records, segments.tolist()):
+                        record['Segment'] = segment
+                response = streaming_response(records, stream_format)
+                response.headers["X-Trace-Tolerance"] = f"{tolerance:.2f}"
+                return response, 200
             except Exception as e:
                 return jsonify({"error": f"Erreur lors de la lecture du fichier GPS : {str(e)}"}), 500
 
 
 
-    def run(self, port=None):
+    def run(self, port=None, debug=False, host="127.0.0.1"):
+        """
+        Serveur de développement Werkzeug (un seul processus). Le débogueur n'est activé qu'avec debug=True.
+        """
         if port is None:
             port = int(os.environ.get("FLASK_RUN_PORT", 5000))
         self._initialize_database()
         print(f"Starting Flask server on port {port}...")
-        self.app.run(debug=True, port=port, use_reloader=False)
+        self.app.run(host=host, debug=debug, port=port, use_reloader=False, threaded=True)
+
+
+def initialize_databases(db_name="sensor_data.db", user_db_name="user_data.db"):
+    """
+    Crée les tables une seule fois, avant le lancement des processus du serveur de production.
+    """
+    DatabaseManager(db_name).initialize_database()
+    UserDatabaseManager(user_db_name)
+    close_all_pools()
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Serveur Flask ProAdapt")
+    parser.add_argument("--port", type=int, default=int(os.environ.get("FLASK_RUN_PORT", 5000)))
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS, help="Nombre de processus")
+    parser.add_argument("--threads", type=int, default=DEFAULT_THREADS, help="Nombre de threads par processus")
+    parser.add_argument("--debug", action="store_true", default=os.environ.get("PROADAPT_DEBUG") == "1",
+                        help="Serveur de développement Werkzeug avec le débogueur")
+    parser.add_argument("--profiling", default=os.environ.get("PROADAPT_PROFILING", "off"),
+                        help="Profilage des requêtes : off, header (en-tête X-Profile: 1) ou proportion (ex. 0.01)")
+    args = parser.parse_args()
+
+    def create_server():
+        return Server(profiling=args.profiling)
+
+    if args.debug:
+        create_server().run(port=args.port, debug=True)
+    elif gunicorn_available():
+        run_production(create_server, host=args.host, port=args.port, workers=args.workers, threads=args.threads,
+                       on_starting=initialize_databases)
+    else:
+        print("gunicorn n'est pas installé (pip install gunicorn) : serveur Werkzeug multi-thread, sans débogueur.")
+        create_server().run(port=args.port, host=args.host)
 
 
 if __name__ == "__main__":
-    server = Server()
-    server.run()
\ No newline at end of file
+    main()
@@ -0,0 +1,93 @@
+# Serveur de production : gunicorn, plusieurs processus et plusieurs threads par processus
+#
+# Chaque processus (worker) crée sa propre instance de Server après le fork : il a ses
+# propres connexions SQLite et son propre pool de tâches de fond. L'état partagé entre les
+# processus (travaux, progression des envois, caches) est dans la base ou sur le disque.
+# Les métriques de chaque worker sont écrites dans un dossier commun (PROADAPT_METRICS_DIR,
+# temporaire par défaut) pour que /api/metrics additionne tous les processus (voir metrics.py).
+# SIGTERM / SIGINT : le serveur n'accepte plus de connexions et laisse GRACEFUL_TIMEOUT
+# secondes aux requêtes en cours pour se terminer.
+
+import importlib.util
+import os
+import shutil
+import tempfile
+
+from metrics import METRICS_DIRECTORY_ENV
+
+# Nombre de processus (variable d'environnement PROADAPT_WORKERS)
+DEFAULT_WORKERS = int(os.environ.get("PROADAPT_WORKERS", min(4, os.cpu_count() or 1)))
+
+# Nombre de threads par processus (variable d'environnement PROADAPT_THREADS)
+DEFAULT_THREADS = int(os.environ.get("PROADAPT_THREADS", 8))
+
+# Délai (s) laissé aux requêtes en cours à l'arrêt
+GRACEFUL_TIMEOUT = 30
+
+# Délai (s) au-delà duquel une requête bloquée fait redémarrer son worker
+# (les envois et les flux longs doivent tenir dans ce délai)
+WORKER_TIMEOUT = 300
+
+
+def gunicorn_available():
+    return importlib.util.find_spec("gunicorn") is not None
+
+
+def run_production(server_factory, host="127.0.0.1", port=5000, workers=DEFAULT_WORKERS,
+                   threads=DEFAULT_THREADS, on_starting=None):
+    """
+    Lance gunicorn (bloquant jusqu'à l'arrêt).
+
+    :param server_factory: Fonction sans argument qui crée le Server d'un worker
+    :param on_starting: Fonction appelée une fois dans le processus principal avant le lancement
+                        des workers (initialisation de la base)
+    """
+    from gunicorn.app.base import BaseApplication
+
+    servers = {}
+    # Dossier des métriques partagé par les workers (supprimé à l'arrêt s'il a été créé ici)
+    temporary_metrics = None
+    if not os.environ.get(METRICS_DIRECTORY_ENV):
+        temporary_metrics = tempfile.mkdtemp(prefix="proadapt-metrics-")
+        os.environ[METRICS_DIRECTORY_ENV] = temporary_metrics
+
+    def post_worker_init(worker):
+        print(f"Worker {worker.pid} prêt.")
+
+    def worker_exit(arbiter, worker):
+        # Arrêt propre du worker : tâches de fond et connexions
+        server = servers.pop(os.getpid(), None)
+        if server is not None:
+            server.close()
+
+    class ProductionApplication(BaseApplication):
+        def load_config(self):
+            options = {
+                "bind": f"{host}:{port}",
+                "workers": workers,
+                "threads": threads,
+                "worker_class": "gthread",
+                "graceful_timeout": GRACEFUL_TIMEOUT,
+                "timeout": WORKER_TIMEOUT,
+                "accesslog": "-",
+                "post_worker_init": post_worker_init,
+                "worker_exit": worker_exit,
+            }
+            if on_starting is not None:
+                options["on_starting"] = lambda arbiter: on_starting()
+            for name, value in options.items():
+                self.cfg.set(name, value)
+
+        def load(self):
+            server = server_factory()
+            servers[os.getpid()] = server
+            return server.app
+
+    print(f"Serveur de production sur {host}:{port} ({workers} processus x {threads} threads)")
+    arbiter_pid = os.getpid()
+    try:
+        ProductionApplication().run()
+    finally:
+        # Les workers sortent aussi par ici (SystemExit après le fork) : seul le processus principal nettoie
+        if temporary_metrics is not None and os.getpid() == arbiter_pid:
+            shutil.rmtree(temporary_metrics, ignore_errors=True)
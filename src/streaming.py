@@ -0,0 +1,136 @@
+# Réponses HTTP en flux pour les routes qui renvoient beaucoup de lignes
+
+import csv
+import json
+
+from flask import Response
+
+from chunk_storage import python_values
+from db_connection import ConnectionIterator, get_stream_pool
+from instrumentation import count_rows
+
+# Nombre de lignes lues à chaque fetchmany
+FETCH_BATCH_SIZE = 2000
+
+STREAM_FORMATS = {
+    "json": "application/json",
+    "ndjson": "application/x-ndjson",
+}
+
+
+def iterate_cursor(cursor, batch_size=FETCH_BATCH_SIZE):
+    """
+    Parcourt le résultat d'une requête par paquets de `batch_size` lignes.
+    """
+    while True:
+        rows = cursor.fetchmany(batch_size)
+        if not rows:
+            break
+        yield from rows
+
+
+def query_records(db_name, query, params, columns, row_filter=None, batch_size=FETCH_BATCH_SIZE):
+    """
+    Exécute la requête et retourne un générateur produisant un dictionnaire par ligne,
+    sans tout charger en mémoire.
+
+    La requête est exécutée immédiatement pour que les erreurs SQL (et PoolTimeout) remontent
+    avant l'envoi de la réponse. La connexion, prise dans le pool des flux (voir get_stream_pool),
+    y est rendue à la fin du parcours ou à la fermeture de la réponse (voir ConnectionIterator).
+    """
+    pool = get_stream_pool(db_name)
+    conn = pool.acquire()
+    try:
+        cursor = conn.execute(query, params)
+    except Exception:
+        pool.release(conn)
+        raise
+    return ConnectionIterator(pool, conn, _records_from_cursor(cursor, columns, row_filter, batch_size))
+
+
+def _records_from_cursor(cursor, columns, row_filter, batch_size):
+    try:
+        for row in iterate_cursor(cursor, batch_size):
+            if row_filter is None or row_filter(row):
+                yield dict(zip(columns, row))
+    finally:
+        cursor.close()
+
+
+def column_records(chunks, columns):
+    """
+    Générateur d'un dictionnaire par ligne à partir de paquets de colonnes NumPy
+    (voir DatabaseManager.iterate_sensor_columns).
+    """
+    for chunk in chunks:
+        for row in zip(*(python_values(chunk[name]) for name in columns)):
+            yield dict(zip(columns, row))
+
+
+def csv_records(csv_file_path, delimiter=";"):
+    """
+    Ouvre un fichier CSV et retourne un générateur de dictionnaires (une ligne à la fois).
+    Le fichier est ouvert immédiatement pour que les erreurs remontent avant la réponse.
+    """
+    csv_file = open(csv_file_path, mode='r', newline='')
+    return _records_from_csv_file(csv_file, delimiter)
+
+
+def _records_from_csv_file(csv_file, delimiter):
+    with csv_file:
+        yield from csv.DictReader(csv_file, delimiter=delimiter)
+
+
+def encode_json_array(records, batch_size=FETCH_BATCH_SIZE):
+    """
+    Encode les enregistrements en un tableau JSON, envoyé par morceaux.
+    """
+    separators = (",", ":")
+    buffer = ["["]
+    first = True
+    for record in records:
+        if not first:
+            buffer.append(",")
+        buffer.append(json.dumps(record, separators=separators))
+        first = False
+        if len(buffer) >= batch_size:
+            yield "".join(buffer)
+            buffer = []
+    buffer.append("]")
+    yield "".join(buffer)
+
+
+def encode_ndjson(records, batch_size=FETCH_BATCH_SIZE):
+    """
+    Encode les enregistrements en NDJSON (un objet JSON par ligne).
+    """
+    separators = (",", ":")
+    buffer = []
+    for record in records:
+        buffer.append(json.dumps(record, separators=separators))
+        buffer.append("\n")
+        if len(buffer) >= batch_size:
+            yield "".join(buffer)
+            buffer = []
+    if buffer:
+        yield "".join(buffer)
+
+
+def streaming_response(records, stream_format="json"):
+    """
+    Construit une réponse Flask en flux à partir d'un itérable de dictionnaires.
+
+    :param records: Itérable de dictionnaires (générateur de préférence) ; sa méthode close(),
+                    s'il en a une, est appelée à la fermeture de la réponse, même jamais lue
+    :param stream_format: 'json' (tableau JSON) ou 'ndjson'
+    """
+    close = getattr(records, "close", None)
+    counted = count_rows(records)
+    if stream_format == "ndjson":
+        body = encode_ndjson(counted)
+    else:
+        body = encode_json_array(counted)
+    response = Response(body, mimetype=STREAM_FORMATS[stream_format])
+    if close is not None:
+        response.call_on_close(close)
+    return response
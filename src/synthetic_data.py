@@ -0,0 +1,207 @@
+# Génération de sessions ESP32 synthétiques pour les benchmarks et les essais de charge
+#
+# Les lignes ont les 21 colonnes de esp32_data.csv (séparateur ';') : IMU des deux jambes
+# (accéléromètre et gyroscope bruts en int16, la gravité vaut 16384 sur l'axe Z), flexion du
+# genou, puis les colonnes GPS, renseignées une fois par seconde seulement (GPS_PERIOD_MS) et
+# vides sur les autres lignes, comme pour le module GPS réel.
+# Le signal suit une foulée de course : les deux jambes sont en opposition de phase, un pic
+# d'accélération marque chaque impact. Le tracé GPS est une boucle parcourue à vitesse
+# constante autour de DEFAULT_ORIGIN.
+# La génération se fait par paquets de `chunk_size` lignes (NumPy) : la mémoire utilisée ne
+# dépend pas de la taille de la session, on peut produire des dizaines de millions de lignes.
+#
+# Utilisation (depuis le dossier src) :
+#     python synthetic_data.py session.csv --rows 1000000 [--seed 0] [--gpx trace.gpx]
+
+import argparse
+import csv
+import time
+from datetime import datetime, timezone
+
+import numpy as np
+
+from database_manager import ESP32_CSV_HEADERS
+
+# Période d'échantillonnage de l'IMU (ms) et du GPS (ms)
+SAMPLE_PERIOD_MS = 25
+GPS_PERIOD_MS = 1000
+
+# Départ du tracé GPS (campus Pierre et Marie Curie)
+DEFAULT_ORIGIN = (48.845413, 2.357096)
+
+# Allure simulée : cadence (foulées par seconde et par jambe) et vitesse (km/h)
+STRIDE_FREQUENCY = 1.4
+RUNNING_SPEED_KMH = 10.0
+
+# Longueur de la boucle parcourue (m)
+LOOP_LENGTH_M = 2000.0
+
+DEFAULT_CHUNK_SIZE = 100000
+
+GRAVITY_LSB = 16384
+INT16_MIN, INT16_MAX = -32768, 32767
+
+EARTH_RADIUS_M = 6371008.8
+
+
+def _int16(values):
+    return np.clip(np.rint(values), INT16_MIN, INT16_MAX).astype(np.int64)
+
+
+def _leg_signals(phase, rng):
+    """
+    Accéléromètre et gyroscope (6 colonnes) d'une jambe pour des phases de foulée (radians).
+    """
+    count = len(phase)
+    swing = np.sin(phase)
+    # Impact au contact du pied : pic bref au début de chaque cycle
+    impact = np.exp(-((np.mod(phase, 2 * np.pi)) / 0.25) ** 2) * 22000
+    accel_x = 6000 * swing + impact + rng.normal(0, 400, count)
+    accel_y = 1500 * np.sin(2 * phase) + rng.normal(0, 300, count)
+    accel_z = GRAVITY_LSB + 4000 * np.cos(phase) + 0.5 * impact + rng.normal(0, 400, count)
+    gyro_x = 300 * np.sin(2 * phase) + rng.normal(0, 40, count)
+    gyro_y = 9000 * np.cos(phase) + rng.normal(0, 150, count)
+    gyro_z = 600 * swing + rng.normal(0, 60, count)
+    return [_int16(values) for values in (accel_x, accel_y, accel_z, gyro_x, gyro_y, gyro_z)]
+
+
+def _gps_fields(timer_ms, origin, rng):
+    """
+    Colonnes GPS (latitude, longitude, altitude, vitesse, cap, satellites, HDOP) pour les
+    instants `timer_ms`, le long d'une boucle circulaire de LOOP_LENGTH_M mètres.
+    """
+    count = len(timer_ms)
+    speed_ms = RUNNING_SPEED_KMH / 3.6
+    radius = LOOP_LENGTH_M / (2 * np.pi)
+    angle = (timer_ms / 1000.0) * speed_ms / radius
+    north = radius * np.sin(angle) + rng.normal(0, 1.5, count)
+    east = radius * (1 - np.cos(angle)) + rng.normal(0, 1.5, count)
+    latitude = origin[0] + np.degrees(north / EARTH_RADIUS_M)
+    longitude = origin[1] + np.degrees(east / (EARTH_RADIUS_M * np.cos(np.radians(origin[0]))))
+    altitude = 35 + 8 * np.sin(angle) + rng.normal(0, 0.5, count)
+    speed = np.maximum(RUNNING_SPEED_KMH + rng.normal(0, 0.4, count), 0)
+    heading = np.mod(np.degrees(angle), 360)
+    satellites = rng.integers(6, 12, count)
+    hdop = rng.integers(70, 200, count)
+    return [
+        np.round(latitude, 6), np.round(longitude, 6), np.round(altitude).astype(np.int64),
+        np.round(speed, 1), np.round(heading).astype(np.int64), satellites, hdop,
+    ]
+
+
+def generate_chunks(row_count, seed=0, chunk_size=DEFAULT_CHUNK_SIZE, period_ms=SAMPLE_PERIOD_MS,
+                    gps_period_ms=GPS_PERIOD_MS, origin=DEFAULT_ORIGIN, start_timer=0):
+    """
+    Génère une session par paquets de lignes.
+
+    :param row_count: Nombre total de lignes
+    :param seed: Graine du générateur aléatoire (même graine, mêmes données)
+    :param gps_period_ms: Intervalle entre deux positions GPS (0 : pas de GPS)
+    :return: Itérateur de listes de lignes, chaque ligne étant une liste de 21 valeurs
+             ('' pour les colonnes GPS absentes)
+    """
+    rng = np.random.default_rng(seed)
+    empty_gps = [""] * 7
+    for chunk_start in range(0, row_count, chunk_size):
+        count = min(chunk_size, row_count - chunk_start)
+        index = np.arange(chunk_start, chunk_start + count)
+        # Léger décalage aléatoire de l'horloge, comme pour la liaison série réelle
+        timer = start_timer + index * period_ms + rng.integers(0, 3, count)
+        phase = 2 * np.pi * STRIDE_FREQUENCY * timer / 1000.0
+
+        columns = [timer]
+        columns += _leg_signals(phase, rng)
+        columns += _leg_signals(phase + np.pi, rng)
+        flexion = 20 + 55 * np.maximum(np.sin(phase - 0.6), 0) + rng.normal(0, 2, count)
+        columns.append(np.clip(np.rint(flexion), 0, 180).astype(np.int64))
+
+        rows = np.column_stack(columns).tolist()
+        if gps_period_ms:
+            # Première ligne de chaque période GPS
+            slot = (index * period_ms) // gps_period_ms
+            previous = ((index - 1) * period_ms) // gps_period_ms
+            gps_rows = np.flatnonzero((slot != previous) | (index == 0))
+        else:
+            gps_rows = np.array([], dtype=np.int64)
+
+        for row in rows:
+            row.extend(empty_gps)
+        if len(gps_rows):
+            gps_columns = [values.tolist() for values in _gps_fields(timer[gps_rows], origin, rng)]
+            for position, row_index in enumerate(gps_rows.tolist()):
+                rows[row_index][14:] = [values[position] for values in gps_columns]
+        yield rows
+
+
+def generate_lines(row_count, **options):
+    """
+    Lignes de mesures au format de l'ESP32 (sans fin de ligne), par exemple pour FakeESP32.
+    """
+    for rows in generate_chunks(row_count, **options):
+        for row in rows:
+            yield ";".join(str(value) for value in row)
+
+
+def write_session_csv(csv_file_path, row_count, **options):
+    """
+    Écrit une session synthétique au format de esp32_data.csv.
+
+    :param options: Voir generate_chunks (seed, chunk_size, period_ms, gps_period_ms, origin)
+    :return: Nombre de lignes écrites
+    """
+    written = 0
+    with open(csv_file_path, mode="w", newline="") as csv_file:
+        writer = csv.writer(csv_file, delimiter=";", lineterminator="\n")
+        writer.writerow(ESP32_CSV_HEADERS)
+        for rows in generate_chunks(row_count, **options):
+            writer.writerows(rows)
+            written += len(rows)
+    return written
+
+
+def generate_gpx(point_count, seed=0, origin=DEFAULT_ORIGIN, period_s=1, start_time=None):
+    """
+    Trace GPX (texte) de `point_count` points sur la même boucle que les sessions synthétiques.
+    """
+    rng = np.random.default_rng(seed)
+    start = start_time if start_time is not None else datetime(2025, 1, 15, 10, 0, tzinfo=timezone.utc).timestamp()
+    timer_ms = np.arange(point_count) * period_s * 1000.0
+    latitude, longitude, altitude = _gps_fields(timer_ms, origin, rng)[:3]
+
+    lines = [
+        '<?xml version="1.0" encoding="UTF-8"?>',
+        '<gpx version="1.1" creator="proadapt-synthetic" xmlns="http://www.topografix.com/GPX/1/1">',
+        "<trk><name>Session synthétique</name><trkseg>",
+    ]
+    for offset, lat, lon, ele in zip(timer_ms.tolist(), latitude.tolist(), longitude.tolist(), altitude.tolist()):
+        stamp = datetime.fromtimestamp(start + offset / 1000.0, tz=timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+        lines.append(f'<trkpt lat="{lat}" lon="{lon}"><ele>{ele}</ele><time>{stamp}</time></trkpt>')
+    lines.append("</trkseg></trk></gpx>")
+    return "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Génère une session ESP32 synthétique (CSV ';').")
+    parser.add_argument("csv_file")
+    parser.add_argument("--rows", type=int, default=100000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--period", type=int, default=SAMPLE_PERIOD_MS, help="Période de l'IMU (ms)")
+    parser.add_argument("--gps-period", type=int, default=GPS_PERIOD_MS, help="Période du GPS (ms, 0 : sans GPS)")
+    parser.add_argument("--gpx", help="Écrit aussi une trace GPX de même durée dans ce fichier")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    rows = write_session_csv(args.csv_file, args.rows, seed=args.seed, period_ms=args.period,
+                             gps_period_ms=args.gps_period)
+    elapsed = time.perf_counter() - start
+    print(f"{rows} lignes écrites dans {args.csv_file} en {elapsed:.1f} s ({rows / elapsed:,.0f} lignes/s)")
+
+    if args.gpx:
+        duration_s = rows * args.period / 1000
+        with open(args.gpx, "w") as gpx_file:
+            gpx_file.write(generate_gpx(max(int(duration_s), 2), seed=args.seed))
+        print(f"Trace GPX écrite dans {args.gpx}")
+
+
+if __name__ == "__main__":
+    main()
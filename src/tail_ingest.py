@@ -0,0 +1,233 @@
+# Chargement incrémental d'un fichier CSV auquel on ajoute des lignes (esp32_data.csv)
+#
+# La position (octet) jusqu'à laquelle le fichier a déjà été chargé est enregistrée dans la
+# table 'ingest_offsets', dans la même transaction que les lignes insérées : un chargement
+# interrompu ne laisse ni doublon ni trou. L'identité du fichier (inode, périphérique et
+# empreinte du début du fichier) permet de détecter un fichier remplacé ou réécrit ; dans ce
+# cas le chargement repart du début, dans une nouvelle session.
+
+import csv
+import hashlib
+import io
+import os
+import threading
+
+from database_manager import DatabaseManager, DEFAULT_CHUNK_SIZE, ESP32_CSV_HEADERS, MALFORMED_VALUES
+from db_connection import get_pool
+
+# Nombre d'octets du début du fichier utilisés pour reconnaître le même fichier
+IDENTITY_PREFIX_SIZE = 4096
+
+# Nombre d'octets lus puis chargés dans une même transaction
+DEFAULT_READ_SIZE = 8 * 1024 * 1024
+
+
+def prefix_hash(file, size):
+    """
+    Empreinte SHA-256 des `size` premiers octets d'un fichier ouvert en binaire.
+    """
+    file.seek(0)
+    return hashlib.sha256(file.read(size)).hexdigest()
+
+
+class CsvTailIngester:
+    def __init__(self, db_name, csv_file_path, session_factory=None, chunk_size=DEFAULT_CHUNK_SIZE,
+                 read_size=DEFAULT_READ_SIZE):
+        """
+        :param db_name: Base SQLite des mesures
+        :param csv_file_path: Fichier CSV (séparateur ';') alimenté par ajouts successifs
+        :param session_factory: Fonction appelée sans argument quand le fichier est chargé
+                                depuis le début, qui retourne le session_id à utiliser (ou None)
+        """
+        self.db_name = db_name
+        self.csv_file_path = csv_file_path
+        self.source = os.path.abspath(csv_file_path)
+        self.session_factory = session_factory
+        self.chunk_size = chunk_size
+        self.read_size = read_size
+        self.db_manager = DatabaseManager(db_name)
+        self._lock = threading.Lock()
+        self._initialize_database()
+
+    def _initialize_database(self):
+        """
+        Crée les tables des mesures et la table des positions de chargement.
+        """
+        self.db_manager.initialize_database()
+        with get_pool(self.db_name).transaction() as connection:
+            connection.execute('''
+                CREATE TABLE IF NOT EXISTS ingest_offsets (
+                    source TEXT PRIMARY KEY,
+                    device INTEGER,
+                    inode INTEGER,
+                    offset INTEGER NOT NULL,
+                    prefix_size INTEGER NOT NULL,
+                    prefix_hash TEXT,
+                    header TEXT,
+                    session_id INTEGER,
+                    rows INTEGER DEFAULT 0,
+                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )
+            ''')
+
+    def state(self):
+        """
+        Position enregistrée pour ce fichier (None si rien n'a encore été chargé).
+        """
+        fields = ["device", "inode", "offset", "prefix_size", "prefix_hash", "header", "session_id", "rows"]
+        with get_pool(self.db_name).connection() as connection:
+            row = connection.execute(
+                f"SELECT {', '.join(fields)} FROM ingest_offsets WHERE source = ?", (self.source,)
+            ).fetchone()
+        return dict(zip(fields, row)) if row else None
+
+    def reset(self):
+        """
+        Oublie la position enregistrée : le prochain chargement repartira du début du fichier.
+        """
+        with get_pool(self.db_name).transaction() as connection:
+            connection.execute("DELETE FROM ingest_offsets WHERE source = ?", (self.source,))
+
+    def _same_file(self, state, stat_result, file):
+        if state is None:
+            return False
+        if (state["device"], state["inode"]) != (stat_result.st_dev, stat_result.st_ino):
+            return False
+        if stat_result.st_size < state["offset"]:
+            return False  # Fichier tronqué
+        return prefix_hash(file, state["prefix_size"]) == state["prefix_hash"]
+
+    def ingest(self, on_chunk=None):
+        """
+        Charge uniquement les lignes complètes ajoutées depuis le dernier appel.
+        Une dernière ligne sans fin de ligne (en cours d'écriture) est laissée pour l'appel suivant.
+        `on_chunk` reçoit le nombre de lignes insérées après chaque paquet.
+
+        :return: Dictionnaire {rows, total_rows, offset, session_id, restarted}
+        """
+        # Deux chargements simultanés liraient la même position et inséreraient deux fois les lignes
+        with self._lock:
+            return self._ingest(on_chunk)
+
+    def _ingest(self, on_chunk):
+        if not os.path.isfile(self.csv_file_path):
+            raise FileNotFoundError(f"CSV file '{self.csv_file_path}' not found.")
+
+        with open(self.csv_file_path, 'rb') as file:
+            stat_result = os.fstat(file.fileno())
+            state = self.state()
+            restarted = not self._same_file(state, stat_result, file)
+            if restarted:
+                if state is not None:
+                    print(f"{self.csv_file_path} a été remplacé ou réécrit : chargement depuis le début.")
+                offset, header, rows, session_id = 0, None, 0, None
+            else:
+                offset, rows, session_id = state["offset"], state["rows"], state["session_id"]
+                header = state["header"].split(';') if state["header"] else None
+
+            file.seek(offset)
+            # Le fichier est lu par blocs de `read_size` octets, chacun chargé dans sa propre transaction
+            # avec la nouvelle position : la mémoire reste bornée quelle que soit la taille ajoutée, et
+            # un chargement interrompu reprend après le dernier bloc enregistré.
+            # Les lignes ajoutées pendant le chargement sont laissées pour l'appel suivant.
+            inserted, pending, identity = 0, b'', None
+            while file.tell() < stat_result.st_size:
+                block = file.read(min(self.read_size, stat_result.st_size - file.tell()))
+                if not block:
+                    break  # Fichier tronqué pendant la lecture
+                data = pending + block if pending else block
+                end = data.rfind(b'\n') + 1
+                # La dernière ligne incomplète du bloc est reportée au bloc suivant
+                pending = data[end:]
+                if end == 0:
+                    continue
+                if restarted and offset == 0 and self.session_factory:
+                    session_id = self.session_factory()
+
+                lines = io.StringIO(data[:end].decode('utf-8', errors='replace'), newline='')
+                del data
+                csv_reader = csv.reader(lines, delimiter=';')
+                if header is None:
+                    first = next(csv_reader, [])
+                    if first and first[0].strip() == 'Timer':
+                        header = [name.strip() for name in first]
+                    else:
+                        # Fichier sans en-tête (vidé puis complété) : colonnes de l'ESP32 dans l'ordre
+                        header = ESP32_CSV_HEADERS
+                        lines.seek(0)
+                        csv_reader = csv.reader(lines, delimiter=';')
+
+                offset += end
+                prefix_size = min(offset, IDENTITY_PREFIX_SIZE)
+                if identity is None or identity[0] != prefix_size:
+                    position = file.tell()
+                    identity = (prefix_size, prefix_hash(file, prefix_size))
+                    file.seek(position)
+                progress = None
+                if on_chunk:
+                    # insert_csv_rows compte les lignes du bloc, on_chunk celles de tout le chargement
+                    progress = lambda count, done=inserted: on_chunk(done + count)
+                inserted += self._insert_block(
+                    stat_result, header, csv_reader, session_id, offset, identity, rows + inserted, progress
+                )
+
+        return {
+            "rows": inserted, "total_rows": rows + inserted, "offset": offset,
+            "session_id": session_id, "restarted": restarted,
+        }
+
+    def _insert_block(self, stat_result, header, csv_reader, session_id, offset, identity, rows, on_chunk=None):
+        """
+        Insère les lignes d'un bloc et enregistre la position atteinte, dans la même transaction.
+
+        :return: Nombre de lignes insérées
+        """
+        prefix_size, identity_hash = identity
+        with get_pool(self.db_name).transaction() as connection:
+            cursor = connection.cursor()
+            inserted = self.db_manager.insert_csv_rows(
+                cursor, header, csv_reader, self.chunk_size, session_id, on_chunk=on_chunk
+            )
+            cursor.execute(
+                "INSERT OR REPLACE INTO ingest_offsets "
+                "(source, device, inode, offset, prefix_size, prefix_hash, header, session_id, rows, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, CURRENT_TIMESTAMP)",
+                (self.source, stat_result.st_dev, stat_result.st_ino, offset, prefix_size, identity_hash,
+                 ';'.join(header), session_id, rows + inserted)
+            )
+        return inserted
+
+
+def ingest_csv_file(db_name, csv_file_path, user_db_name):
+    """
+    Tâche de fond (voir jobs.py) : chargement incrémental de `csv_file_path`, chaque nouveau
+    départ du fichier ouvrant une session dans la base utilisateurs. Une valeur mal formée
+    ('1x') est enregistrée comme NULL sans bloquer la suite du fichier.
+
+    :return: Dictionnaire {rows, session, malformed_values}
+    """
+    from jobs import report_progress
+    from trace_simplification import GpsTraceCache
+    from user_database_manager import UserDatabaseManager
+
+    file_name = os.path.basename(csv_file_path)
+    user_db_manager = UserDatabaseManager(user_db_name)
+    ingester = CsvTailIngester(
+        db_name, csv_file_path,
+        session_factory=lambda: user_db_manager.create_session(name=file_name, source_file=file_name)
+    )
+    # Le processus de travail n'exécute qu'une tâche à la fois : l'écart du compteur est celui de ce chargement
+    malformed_before = MALFORMED_VALUES.value()
+    result = ingester.ingest(on_chunk=lambda rows: report_progress(rows=rows))
+    malformed = MALFORMED_VALUES.value() - malformed_before
+
+    session = None
+    if result["session_id"] is not None:
+        user_db_manager.set_session_row_count(result["session_id"], result["total_rows"])
+        session = user_db_manager.get_session(result["session_id"])
+        # Tracé simplifié pour tous les zooms, calculé une fois au chargement
+        GpsTraceCache(db_name).get(result["session_id"])
+    print(f"{result['rows']} nouvelles lignes de {csv_file_path} chargées dans la base de données.")
+    if malformed:
+        print(f"{malformed} valeurs mal formées enregistrées comme NULL.")
+    return {"rows": result["rows"], "session": session, "malformed_values": malformed}
@@ -0,0 +1,24 @@
+import os
+import sys
+
+import pytest
+
+# Les modules du projet sont à plat dans src/
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture
+def server(tmp_path, monkeypatch):
+    """
+    Serveur sur des bases temporaires (le répertoire courant est le répertoire temporaire).
+    """
+    from server import Server
+
+    monkeypatch.chdir(tmp_path)
+    server = Server(
+        db_name=str(tmp_path / "sensor_data.db"), user_db_name=str(tmp_path / "user_data.db"),
+        dem_directory=str(tmp_path / "dem"), remote_elevation=False, profiling="off"
+    )
+    server._initialize_database()
+    yield server
+    server.close()
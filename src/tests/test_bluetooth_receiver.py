@@ -0,0 +1,62 @@
+import csv
+import sqlite3
+
+import pytest
+
+from bluetooth_receiver import BluetoothReceiver
+from database_manager import DatabaseManager
+from fake_esp32 import FakeESP32, synthetic_lines
+
+
+@pytest.mark.parametrize("protocol", ["ascii", "binary"])
+def test_session_received_from_fake_esp32(tmp_path, protocol):
+    db_name = str(tmp_path / "sensor_data.db")
+    csv_file = str(tmp_path / "sensor_data.csv")
+    DatabaseManager(db_name).initialize_database()
+    lines = list(synthetic_lines(300))
+
+    fake = FakeESP32(lines, chunk_size=512, supports_binary=True).start()
+    try:
+        receiver = BluetoothReceiver(
+            port=fake.port, baudrate=921600, db_name=db_name, csv_file=csv_file, protocol=protocol, flush_size=128
+        )
+        receiver.connect()
+        receiver.listen()
+        fake.join(1)
+    finally:
+        fake.close()
+
+    expected = [line.split(";") for line in lines]
+    with open(csv_file, newline='') as file:
+        assert list(csv.reader(file)) == expected
+    with sqlite3.connect(db_name) as connection:
+        sensor_rows = connection.execute(
+            "SELECT Timer, Accel1X, Gyro2Z, Flexion FROM sensor_data ORDER BY Timer"
+        ).fetchall()
+        gpx_rows = connection.execute("SELECT Timer, Latitude FROM gpx_data ORDER BY Timer").fetchall()
+    assert sensor_rows == [(int(row[0]), int(row[1]), int(row[12]), int(row[13])) for row in expected]
+    assert [timer for timer, _ in gpx_rows] == [int(row[0]) for row in expected]
+    assert receiver.writer.stats()["write_errors"] == 0
+
+
+def test_malformed_line_is_skipped(tmp_path):
+    db_name = str(tmp_path / "sensor_data.db")
+    csv_file = str(tmp_path / "sensor_data.csv")
+    DatabaseManager(db_name).initialize_database()
+    lines = list(synthetic_lines(100))
+    lines.insert(50, "1000;12;34")  # Ligne tronquée par une perte de liaison
+
+    fake = FakeESP32(lines).start()
+    try:
+        receiver = BluetoothReceiver(port=fake.port, baudrate=921600, db_name=db_name, csv_file=csv_file)
+        receiver.connect()
+        receiver.listen()
+        fake.join(1)
+    finally:
+        fake.close()
+
+    assert receiver.malformed_lines == 1
+    with sqlite3.connect(db_name) as connection:
+        assert connection.execute("SELECT COUNT(*) FROM sensor_data").fetchone()[0] == 100
+    with open(csv_file, newline='') as file:
+        assert len(list(csv.reader(file))) == 100
@@ -0,0 +1,68 @@
+import io
+import sqlite3
+
+from csv_upload import StreamingCsvUpload, start_progress
+from database_manager import DatabaseManager, ESP32_CSV_HEADERS
+
+BOUNDARY = "proadapt-test"
+
+
+def multipart_body(rows):
+    lines = [";".join(ESP32_CSV_HEADERS)] + [";".join([str(timer)] + ["1.5"] * 20) for timer in range(rows)]
+    return (
+        f"--{BOUNDARY}\r\n"
+        'Content-Disposition: form-data; name="file"; filename="session.csv"\r\n'
+        "Content-Type: text/csv\r\n\r\n"
+        + "\n".join(lines) + "\n"
+        f"\r\n--{BOUNDARY}--\r\n"
+    ).encode()
+
+
+class WriterDuringUpload(io.BytesIO):
+    """
+    Corps de requête qui, à mi-envoi, écrit dans la base avec une autre connexion.
+    """
+
+    def __init__(self, data, db_name):
+        super().__init__(data)
+        self.db_name = db_name
+        self.written = False
+
+    def read(self, size=-1):
+        if not self.written and self.tell() > len(self.getvalue()) // 2:
+            with sqlite3.connect(self.db_name, timeout=0.2) as connection:
+                connection.execute("INSERT INTO gpx_data (Timer) VALUES (-1)")
+            self.written = True
+        return super().read(size)
+
+
+def count_rows(db_name, table):
+    with sqlite3.connect(db_name) as connection:
+        return connection.execute(f"SELECT COUNT(*) FROM {table} WHERE Timer >= 0").fetchone()[0]
+
+
+def test_other_writers_are_not_locked_out_during_an_upload(tmp_path):
+    db_name = str(tmp_path / "sensor_data.db")
+    DatabaseManager(db_name).initialize_database()
+    stream = WriterDuringUpload(multipart_body(3000), db_name)
+
+    upload = StreamingCsvUpload(db_name, start_progress(), chunk_size=200, read_size=4096)
+    assert upload.run(stream, BOUNDARY.encode(), lambda upload: 1)
+
+    assert stream.written
+    assert upload.rows == 3000
+    assert count_rows(db_name, "sensor_data") == 3000
+
+
+def test_rejected_upload_removes_its_rows(tmp_path):
+    db_name = str(tmp_path / "sensor_data.db")
+    DatabaseManager(db_name).initialize_database()
+
+    upload = StreamingCsvUpload(db_name, start_progress(), chunk_size=200, read_size=4096)
+    stored = upload.run(
+        io.BytesIO(multipart_body(1000)), BOUNDARY.encode(), lambda upload: 7, keep=lambda upload: False
+    )
+
+    assert not stored
+    assert count_rows(db_name, "sensor_data") == 0
+    assert count_rows(db_name, "gpx_data") == 0
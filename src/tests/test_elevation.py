@@ -0,0 +1,58 @@
+import numpy as np
+import pytest
+
+from elevation import HGT_VOID, DemElevationProvider, tile_name
+
+
+def write_tile(directory, lat_floor, lon_floor, grid):
+    """Tuile .hgt synthétique : grid est donnée du nord au sud, de l'ouest à l'est."""
+    np.asarray(grid, dtype=">i2").tofile(directory / tile_name(lat_floor, lon_floor))
+
+
+def test_bilinear_interpolation(tmp_path):
+    write_tile(tmp_path, 48, 2, [[100, 200, 300], [400, 500, 600], [700, 800, 900]])
+    provider = DemElevationProvider(str(tmp_path))
+
+    elevation = provider.elevations([49.0, 48.5, 48.75, 48.25, 48.0], [2.0, 2.5, 2.25, 2.75, 3.0])
+
+    np.testing.assert_allclose(elevation, [100, 500, 300, 700, 900])
+
+
+def test_voids_are_skipped(tmp_path):
+    write_tile(tmp_path, 48, 2, [[HGT_VOID, 200, 300], [400, HGT_VOID, 600], [700, 800, HGT_VOID]])
+    provider = DemElevationProvider(str(tmp_path))
+
+    elevation = provider.elevations([48.75, 48.5, 48.25], [2.25, 2.5, 2.75])
+
+    # Poids des sommets renseignés renormalisés ; sur un sommet vide, moyenne des voisins de la maille
+    np.testing.assert_allclose(elevation, [(200 + 400) / 2, (600 + 800) / 2, (600 + 800) / 2])
+
+
+def test_all_void_cell_and_missing_tile_give_nan(tmp_path):
+    write_tile(tmp_path, 48, 2, [[HGT_VOID, HGT_VOID, 300], [HGT_VOID, HGT_VOID, 600], [700, 800, 900]])
+    provider = DemElevationProvider(str(tmp_path))
+
+    elevation = provider.elevations([48.75, 40.5, np.nan], [2.25, 2.5, 2.5])
+
+    assert np.isnan(elevation).all()
+
+
+@pytest.mark.parametrize("latitude, longitude, expected", [
+    (49.0, 2.5, 200),   # bord nord : ligne 0 de N48E002, la tuile N49E002 est absente
+    (48.5, 3.0, 600),   # bord est : dernière colonne de N48E002
+    (49.0, 3.0, 300),   # coin nord-est
+])
+def test_north_and_east_edges_use_the_installed_tile(tmp_path, latitude, longitude, expected):
+    write_tile(tmp_path, 48, 2, [[100, 200, 300], [400, 500, 600], [700, 800, 900]])
+    provider = DemElevationProvider(str(tmp_path))
+
+    assert provider.elevations([latitude], [longitude])[0] == pytest.approx(expected)
+
+
+def test_edge_prefers_the_tile_starting_on_it(tmp_path):
+    write_tile(tmp_path, 48, 2, [[100, 200, 300], [400, 500, 600], [700, 800, 900]])
+    write_tile(tmp_path, 49, 2, [[1, 2, 3], [4, 5, 6], [10, 20, 30]])
+    provider = DemElevationProvider(str(tmp_path))
+
+    # Les deux tuiles contiennent la ligne 49°N ; c'est la dernière ligne de N49E002 qui est lue
+    assert provider.elevations([49.0], [2.5])[0] == pytest.approx(20)
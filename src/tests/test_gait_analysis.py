@@ -0,0 +1,47 @@
+import sqlite3
+
+import gait_analysis
+from database_manager import DatabaseManager, ESP32_CSV_HEADERS
+from gait_analysis import GaitAnalyticsCache
+
+
+def cached_keys(db_name):
+    with sqlite3.connect(db_name) as connection:
+        return {row[0] for row in connection.execute("SELECT cache_key FROM gait_analytics")}
+
+
+def load_session(db_name, csv_file, session_id):
+    lines = [";".join(ESP32_CSV_HEADERS)]
+    lines += [";".join([str(timer * 25)] + ["1.0"] * (len(ESP32_CSV_HEADERS) - 1)) for timer in range(400)]
+    csv_file.write_text("\n".join(lines) + "\n")
+    DatabaseManager(db_name).load_csv_to_db(str(csv_file), session_id=session_id)
+
+
+def test_range_results_are_capped(tmp_path, monkeypatch):
+    monkeypatch.setattr(gait_analysis, "MAX_RANGE_RESULTS", 3)
+    db_name = str(tmp_path / "sensor_data.db")
+    DatabaseManager(db_name).initialize_database()
+    load_session(db_name, tmp_path / "session.csv", 1)
+    cache = GaitAnalyticsCache(db_name)
+
+    cache.get(session_id=1)
+    for start in range(0, 6000, 1000):
+        cache.get(start, start + 2000, 1)
+
+    assert cached_keys(db_name) == {
+        cache.cache_key(1), cache.cache_key(1, 3000, 5000), cache.cache_key(1, 4000, 6000), cache.cache_key(1, 5000, 7000)
+    }
+
+
+def test_delete_removes_every_result_of_the_session(tmp_path):
+    db_name = str(tmp_path / "sensor_data.db")
+    DatabaseManager(db_name).initialize_database()
+    load_session(db_name, tmp_path / "first.csv", 1)
+    load_session(db_name, tmp_path / "second.csv", 11)
+    cache = GaitAnalyticsCache(db_name)
+    for session_id in (1, 11):
+        cache.get(session_id=session_id)
+        cache.get(0, 5000, session_id)
+
+    cache.delete(1)
+    assert cached_keys(db_name) == {cache.cache_key(11), cache.cache_key(11, 0, 5000)}
@@ -0,0 +1,35 @@
+import csv
+import sqlite3
+
+from database_manager import DatabaseManager, ESP32_CSV_HEADERS, MALFORMED_VALUES
+from ingest_pipeline import IngestWriter
+
+
+def sample_row(timer):
+    return [str(timer)] + [f"{timer % 7 - 3}.25"] * (len(ESP32_CSV_HEADERS) - 1)
+
+
+def test_malformed_value_does_not_drop_the_batch(tmp_path):
+    db_name = str(tmp_path / "sensor_data.db")
+    csv_file = str(tmp_path / "esp32_data.csv")
+    DatabaseManager(db_name).initialize_database()
+    malformed_before = MALFORMED_VALUES.value()
+
+    writer = IngestWriter(db_name, csv_file, ESP32_CSV_HEADERS, flush_size=500)
+    writer.start()
+    for timer in range(1000):
+        row = sample_row(timer)
+        if timer == 250:
+            row[2] = "1x"  # Ligne série bruitée
+        writer.put(row)
+    writer.stop()
+
+    with sqlite3.connect(db_name) as connection:
+        assert connection.execute("SELECT COUNT(*) FROM sensor_data").fetchone()[0] == 1000
+        assert connection.execute("SELECT COUNT(*) FROM gpx_data").fetchone()[0] == 1000
+        garbled = connection.execute("SELECT Accel1X, Accel1Y FROM sensor_data WHERE Timer = 250").fetchone()
+    assert garbled == (2.25, None)
+    with open(csv_file, newline='') as file:
+        assert len(list(csv.reader(file))) == 1000
+    assert writer.stats()["write_errors"] == 0
+    assert MALFORMED_VALUES.value() == malformed_before + 1
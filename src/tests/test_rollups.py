@@ -0,0 +1,27 @@
+import sqlite3
+
+import numpy as np
+
+from database_manager import ROLLUP_CHANNELS, DatabaseManager
+from rollups import ROLLUP_LEVELS_MS, ROLLUP_TABLE, upsert_query, window_aggregates
+
+
+def test_rollup_levels_average_many_samples():
+    # Mesures à environ 40 Hz : une fenêtre doit en regrouper plusieurs dizaines
+    assert min(ROLLUP_LEVELS_MS) >= 1000
+
+
+def test_finer_levels_are_removed_from_existing_databases(tmp_path):
+    db_name = str(tmp_path / "sensor_data.db")
+    DatabaseManager(db_name).initialize_database()
+    # Fenêtres de 100 ms, comme dans une base créée avant l'abandon de ce niveau
+    timers = np.arange(0, 1000, 25, dtype=np.float64)
+    channels = [np.ones(len(timers))] * len(ROLLUP_CHANNELS)
+    rows = window_aggregates(timers, np.ones(len(timers), dtype=np.int64), channels, levels=(100,))[100]
+    with sqlite3.connect(db_name) as connection:
+        connection.executemany(upsert_query(ROLLUP_CHANNELS), rows)
+
+    DatabaseManager(db_name).initialize_database()
+    with sqlite3.connect(db_name) as connection:
+        levels = connection.execute(f"SELECT DISTINCT level_ms FROM {ROLLUP_TABLE}").fetchall()
+    assert levels == []
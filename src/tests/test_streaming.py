@@ -0,0 +1,25 @@
+from db_connection import STREAM_POOL_SIZE, get_stream_pool
+
+
+def test_head_requests_release_stream_connections(server):
+    client = server.app.test_client()
+    for route in ("/api/gpx-data", "/api/sensor-data", "/api/gps-trace"):
+        for _ in range(STREAM_POOL_SIZE + 1):
+            # Comme un serveur WSGI, le client de test ferme la réponse sans en lire le corps
+            with client.head(route) as response:
+                assert response.status_code == 200
+
+    assert client.get("/api/gpx-data").status_code == 200
+    pool = get_stream_pool(server.db_name)
+    assert pool._idle.qsize() == pool._created
+
+
+def test_unread_stream_releases_its_connection_on_close(server):
+    client = server.app.test_client()
+    responses = [client.get("/api/sensor-data", buffered=False) for _ in range(STREAM_POOL_SIZE)]
+    for response in responses:
+        response.close()
+
+    pool = get_stream_pool(server.db_name)
+    assert pool._idle.qsize() == pool._created
+    assert client.get("/api/sensor-data").status_code == 200
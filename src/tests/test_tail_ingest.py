@@ -0,0 +1,46 @@
+import sqlite3
+
+from database_manager import ESP32_CSV_HEADERS
+from tail_ingest import CsvTailIngester, ingest_csv_file
+
+
+def csv_lines(timers, garbled=()):
+    lines = []
+    for timer in timers:
+        value = "1x" if timer in garbled else "0.5"
+        lines.append(";".join([str(timer), value] + ["1.5"] * (len(ESP32_CSV_HEADERS) - 2)) + "\n")
+    return "".join(lines)
+
+
+def sensor_timers(db_name):
+    with sqlite3.connect(db_name) as connection:
+        return [row[0] for row in connection.execute("SELECT Timer FROM sensor_data ORDER BY Timer")]
+
+
+def test_malformed_cell_does_not_block_later_rows(tmp_path):
+    db_name = str(tmp_path / "sensor_data.db")
+    csv_file = tmp_path / "esp32_data.csv"
+    csv_file.write_text(";".join(ESP32_CSV_HEADERS) + "\n" + csv_lines(range(10), garbled={4}))
+
+    ingester = CsvTailIngester(db_name, str(csv_file), read_size=64)
+    assert ingester.ingest()["rows"] == 10
+
+    with csv_file.open("a") as file:
+        file.write(csv_lines(range(10, 20)))
+    result = ingester.ingest()
+    assert result["rows"] == 10
+    assert result["offset"] == csv_file.stat().st_size
+    assert sensor_timers(db_name) == list(range(20))
+    with sqlite3.connect(db_name) as connection:
+        assert connection.execute("SELECT Accel1X FROM sensor_data WHERE Timer = 4").fetchone() == (None,)
+
+
+def test_load_csv_job_reports_malformed_values(tmp_path):
+    db_name = str(tmp_path / "sensor_data.db")
+    csv_file = tmp_path / "esp32_data.csv"
+    csv_file.write_text(";".join(ESP32_CSV_HEADERS) + "\n" + csv_lines(range(5), garbled={1, 3}))
+
+    result = ingest_csv_file(db_name, str(csv_file), str(tmp_path / "user_data.db"))
+    assert result["rows"] == 5
+    assert result["malformed_values"] == 2
+    assert result["session"]["row_count"] == 5
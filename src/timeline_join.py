@@ -0,0 +1,123 @@
+# Jointure « asof » des mesures IMU et des relevés GPS sur Timer (NumPy)
+#
+# Seule une ligne de l'ESP32 sur plusieurs dizaines porte un relevé GPS (environ un par seconde) :
+# chaque mesure est associée au relevé précédent ('previous'), suivant ('next') ou le plus proche
+# ('nearest'), à condition qu'il soit à moins de `tolerance` ms. Les deux séries étant triées par Timer,
+# la correspondance se calcule en une passe avec np.searchsorted, au lieu d'aligner les deux réponses
+# dans le navigateur. Dans l'autre sens, les mesures associées à un même relevé sont agrégées
+# (nombre, moyenne, min et max de chaque voie).
+
+import numpy as np
+
+ASOF_DIRECTIONS = ("previous", "nearest", "next")
+
+# 'samples' : une ligne par mesure avec sa position ; 'fixes' : une ligne par relevé avec les agrégats IMU
+JOIN_MODES = ("samples", "fixes")
+
+# Écart maximal (ms) entre une mesure et le relevé qui lui est associé (GPS à 1 Hz)
+DEFAULT_TOLERANCE_MS = 2000
+
+GPS_JOIN_COLUMNS = ["Latitude", "Longitude", "Altitude", "Vitesse"]
+IMU_JOIN_COLUMNS = ["Accel1X", "Accel1Y", "Accel1Z", "Accel2X", "Accel2Y", "Accel2Z", "Flexion"]
+
+NO_MATCH = -1
+
+
+def asof_indices(timers, fix_timers, direction="previous", tolerance=DEFAULT_TOLERANCE_MS):
+    """
+    Indice du relevé associé à chaque mesure (NO_MATCH si aucun relevé ne convient).
+
+    :param timers: Timer des mesures
+    :param fix_timers: Timer des relevés, croissants
+    :param direction: 'previous' (Timer du relevé <= Timer de la mesure), 'next' (>=) ou 'nearest'
+                      (le plus proche, le précédent en cas d'égalité)
+    """
+    count = len(fix_timers)
+    if count == 0:
+        return np.full(len(timers), NO_MATCH, dtype=np.int64)
+
+    previous = np.searchsorted(fix_timers, timers, side="right") - 1
+    following = np.searchsorted(fix_timers, timers, side="left")
+    if direction == "previous":
+        indices = previous
+    elif direction == "next":
+        indices = following
+    else:
+        previous_gap = timers - fix_timers[np.maximum(previous, 0)]
+        following_gap = fix_timers[np.minimum(following, count - 1)] - timers
+        use_following = (previous < 0) | ((following < count) & (following_gap < previous_gap))
+        indices = np.where(use_following, following, previous)
+
+    valid = (indices >= 0) & (indices < count)
+    gaps = np.abs(timers - fix_timers[np.clip(indices, 0, count - 1)])
+    return np.where(valid & (gaps <= tolerance), indices, NO_MATCH)
+
+
+def join_samples(samples, fixes, direction="previous", tolerance=DEFAULT_TOLERANCE_MS):
+    """
+    Ajoute à chaque mesure le relevé qui lui est associé : GpsTimer et les colonnes de GPS_JOIN_COLUMNS
+    (NaN si aucun relevé ne convient).
+
+    :param samples: Dictionnaire {nom: tableau} des mesures, avec Timer
+    :param fixes: Dictionnaire {nom: tableau} des relevés, triés par Timer
+    """
+    indices = asof_indices(samples["Timer"], fixes["Timer"], direction, tolerance)
+    matched = indices != NO_MATCH
+    result = dict(samples)
+    for name in ["Timer"] + GPS_JOIN_COLUMNS:
+        values = np.full(len(indices), np.nan)
+        values[matched] = fixes[name][indices[matched]]
+        result["GpsTimer" if name == "Timer" else name] = values
+    return result
+
+
+def aggregate_by_fix(samples, fixes, channels=IMU_JOIN_COLUMNS, direction="previous", tolerance=DEFAULT_TOLERANCE_MS):
+    """
+    Agrège les mesures associées à chaque relevé : `count` (nombre de mesures), puis la moyenne,
+    le min et le max de chaque voie (NaN si aucune valeur).
+
+    :param samples: Dictionnaire {nom: tableau} des mesures, triées par Timer
+    :param fixes: Dictionnaire {nom: tableau} des relevés, triés par Timer
+    :return: Dictionnaire {nom: tableau}, une ligne par relevé
+    """
+    indices = asof_indices(samples["Timer"], fixes["Timer"], direction, tolerance)
+    matched = indices != NO_MATCH
+    # Mesures triées : les indices associés sont croissants, chaque relevé reçoit une suite contiguë de mesures
+    owners_by_sample = indices[matched]
+    starts = np.flatnonzero(np.diff(owners_by_sample, prepend=NO_MATCH) != 0)
+    owners = owners_by_sample[starts]
+
+    fix_count = len(fixes["Timer"])
+    result = {name: fixes[name] for name in ["Timer"] + GPS_JOIN_COLUMNS}
+    counts = np.zeros(fix_count, dtype=np.int64)
+    counts[owners] = np.diff(np.append(starts, len(owners_by_sample)))
+    result["count"] = counts
+
+    for channel in channels:
+        mean, low, high = (np.full(fix_count, np.nan) for _ in range(3))
+        if len(starts):
+            values = samples[channel][matched]
+            valid = ~np.isnan(values)
+            totals = np.add.reduceat(np.where(valid, values, 0.0), starts)
+            valid_counts = np.add.reduceat(valid.astype(np.int64), starts)
+            mean[owners] = np.divide(totals, valid_counts, out=np.full(len(starts), np.nan), where=valid_counts > 0)
+            # fmin / fmax ignorent les NaN tant qu'une valeur est renseignée
+            low[owners] = np.fmin.reduceat(values, starts)
+            high[owners] = np.fmax.reduceat(values, starts)
+        result[channel] = mean
+        result[f"{channel}_min"] = low
+        result[f"{channel}_max"] = high
+    return result
+
+
+def clip_timer_range(result, start=None, end=None):
+    """
+    Garde les lignes dont Timer est dans [start, end] (bornes incluses, None : pas de borne).
+    """
+    timer = result["Timer"]
+    keep = np.ones(len(timer), dtype=bool)
+    if start is not None:
+        keep &= timer >= start
+    if end is not None:
+        keep &= timer <= end
+    return {name: values[keep] for name, values in result.items()}
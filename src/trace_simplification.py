@@ -0,0 +1,262 @@
+# Simplification des tracés GPS selon le niveau de zoom de la carte (Douglas-Peucker, NumPy)
+#
+# Pour chaque point du tracé, on calcule une fois pour toutes son « importance » (m) : le plus grand
+# écart toléré pour lequel l'algorithme de Douglas-Peucker le conserve. Garder les points dont
+# l'importance atteint la tolérance donne exactement le tracé simplifié de Douglas-Peucker à cette
+# tolérance : une seule colonne contient ainsi toutes les simplifications, de la plus fine à la plus
+# grossière, et chaque niveau de zoom se lit par une simple comparaison.
+# Le zoom est converti en tolérance : PIXEL_TOLERANCE pixel de carte (tuiles de 256 px) à la latitude
+# du tracé. Un cadre (bbox) limite la réponse aux portions visibles.
+# Les importances des tracés de 'gpx_data' sont conservées dans la table 'gps_trace_levels' et
+# recalculées seulement quand les relevés de la session ont changé ; celles d'un fichier GPX sont
+# écrites dans gps_data.csv (colonne Importance, voir gps_processing.write_gps_csv).
+
+import zlib
+
+import numpy as np
+
+from columnar import decode_columnar, encode_columnar
+from database_manager import DatabaseManager, build_timer_range
+from db_connection import get_pool
+
+# À incrémenter quand le calcul des importances change, pour invalider les tracés enregistrés
+TRACE_VERSION = 1
+
+# Rayon de la sphère des cartes en ligne (Web Mercator, m)
+EARTH_RADIUS_M = 6378137.0
+
+TILE_SIZE = 256
+MAX_ZOOM = 22
+
+# Écart toléré entre le tracé simplifié et le tracé complet, en pixels de carte
+PIXEL_TOLERANCE = 1.0
+
+TRACE_COLUMNS = ["Timer", "Latitude", "Longitude"]
+
+
+def project(latitude, longitude):
+    """
+    Projection équirectangulaire locale (m), centrée sur la latitude moyenne du tracé.
+    """
+    reference = np.radians(np.mean(latitude)) if len(latitude) else 0.0
+    x = np.radians(longitude) * EARTH_RADIUS_M * np.cos(reference)
+    y = np.radians(latitude) * EARTH_RADIUS_M
+    return x, y
+
+
+def segment_distances(px, py, ax, ay, bx, by):
+    """
+    Distance de chaque point (px, py) au segment [(ax, ay), (bx, by)] correspondant.
+    """
+    dx, dy = bx - ax, by - ay
+    squared_length = dx * dx + dy * dy
+    t = ((px - ax) * dx + (py - ay) * dy) / np.where(squared_length > 0, squared_length, 1.0)
+    t = np.clip(t, 0.0, 1.0)
+    return np.hypot(px - (ax + t * dx), py - (ay + t * dy))
+
+
+def simplification_importance(x, y):
+    """
+    Importance de chaque point pour Douglas-Peucker : garder les points d'importance >= tolérance
+    donne le tracé simplifié à cette tolérance (les extrémités ont une importance infinie).
+
+    Tous les segments d'une même profondeur de la récursion sont découpés ensemble : une itération
+    de la boucle par niveau de l'arbre (quelques dizaines pour un tracé réel), pas une par point.
+    """
+    count = len(x)
+    importance = np.full(count, np.inf)
+    firsts = np.array([0], dtype=np.int64)
+    lasts = np.array([count - 1], dtype=np.int64)
+    bounds = np.array([np.inf])
+    keep = lasts - firsts > 1
+    firsts, lasts, bounds = firsts[keep], lasts[keep], bounds[keep]
+
+    while len(firsts):
+        # Points intérieurs de tous les segments, mis bout à bout
+        lengths = lasts - firsts - 1
+        offsets = np.cumsum(lengths) - lengths
+        segment = np.repeat(np.arange(len(firsts)), lengths)
+        points = np.arange(lengths.sum()) - offsets[segment] + firsts[segment] + 1
+        distances = segment_distances(
+            x[points], y[points], x[firsts][segment], y[firsts][segment], x[lasts][segment], y[lasts][segment]
+        )
+        farthest = np.maximum.reduceat(distances, offsets)
+        # Un point n'est jamais plus important que le point qui a découpé son segment
+        values = np.minimum(farthest, bounds)
+
+        # Segment rectiligne (ou immobile) : tous ses points intérieurs ont la même importance
+        flat = farthest == 0
+        importance[points[flat[segment]]] = values[segment[flat[segment]]]
+
+        # Premier point le plus éloigné de chaque segment
+        candidates = np.where(distances == farthest[segment], np.arange(len(points)), len(points))
+        splits = points[np.minimum.reduceat(candidates, offsets)]
+        importance[splits] = values
+
+        split = ~flat
+        firsts = np.concatenate((firsts[split], splits[split]))
+        lasts = np.concatenate((splits[split], lasts[split]))
+        bounds = np.concatenate((values[split], values[split]))
+        keep = lasts - firsts > 1
+        firsts, lasts, bounds = firsts[keep], lasts[keep], bounds[keep]
+    return importance
+
+
+def trace_importance(latitude, longitude):
+    """
+    Importance (m) de chaque point d'un tracé (latitudes et longitudes en degrés).
+    """
+    return simplification_importance(*project(np.asarray(latitude, dtype=np.float64),
+                                              np.asarray(longitude, dtype=np.float64)))
+
+
+def zoom_tolerance(zoom, latitude):
+    """
+    Tolérance (m) correspondant à PIXEL_TOLERANCE pixel au niveau de zoom `zoom`, à la latitude donnée.
+    """
+    meters_per_pixel = 2 * np.pi * EARTH_RADIUS_M * np.cos(np.radians(latitude)) / (TILE_SIZE * 2 ** zoom)
+    return PIXEL_TOLERANCE * float(meters_per_pixel)
+
+
+def tile_bbox(zoom, x, y):
+    """
+    Cadre (ouest, sud, est, nord) de la tuile x / y au niveau de zoom `zoom` (numérotation des tuiles OSM).
+    """
+    count = 2 ** zoom
+    west = x / count * 360 - 180
+    east = (x + 1) / count * 360 - 180
+    north = float(np.degrees(np.arctan(np.sinh(np.pi * (1 - 2 * y / count)))))
+    south = float(np.degrees(np.arctan(np.sinh(np.pi * (1 - 2 * (y + 1) / count)))))
+    return west, south, east, north
+
+
+def parse_bbox(value):
+    """
+    Cadre 'ouest,sud,est,nord' en degrés (format de LatLngBounds.toBBoxString de Leaflet).
+    """
+    west, south, east, north = (float(part) for part in value.split(","))
+    if not (west < east and south < north):
+        raise ValueError("Cadre invalide : ouest < est et sud < nord attendus.")
+    return west, south, east, north
+
+
+def select_points(latitude, longitude, importance, tolerance, bbox=None):
+    """
+    Indices des points du tracé simplifié à `tolerance` (m), limités au cadre s'il est fourni.
+
+    Avec un cadre, les segments qui le traversent sont gardés entiers (avec leur point extérieur) ;
+    `segments` numérote les portions continues du tracé pour que la carte ne relie pas deux
+    passages dans le cadre par un trait droit.
+
+    :return: (indices, segments), segments vaut None sans cadre
+    """
+    kept = np.flatnonzero(importance >= tolerance)
+    if bbox is None:
+        return kept, None
+
+    west, south, east, north = bbox
+    lat, lon = latitude[kept], longitude[kept]
+    near = (lat >= south) & (lat <= north) & (lon >= west) & (lon <= east)
+    # Segment dont l'emprise recoupe le cadre : ses deux extrémités sont gardées
+    crossing = (
+        (np.minimum(lat[:-1], lat[1:]) <= north) & (np.maximum(lat[:-1], lat[1:]) >= south) &
+        (np.minimum(lon[:-1], lon[1:]) <= east) & (np.maximum(lon[:-1], lon[1:]) >= west)
+    )
+    near[:-1] |= crossing
+    near[1:] |= crossing
+
+    positions = np.flatnonzero(near)
+    segments = np.cumsum(np.diff(positions, prepend=positions[:1]) > 1)
+    return kept[positions], segments
+
+
+def simplify_trace(latitude, longitude, importance, zoom=None, tolerance=None, bbox=None):
+    """
+    Tracé à afficher pour un zoom (ou une tolérance en m, prioritaire) et un cadre optionnel.
+    Le zoom est converti à la latitude du centre du cadre, ou à la latitude moyenne du tracé.
+
+    :return: (indices, segments, tolérance utilisée en m)
+    """
+    if tolerance is None and zoom is not None:
+        if bbox is not None:
+            latitude_reference = (bbox[1] + bbox[3]) / 2
+        else:
+            latitude_reference = float(np.mean(latitude)) if len(latitude) else 0.0
+        tolerance = zoom_tolerance(zoom, latitude_reference)
+    tolerance = tolerance or 0.0
+    indices, segments = select_points(latitude, longitude, importance, tolerance, bbox)
+    return indices, segments, tolerance
+
+
+class GpsTraceCache:
+    def __init__(self, db_name="sensor_data.db"):
+        self.db_name = db_name
+        self.db_manager = DatabaseManager(db_name)
+        self._initialize_database()
+
+    def _initialize_database(self):
+        """
+        Crée la table des tracés simplifiés si elle n'existe pas.
+        """
+        with get_pool(self.db_name).transaction() as connection:
+            connection.execute('''
+                CREATE TABLE IF NOT EXISTS gps_trace_levels (
+                    cache_key TEXT PRIMARY KEY,
+                    data_version TEXT NOT NULL,
+                    computed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    payload BLOB NOT NULL
+                )
+            ''')
+
+    @staticmethod
+    def cache_key(session_id):
+        return "all" if session_id is None else f"session:{session_id}"
+
+    def data_version(self, session_id=None):
+        """
+        Version des relevés de la session (ou de toute la table), la même que pour les ETag.
+        """
+        versions = self.db_manager.data_versions([DatabaseManager.version_scope("gpx_data", session_id)])
+        return f"{TRACE_VERSION}:" + ":".join(str(value) for value in versions)
+
+    def read_trace(self, connection, session_id=None):
+        """
+        Points du tracé, dans l'ordre d'enregistrement (comme /api/gps-trace).
+        """
+        where_clause, params = build_timer_range(None, None, session_id)
+        conditions = "Latitude IS NOT NULL AND Longitude IS NOT NULL AND Latitude != 0 AND Longitude != 0"
+        condition = f"{where_clause} AND {conditions}" if where_clause else f"WHERE {conditions}"
+        rows = connection.execute(
+            f"SELECT {', '.join(TRACE_COLUMNS)} FROM gpx_data {condition} ORDER BY rowid", params
+        ).fetchall()
+        table = np.array(rows, dtype=np.float64).reshape(len(rows), len(TRACE_COLUMNS))
+        return {name: table[:, index] for index, name in enumerate(TRACE_COLUMNS)}
+
+    def get(self, session_id=None):
+        """
+        Retourne (tracé avec la colonne Importance, depuis_la_table). Les importances ne sont
+        recalculées que si les relevés de la session ont changé depuis le dernier calcul.
+        """
+        cache_key = self.cache_key(session_id)
+        version = self.data_version(session_id)
+        with get_pool(self.db_name).connection() as conn:
+            row = conn.execute(
+                "SELECT data_version, payload FROM gps_trace_levels WHERE cache_key = ?", (cache_key,)
+            ).fetchone()
+            if row and row[0] == version:
+                return decode_columnar(zlib.decompress(row[1])), True
+            trace = self.read_trace(conn, session_id)
+
+        trace["Importance"] = trace_importance(trace["Latitude"], trace["Longitude"])
+        payload = zlib.compress(encode_columnar([(name, values, "d") for name, values in trace.items()]))
+        with get_pool(self.db_name).transaction() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO gps_trace_levels (cache_key, data_version, computed_at, payload) "
+                "VALUES (?, ?, CURRENT_TIMESTAMP, ?)",
+                (cache_key, version, payload)
+            )
+        return trace, False
+
+    def delete(self, session_id):
+        with get_pool(self.db_name).transaction() as conn:
+            conn.execute("DELETE FROM gps_trace_levels WHERE cache_key = ?", (self.cache_key(session_id),))
@@ -1,6 +1,10 @@
 import sqlite3
 import os
 
+from db_connection import get_pool
+
+SESSION_FIELDS = ["id", "course_id", "name", "source_file", "content_hash", "row_count", "created_at"]
+
 class UserDatabaseManager:
     def __init__(self, db_name="user_data.db"):
         self.db_name = db_name
@@ -10,7 +14,7 @@ class UserDatabaseManager:
         """
         Initialise la base de données en créant les tables nécessaires si elles n'existent pas.
         """
-        with sqlite3.connect(self.db_name) as connection:
+        with get_pool(self.db_name).transaction() as connection:
             cursor = connection.cursor()
 
             # Table des utilisateurs
@@ -36,20 +40,35 @@ class UserDatabaseManager:
             ''')
             print("Table 'courses' initialisée.")
 
-            connection.commit()
+            # Table des sessions d'enregistrement (une par import CSV), rattachables à une course.
+            # Les mesures sont dans la base capteurs, reliées par la colonne session_id.
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS sessions (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    course_id INTEGER,
+                    name TEXT,
+                    source_file TEXT,
+                    content_hash TEXT,
+                    row_count INTEGER DEFAULT 0,
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    FOREIGN KEY(course_id) REFERENCES courses(id)
+                )
+            ''')
+            cursor.execute("CREATE INDEX IF NOT EXISTS idx_sessions_content_hash ON sessions (content_hash)")
+            cursor.execute("CREATE INDEX IF NOT EXISTS idx_sessions_course ON sessions (course_id)")
+            print("Table 'sessions' initialisée.")
 
     def register_user(self, email, password, name):
         """
         Inscrit un nouvel utilisateur dans la base de données.
         """
         try:
-            with sqlite3.connect(self.db_name) as connection:
+            with get_pool(self.db_name).transaction() as connection:
                 cursor = connection.cursor()
                 cursor.execute(
                     "INSERT INTO users (email, password, name) VALUES (?, ?, ?)",
                     (email, password, name)
                 )
-                connection.commit()
                 print(f"Utilisateur {email} enregistré avec succès.")
                 return cursor.lastrowid
         except sqlite3.IntegrityError as e:
@@ -60,7 +79,7 @@ class UserDatabaseManager:
         """
         Vérifie les identifiants de l'utilisateur.
         """
-        with sqlite3.connect(self.db_name) as connection:
+        with get_pool(self.db_name).connection() as connection:
             cursor = connection.cursor()
             cursor.execute("SELECT id FROM users WHERE email = ? AND password = ?", (email, password))
             user = cursor.fetchone()
@@ -70,25 +89,143 @@ class UserDatabaseManager:
         """
         Ajoute un fichier de course associé à un utilisateur.
         """
-        with sqlite3.connect(self.db_name) as connection:
+        with get_pool(self.db_name).transaction() as connection:
             cursor = connection.cursor()
             cursor.execute("INSERT INTO courses (user_id, file_name) VALUES (?, ?)", (user_id, file_name))
-            connection.commit()
+
+    def save_course(self, user_id, file_name, uploaded_at, session_id=None):
+        """
+        Enregistre une course avec sa date d'envoi (fournie par le client),
+        et y rattache la session importée si elle est fournie.
+        """
+        with get_pool(self.db_name).transaction() as connection:
+            cursor = connection.cursor()
+            cursor.execute(
+                "INSERT INTO courses (user_id, file_name, uploaded_at) VALUES (?, ?, ?)",
+                (user_id, file_name, uploaded_at)
+            )
+            course_id = cursor.lastrowid
+            if session_id is not None:
+                cursor.execute("UPDATE sessions SET course_id = ? WHERE id = ?", (course_id, session_id))
+            return course_id
 
     def get_course_files(self, user_id):
         """
         Récupère les fichiers de course associés à un utilisateur.
         """
-        with sqlite3.connect(self.db_name) as connection:
+        with get_pool(self.db_name).connection() as connection:
             cursor = connection.cursor()
             cursor.execute("SELECT file_name, uploaded_at FROM courses WHERE user_id = ?", (user_id,))
             return cursor.fetchall()
 
+    def create_session(self, name=None, course_id=None, source_file=None, content_hash=None):
+        """
+        Crée une session d'enregistrement et retourne son identifiant.
+        """
+        with get_pool(self.db_name).transaction() as connection:
+            cursor = connection.cursor()
+            cursor.execute(
+                "INSERT INTO sessions (name, course_id, source_file, content_hash) VALUES (?, ?, ?, ?)",
+                (name, course_id, source_file, content_hash)
+            )
+            return cursor.lastrowid
+
+    def set_session_row_count(self, session_id, row_count, content_hash=None):
+        """
+        Enregistre le nombre de lignes importées pour une session (et l'empreinte du fichier,
+        connue seulement à la fin d'un envoi en flux).
+        """
+        with get_pool(self.db_name).transaction() as connection:
+            if content_hash is None:
+                connection.execute("UPDATE sessions SET row_count = ? WHERE id = ?", (row_count, session_id))
+            else:
+                connection.execute(
+                    "UPDATE sessions SET row_count = ?, content_hash = ? WHERE id = ?",
+                    (row_count, content_hash, session_id)
+                )
+
+    def attach_session_to_course(self, session_id, course_id):
+        """
+        Rattache une session existante à une course.
+        """
+        with get_pool(self.db_name).transaction() as connection:
+            cursor = connection.cursor()
+            cursor.execute("UPDATE sessions SET course_id = ? WHERE id = ?", (course_id, session_id))
+            return cursor.rowcount > 0
+
+    def find_session_by_hash(self, content_hash):
+        """
+        Retourne la session déjà importée depuis un fichier identique (None si aucune).
+        """
+        with get_pool(self.db_name).connection() as connection:
+            cursor = connection.cursor()
+            cursor.execute(
+                f"SELECT {', '.join(SESSION_FIELDS)} FROM sessions WHERE content_hash = ? ORDER BY id LIMIT 1",
+                (content_hash,)
+            )
+            row = cursor.fetchone()
+            return dict(zip(SESSION_FIELDS, row)) if row else None
+
+    def get_session(self, session_id):
+        """
+        Récupère une session par son identifiant.
+        """
+        with get_pool(self.db_name).connection() as connection:
+            cursor = connection.cursor()
+            cursor.execute(f"SELECT {', '.join(SESSION_FIELDS)} FROM sessions WHERE id = ?", (session_id,))
+            row = cursor.fetchone()
+            return dict(zip(SESSION_FIELDS, row)) if row else None
+
+    def find_session_for_course(self, file_name, user_id=None):
+        """
+        Retourne la dernière session rattachée à une course de ce nom (None si aucune).
+        """
+        fields = ', '.join(f"sessions.{field}" for field in SESSION_FIELDS)
+        query = (
+            f"SELECT {fields} FROM sessions JOIN courses ON courses.id = sessions.course_id "
+            "WHERE courses.file_name = ?"
+        )
+        params = [file_name]
+        if user_id is not None:
+            query += " AND courses.user_id = ?"
+            params.append(user_id)
+        with get_pool(self.db_name).connection() as connection:
+            cursor = connection.cursor()
+            cursor.execute(query + " ORDER BY courses.id DESC, sessions.id DESC LIMIT 1", params)
+            row = cursor.fetchone()
+            return dict(zip(SESSION_FIELDS, row)) if row else None
+
+    def get_sessions(self, user_id=None):
+        """
+        Liste les sessions, ou seulement celles rattachées aux courses d'un utilisateur.
+        """
+        fields = ', '.join(f"sessions.{field}" for field in SESSION_FIELDS)
+        with get_pool(self.db_name).connection() as connection:
+            cursor = connection.cursor()
+            if user_id is None:
+                cursor.execute(f"SELECT {fields} FROM sessions ORDER BY sessions.id")
+            else:
+                cursor.execute(
+                    f"SELECT {fields} FROM sessions JOIN courses ON courses.id = sessions.course_id "
+                    "WHERE courses.user_id = ? ORDER BY sessions.id",
+                    (user_id,)
+                )
+            return [dict(zip(SESSION_FIELDS, row)) for row in cursor.fetchall()]
+
+    def delete_session(self, session_id):
+        """
+        Supprime une session (les mesures sont supprimées à part, dans la base capteurs).
+        """
+        with get_pool(self.db_name).transaction() as connection:
+            cursor = connection.cursor()
+            cursor.execute("DELETE FROM sessions WHERE id = ?", (session_id,))
+            return cursor.rowcount > 0
+
     def get_user(self, email):
         """
         Récupère un utilisateur par son email.
         """
-        with sqlite3.connect(self.db_name) as connection:
+        with get_pool(self.db_name).connection() as connection:
             cursor = connection.cursor()
             cursor.execute("SELECT * FROM users WHERE email = ?", (email,))
             row = cursor.fetchone()